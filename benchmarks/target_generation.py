@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""目标地址生成和过滤的微基准测试
+
+比较两种方式遍历/24到/8网段、跳过排除地址和ARP表中已有设备所需的时间:
+  字符串: 每个地址构造IPv4Address再转为字符串，在字符串集合中判断是否排除
+  整数:   lan_scanner.AddressSet，减去排除地址后按区间产出连续的range
+
+用法: python benchmarks/target_generation.py [--prefixes 24 16 8] [--string-limit 16]
+"""
+import argparse
+import ipaddress
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lan_scanner import AddressSet, host_bounds, int_to_ip
+
+
+def string_targets(network, exclude_ips, arp_hosts):
+    """旧的实现: 地址以字符串表示"""
+    exclude_set = set(str(ip) for ip in exclude_ips)
+    arp_set = set(arp_hosts)
+    for ip in network.hosts():
+        ip = str(ip)
+        if ip not in arp_set and ip not in exclude_set:
+            yield ip
+
+
+def int_targets(network, exclude_ips, arp_hosts):
+    """新的实现: 地址以整数表示，范围之外的地址不逐个判断"""
+    first, last = host_bounds(network)
+    space = AddressSet([(first, last)]).subtract(AddressSet.parse(exclude_ips))
+    return space.subtract(AddressSet.parse(arp_hosts)).addresses()
+
+
+def measure(targets):
+    started = time.perf_counter()
+    count = 0
+    for _ in targets:
+        count += 1
+    return count, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='目标地址生成和过滤的微基准测试')
+    parser.add_argument('--prefixes', type=int, nargs='+', default=[24, 20, 16, 12, 8], help='要测试的网段前缀长度')
+    parser.add_argument('--string-limit', type=int, default=16,
+                        help='前缀长度小于此值时跳过字符串方式(/8需要数十秒)')
+    parser.add_argument('--excludes', type=int, default=256, help='随机排除的地址数')
+    parser.add_argument('--arp-hosts', type=int, default=64, help='随机的ARP表设备数')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'网段':<18}{'地址数':>10}{'字符串(秒)':>14}{'整数(秒)':>12}{'整数+转字符串(秒)':>20}{'加速比':>10}")
+    for prefix in args.prefixes:
+        network = ipaddress.IPv4Network(f'10.0.0.0/{prefix}')
+        first, last = host_bounds(network)
+        sample = lambda n: [int_to_ip(rng.randint(first, last)) for _ in range(min(n, last - first + 1))]
+        exclude_ips = sample(args.excludes)
+        arp_hosts = sample(args.arp_hosts)
+
+        count, int_time = measure(int_targets(network, exclude_ips, arp_hosts))
+        _, convert_time = measure(int_to_ip(value) for value in int_targets(network, exclude_ips, arp_hosts))
+        if prefix >= args.string_limit:
+            string_count, string_time = measure(string_targets(network, exclude_ips, arp_hosts))
+            assert string_count == count, (string_count, count)
+            string_text = f'{string_time:.4f}'
+            speedup = f'{string_time / int_time:.1f}x'
+        else:
+            string_text = speedup = '-'
+        print(f'{str(network):<18}{count:>10}{string_text:>14}{int_time:>12.4f}{convert_time:>20.4f}{speedup:>10}')
+
+
+if __name__ == '__main__':
+    main()
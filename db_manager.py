@@ -1,6 +1,8 @@
 import sqlite3
 import os
-from datetime import datetime
+import random
+import time
+from datetime import datetime, timedelta
 
 class DatabaseManager:
     def __init__(self, db_path='lan_scanner.db'):
@@ -37,6 +39,18 @@ class DatabaseManager:
         except sqlite3.OperationalError:
             pass  # 列已存在，忽略错误
 
+        # 添加vendor列(网卡厂商，如果不存在)
+        try:
+            self.cursor.execute('ALTER TABLE scan_results ADD COLUMN vendor TEXT')
+        except sqlite3.OperationalError:
+            pass
+
+        # 添加interface列(发现该主机的本机网卡，如果不存在)
+        try:
+            self.cursor.execute('ALTER TABLE scan_results ADD COLUMN interface TEXT')
+        except sqlite3.OperationalError:
+            pass
+
         # 创建资产信息表
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS asset_info (
@@ -50,10 +64,112 @@ class DatabaseManager:
         )
         ''')
 
+        # 创建主机名缓存表(按MAC和IP缓存反向解析结果)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS hostname_cache (
+            mac_address TEXT NOT NULL,
+            ip_address TEXT NOT NULL,
+            hostname TEXT NOT NULL,
+            resolved_time TIMESTAMP NOT NULL,
+            expire_time TIMESTAMP NOT NULL,
+            last_used TIMESTAMP NOT NULL,
+            PRIMARY KEY (mac_address, ip_address)
+        )
+        ''')
+
+        # 创建主机RTT估计表(用于自适应探测超时)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS host_timing (
+            ip_address TEXT PRIMARY KEY,
+            srtt REAL NOT NULL,
+            rttvar REAL NOT NULL,
+            updated_time TIMESTAMP NOT NULL
+        )
+        ''')
+
+        # 创建设备在线状态表(被动监听和主动确认得到的最近出现时间)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS host_presence (
+            mac_address TEXT NOT NULL,
+            ip_address TEXT NOT NULL,
+            first_seen TIMESTAMP NOT NULL,
+            last_seen TIMESTAMP NOT NULL,
+            source TEXT NOT NULL,
+            PRIMARY KEY (mac_address, ip_address)
+        )
+        ''')
+
+        # 创建服务指纹表(按MAC和端口保存banner，没有识别出服务的端口service和banner为空)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fingerprints (
+            mac_address TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            ip_address TEXT NOT NULL,
+            service TEXT NOT NULL,
+            banner TEXT NOT NULL,
+            fingerprint_time TIMESTAMP NOT NULL,
+            PRIMARY KEY (mac_address, port)
+        )
+        ''')
+
+        # 创建IPv6地址表(IPv6邻居发现得到的地址，按MAC与IPv4扫描结果关联)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ipv6_addresses (
+            mac_address TEXT NOT NULL,
+            ip_address TEXT NOT NULL,
+            interface TEXT,
+            first_seen TIMESTAMP NOT NULL,
+            last_seen TIMESTAMP NOT NULL,
+            PRIMARY KEY (mac_address, ip_address)
+        )
+        ''')
+
+        # 创建扫描检查点表(可恢复扫描的进度: 扫描顺序中cursor之前的地址都已探测完成)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scan_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            network_range TEXT NOT NULL,
+            space TEXT NOT NULL,
+            seed INTEGER NOT NULL,
+            cursor INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            created_time TIMESTAMP NOT NULL,
+            updated_time TIMESTAMP NOT NULL
+        )
+        ''')
+
+        # 创建检查点主机表(检查点之前已发现的在线主机)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS checkpoint_hosts (
+            checkpoint_id INTEGER NOT NULL,
+            ip_address TEXT NOT NULL,
+            hostname TEXT NOT NULL,
+            mac_address TEXT NOT NULL,
+            vendor TEXT,
+            interface TEXT,
+            PRIMARY KEY (checkpoint_id, ip_address)
+        )
+        ''')
+
+        # 创建扫描记录表(每次扫描每个网段一行，没有发现主机的扫描也记录)
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scan_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scan_time TIMESTAMP NOT NULL,
+            network_range TEXT NOT NULL,
+            local_ip TEXT NOT NULL,
+            host_count INTEGER NOT NULL
+        )
+        ''')
+
         # 创建索引以提高查询性能
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_scan_time ON scan_results (scan_time)')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_ip_address ON scan_results (ip_address)')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_mac_asset ON asset_info (mac_address)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_hostname_expire ON hostname_cache (expire_time)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_presence_last_seen ON host_presence (last_seen)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_ipv6_last_seen ON ipv6_addresses (last_seen)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_scan_runs ON scan_runs (network_range, scan_time)')
 
         self.conn.commit()
 
@@ -63,22 +179,36 @@ class DatabaseManager:
         参数:
             online_hosts: 在线主机列表
             local_ip: 本地IP地址
-            network_range: 网络范围
-        """
-        if not online_hosts:
-            return
+            network_range: 网络范围，主机带有'network'(所在网段)时以主机的为准
 
+        没有在线主机时也记录这次扫描(scan_runs)，get_last_online_ips据此返回空列表。
+        """
         scan_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         network_str = str(network_range)
 
+        # 记录扫描的每个网段(多网卡扫描时network_range为逗号分隔的网段列表)
+        counts = dict.fromkeys(network_str.split(', '), 0)
+        for host in online_hosts:
+            network = host.get('network', network_str)
+            counts[network] = counts.get(network, 0) + 1
+        self.cursor.executemany(
+            'INSERT INTO scan_runs (scan_time, network_range, local_ip, host_count) VALUES (?, ?, ?, ?)',
+            [(scan_time, network, local_ip, count) for network, count in counts.items()]
+        )
+
         # 插入数据
         for host in online_hosts:
             self.cursor.execute(
-                'INSERT INTO scan_results (scan_time, hostname, ip_address, mac_address, local_ip, network_range, status) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                (scan_time, host['hostname'], host['ip'], host['mac'], local_ip, network_str, 'online')
+                'INSERT INTO scan_results (scan_time, hostname, ip_address, mac_address, local_ip, network_range, status, vendor, interface) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (scan_time, host['hostname'], host['ip'], host['mac'], local_ip, host.get('network', network_str),
+                 'online', host.get('vendor'), host.get('interface'))
             )
 
         self.conn.commit()
+        # 双栈主机的IPv6地址(见lan_scanner.attach_ipv6)
+        self.save_ipv6_addresses([(host['mac'], address, None)
+                                  for host in online_hosts if host['mac'] != 'Unknown'
+                                  for address in host.get('ipv6', ())], scan_time)
         print(f"已将 {len(online_hosts)} 条扫描结果保存到数据库")
 
     def get_scan_results(self, start_time=None, end_time=None, ip_address=None):
@@ -202,6 +332,426 @@ class DatabaseManager:
         self.cursor.execute('DELETE FROM scan_results WHERE mac_address = ?', (mac_address,))
         self.conn.commit()
 
+    def get_cached_hostnames(self):
+        """获取所有未过期的主机名缓存
+
+        返回:
+            {(mac_address, ip_address): hostname}
+        """
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.execute(
+            'SELECT mac_address, ip_address, hostname FROM hostname_cache WHERE expire_time > ?',
+            (now,)
+        )
+        return {(mac, ip): hostname for mac, ip, hostname in self.cursor.fetchall()}
+
+    def save_cached_hostnames(self, entries):
+        """批量写入主机名缓存
+
+        参数:
+            entries: [(mac_address, ip_address, hostname, 有效期秒数), ...]
+        """
+        if not entries:
+            return
+        now = datetime.now()
+        now_str = now.strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.executemany(
+            'INSERT OR REPLACE INTO hostname_cache (mac_address, ip_address, hostname, resolved_time, expire_time, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+            [(mac, ip, hostname, now_str, (now + timedelta(seconds=ttl)).strftime('%Y-%m-%d %H:%M:%S'), now_str)
+             for mac, ip, hostname, ttl in entries]
+        )
+        self.conn.commit()
+
+    def touch_cached_hostnames(self, keys):
+        """更新缓存条目的最近使用时间
+
+        参数:
+            keys: [(mac_address, ip_address), ...]
+        """
+        if not keys:
+            return
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.executemany(
+            'UPDATE hostname_cache SET last_used = ? WHERE mac_address = ? AND ip_address = ?',
+            [(now, mac, ip) for mac, ip in keys]
+        )
+        self.conn.commit()
+
+    def evict_hostname_cache(self, max_entries=10000):
+        """删除过期的主机名缓存，条目超过max_entries时按最近使用时间淘汰
+
+        返回:
+            删除的条目数
+        """
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.execute('DELETE FROM hostname_cache WHERE expire_time <= ?', (now,))
+        deleted = self.cursor.rowcount
+        self.cursor.execute('''
+            DELETE FROM hostname_cache WHERE rowid NOT IN (
+                SELECT rowid FROM hostname_cache ORDER BY last_used DESC LIMIT ?
+            )
+        ''', (max_entries,))
+        deleted += self.cursor.rowcount
+        self.conn.commit()
+        return deleted
+
+    def get_last_online_ips(self, network_range=None):
+        """获取最近一次扫描中在线的IP地址
+
+        参数:
+            network_range: 只看该网段的扫描记录，为空时看所有记录
+        """
+        condition = ''
+        params = []
+        if network_range is not None:
+            condition = ' AND network_range = ?'
+            params.append(network_range)
+        # scan_runs之前的数据库只有scan_results可查，两表取较晚的时间
+        self.cursor.execute(
+            'SELECT MAX(scan_time) FROM (SELECT scan_time FROM scan_runs WHERE 1=1' + condition +
+            ' UNION ALL SELECT scan_time FROM scan_results WHERE 1=1' + condition + ')',
+            params * 2
+        )
+        latest = self.cursor.fetchone()[0]
+        if latest is None:
+            return []
+        self.cursor.execute(
+            "SELECT DISTINCT ip_address FROM scan_results WHERE scan_time = ? AND status = 'online'" + condition,
+            [latest] + params
+        )
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_seen_ips(self, network_range=None, max_age_days=30):
+        """获取max_age_days天内在扫描中出现过的IP地址
+
+        参数:
+            network_range: 只看该网段的扫描记录，为空时看所有记录
+        """
+        since = (datetime.now() - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+        query = "SELECT DISTINCT ip_address FROM scan_results WHERE status = 'online' AND scan_time >= ?"
+        params = [since]
+        if network_range is not None:
+            query += ' AND network_range = ?'
+            params.append(network_range)
+        self.cursor.execute(query, params)
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def get_host_timings(self, max_age_days=30):
+        """获取最近max_age_days天内更新过的主机RTT估计
+
+        返回:
+            [(ip_address, srtt, rttvar), ...]
+        """
+        since = (datetime.now() - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.execute(
+            'SELECT ip_address, srtt, rttvar FROM host_timing WHERE updated_time >= ?',
+            (since,)
+        )
+        return self.cursor.fetchall()
+
+    def save_host_timings(self, timings):
+        """批量保存主机RTT估计
+
+        参数:
+            timings: [(ip_address, srtt, rttvar), ...]
+        """
+        if not timings:
+            return
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.executemany(
+            'INSERT OR REPLACE INTO host_timing (ip_address, srtt, rttvar, updated_time) VALUES (?, ?, ?, ?)',
+            [(ip, srtt, rttvar, now) for ip, srtt, rttvar in timings]
+        )
+        self.conn.commit()
+
+    def save_presence(self, entries):
+        """批量更新设备的最近出现时间
+
+        参数:
+            entries: [(mac_address, ip_address, 出现时间字符串, 来源), ...]，
+                来源为'arp'、'dhcp'、'mdns'或'probe'
+        """
+        if not entries:
+            return
+        self.cursor.executemany(
+            '''INSERT INTO host_presence (mac_address, ip_address, first_seen, last_seen, source)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (mac_address, ip_address) DO UPDATE SET
+                   last_seen = MAX(last_seen, excluded.last_seen), source = excluded.source''',
+            [(mac, ip, seen, seen, source) for mac, ip, seen, source in entries]
+        )
+        self.conn.commit()
+
+    def get_presence(self, since=None):
+        """获取设备的在线状态记录
+
+        参数:
+            since: 只返回此时间之后出现过的设备(datetime)，为空时返回全部
+
+        返回:
+            [(mac_address, ip_address, first_seen, last_seen, source), ...]，按最近出现时间倒序
+        """
+        query = 'SELECT mac_address, ip_address, first_seen, last_seen, source FROM host_presence'
+        params = []
+        if since is not None:
+            query += ' WHERE last_seen >= ?'
+            params.append(since.strftime('%Y-%m-%d %H:%M:%S'))
+        self.cursor.execute(query + ' ORDER BY last_seen DESC', params)
+        return self.cursor.fetchall()
+
+    def get_quiet_hosts(self, quiet_seconds, max_age_days=1):
+        """获取已经安静了quiet_seconds秒、但max_age_days天内出现过的设备
+
+        同一MAC最近以其他IP出现过(地址已变化)的旧记录不计入。
+
+        返回:
+            [(mac_address, ip_address, last_seen), ...]
+        """
+        now = datetime.now()
+        quiet_since = (now - timedelta(seconds=quiet_seconds)).strftime('%Y-%m-%d %H:%M:%S')
+        oldest = (now - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.execute('''
+            SELECT mac_address, ip_address, last_seen FROM host_presence AS p
+            WHERE last_seen < ? AND last_seen >= ? AND NOT EXISTS (
+                SELECT 1 FROM host_presence AS q WHERE q.mac_address = p.mac_address AND q.last_seen >= ?
+            )
+        ''', (quiet_since, oldest, quiet_since))
+        return self.cursor.fetchall()
+
+    def save_ipv6_addresses(self, entries, seen=None):
+        """批量记录IPv6邻居发现得到的(MAC, IPv6)对
+
+        参数:
+            entries: [(mac_address, ipv6_address, 网卡名或None), ...]
+            seen: 出现时间字符串，默认为当前时间
+        """
+        if not entries:
+            return
+        seen = seen or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.executemany(
+            '''INSERT INTO ipv6_addresses (mac_address, ip_address, interface, first_seen, last_seen)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (mac_address, ip_address) DO UPDATE SET
+                   last_seen = MAX(last_seen, excluded.last_seen),
+                   interface = COALESCE(excluded.interface, interface)''',
+            [(mac, ip, interface, seen, seen) for mac, ip, interface in entries]
+        )
+        self.conn.commit()
+
+    def get_ipv6_addresses(self, mac_address=None):
+        """获取记录的IPv6地址
+
+        返回:
+            [(mac_address, ip_address, interface, first_seen, last_seen), ...]，按最近出现时间倒序
+        """
+        query = 'SELECT mac_address, ip_address, interface, first_seen, last_seen FROM ipv6_addresses'
+        params = []
+        if mac_address is not None:
+            query += ' WHERE mac_address = ?'
+            params.append(mac_address)
+        self.cursor.execute(query + ' ORDER BY last_seen DESC', params)
+        return self.cursor.fetchall()
+
+    def save_fingerprints(self, entries):
+        """批量保存服务指纹
+
+        参数:
+            entries: [(mac_address, port, ip_address, service, banner), ...]
+        """
+        if not entries:
+            return
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.executemany(
+            'INSERT OR REPLACE INTO fingerprints (mac_address, port, ip_address, service, banner, fingerprint_time) VALUES (?, ?, ?, ?, ?, ?)',
+            [(mac, port, ip, service, banner, now) for mac, port, ip, service, banner in entries]
+        )
+        self.conn.commit()
+
+    def get_fingerprints(self, since=None, mac_address=None):
+        """获取服务指纹
+
+        参数:
+            since: 只返回此时间之后识别的记录(datetime)，为空时返回全部
+            mac_address: 只返回该设备的记录
+
+        返回:
+            [(mac_address, port, ip_address, service, banner, fingerprint_time), ...]
+        """
+        query = 'SELECT mac_address, port, ip_address, service, banner, fingerprint_time FROM fingerprints WHERE 1=1'
+        params = []
+        if since is not None:
+            query += ' AND fingerprint_time >= ?'
+            params.append(since.strftime('%Y-%m-%d %H:%M:%S'))
+        if mac_address is not None:
+            query += ' AND mac_address = ?'
+            params.append(mac_address)
+        self.cursor.execute(query + ' ORDER BY mac_address, port', params)
+        return self.cursor.fetchall()
+
+    def find_checkpoint(self, network_range, space):
+        """查找同一网段和地址空间最近的未完成检查点
+
+        返回:
+            (id, seed, cursor, total, updated_time)，没有时返回None
+        """
+        self.cursor.execute(
+            'SELECT id, seed, cursor, total, updated_time FROM scan_checkpoints WHERE network_range = ? AND space = ? ORDER BY updated_time DESC, id DESC LIMIT 1',
+            (network_range, space)
+        )
+        return self.cursor.fetchone()
+
+    def create_checkpoint(self, network_range, space, seed, total):
+        """新建检查点(同一网段和地址空间的旧检查点被替换)，返回检查点id"""
+        self.delete_checkpoints(network_range, space)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.execute(
+            'INSERT INTO scan_checkpoints (network_range, space, seed, cursor, total, created_time, updated_time) VALUES (?, ?, ?, 0, ?, ?, ?)',
+            (network_range, space, seed, total, now, now)
+        )
+        self.conn.commit()
+        return self.cursor.lastrowid
+
+    def save_checkpoint(self, checkpoint_id, cursor, hosts):
+        """在一个事务中更新检查点的进度并追加新发现的主机
+
+        参数:
+            hosts: [(ip_address, hostname, mac_address, vendor, interface), ...]
+        """
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.executemany(
+            'INSERT OR REPLACE INTO checkpoint_hosts (checkpoint_id, ip_address, hostname, mac_address, vendor, interface) VALUES (?, ?, ?, ?, ?, ?)',
+            [(checkpoint_id, *host) for host in hosts]
+        )
+        self.cursor.execute(
+            'UPDATE scan_checkpoints SET cursor = ?, updated_time = ? WHERE id = ?',
+            (cursor, now, checkpoint_id)
+        )
+        self.conn.commit()
+
+    def get_checkpoint_hosts(self, checkpoint_id):
+        """获取检查点中的主机: [(ip_address, hostname, mac_address, vendor, interface), ...]"""
+        self.cursor.execute(
+            'SELECT ip_address, hostname, mac_address, vendor, interface FROM checkpoint_hosts WHERE checkpoint_id = ?',
+            (checkpoint_id,)
+        )
+        return self.cursor.fetchall()
+
+    def delete_checkpoints(self, network_range, space):
+        """删除同一网段和地址空间的所有检查点及其主机"""
+        self.cursor.execute(
+            'DELETE FROM checkpoint_hosts WHERE checkpoint_id IN (SELECT id FROM scan_checkpoints WHERE network_range = ? AND space = ?)',
+            (network_range, space)
+        )
+        self.cursor.execute('DELETE FROM scan_checkpoints WHERE network_range = ? AND space = ?', (network_range, space))
+        self.conn.commit()
+
+class ScanCheckpoint:
+    """一次可恢复扫描的检查点
+
+    地址空间按扫描顺序编号，cursor之前的地址都已探测完成；hosts为已发现的在线主机。
+    扫描过程中定期调用save()把进度写入数据库，进程被杀死或机器重启时最多损失interval秒的进度；
+    扫描完整结束后调用finish()删除检查点，中途停止时保留，下次可以从cursor继续。
+    space是描述地址空间和扫描顺序的字符串，只有完全相同的扫描才能恢复。
+    """
+
+    def __init__(self, db_manager, network_range, space, total, resume=False, interval=5.0):
+        self.db_manager = db_manager
+        self.network_range = network_range
+        self.space = space
+        self.interval = interval
+        self.hosts = []
+        self._pending = []
+        self._saved_at = time.monotonic()
+        found = db_manager.find_checkpoint(network_range, space) if resume else None
+        if found is not None:
+            self.id, self.seed, self.cursor, self.total, self.updated_time = found
+            self.hosts = [
+                {'ip': ip, 'hostname': hostname, 'mac': mac, 'vendor': vendor or 'Unknown',
+                 'interface': interface, 'network': network_range}
+                for ip, hostname, mac, vendor, interface in db_manager.get_checkpoint_hosts(self.id)
+            ]
+            self.resumed = True
+        else:
+            self.seed = random.randrange(1 << 31)
+            self.cursor = 0
+            self.total = total
+            self.updated_time = None
+            self.id = db_manager.create_checkpoint(network_range, space, self.seed, total)
+            self.resumed = False
+
+    def add_host(self, host):
+        """记录新发现的主机，下次save()时写入"""
+        self._pending.append((host['ip'], host['hostname'], host['mac'], host.get('vendor'), host.get('interface')))
+
+    def due(self):
+        return time.monotonic() - self._saved_at >= self.interval
+
+    def save(self, cursor):
+        """把进度和新发现的主机写入数据库"""
+        self.cursor = cursor
+        self.db_manager.save_checkpoint(self.id, cursor, self._pending)
+        self._pending = []
+        self._saved_at = time.monotonic()
+
+    def finish(self):
+        """扫描完整结束，删除检查点"""
+        self.db_manager.delete_checkpoints(self.network_range, self.space)
+
+class HostnameCache:
+    """以(MAC, IP)为键、保存在数据库中的主机名缓存
+
+    扫描开始时一次性载入未过期的条目，新解析的结果在flush()时批量写回，
+    MAC和IP都没变的主机在有效期内不再做反向解析。hits/misses记录命中情况，
+    用于调整有效期。
+    """
+
+    def __init__(self, db_manager, ttl=3600, negative_ttl=600, max_entries=10000):
+        self.db_manager = db_manager
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.entries = db_manager.get_cached_hostnames()
+        self._pending = []
+        self._used = set()
+
+    def get(self, mac_address, ip_address):
+        """查询缓存的主机名，未命中返回None"""
+        key = (mac_address, ip_address)
+        hostname = self.entries.get(key) if mac_address != 'Unknown' else None
+        if hostname is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used.add(key)
+        return hostname
+
+    def put(self, mac_address, ip_address, hostname):
+        """记录新解析的主机名，解析失败('Unknown')使用较短的有效期"""
+        if mac_address == 'Unknown':
+            return
+        ttl = self.negative_ttl if hostname == 'Unknown' else self.ttl
+        self.entries[(mac_address, ip_address)] = hostname
+        self._pending.append((mac_address, ip_address, hostname, ttl))
+
+    def flush(self):
+        """把本轮的新条目和使用记录写回数据库，并执行过期淘汰"""
+        self.db_manager.save_cached_hostnames(self._pending)
+        self.db_manager.touch_cached_hostnames(list(self._used))
+        self.db_manager.evict_hostname_cache(self.max_entries)
+        self._pending = []
+        self._used = set()
+
+    def stats(self):
+        """返回命中统计: {'hits', 'misses', 'hit_rate'}"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
 def save_results_to_db(online_hosts, local_ip, network_range, db_path='lan_scanner.db'):
     """便捷函数：保存扫描结果到数据库
 
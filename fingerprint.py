@@ -0,0 +1,221 @@
+"""服务指纹识别: 连接在线主机的常用端口，读取SSH版本串、HTTP Server头和SMB协商结果
+
+每个(主机, 端口)只建立一个连接，读取量和耗时都有上限: SSH等服务端先发言的协议直接读取banner，
+HTTP和SMB发送一个请求后读取应答，不在SERVICE_PORTS中的端口先短暂等待服务端的banner，
+没有时在同一连接上改发HTTP请求。所有主机共享max_sockets个同时打开的连接。
+"""
+import asyncio
+import socket
+import struct
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# 端口对应的协议
+SERVICE_PORTS = {
+    22: 'ssh', 2222: 'ssh',
+    80: 'http', 8000: 'http', 8008: 'http', 8080: 'http', 8888: 'http',
+    445: 'smb',
+}
+DEFAULT_FINGERPRINT_PORTS = (22, 80, 445, 8080)
+
+# SMB2 NEGOTIATE请求提供的协议版本(3.1.1需要协商上下文，这里不提供)
+SMB2_DIALECTS = (0x0202, 0x0210, 0x0300, 0x0302)
+SMB2_DIALECT_NAMES = {0x0202: '2.0.2', 0x0210: '2.1', 0x0300: '3.0', 0x0302: '3.0.2', 0x0311: '3.1.1'}
+SMB2_NEGOTIATE_SIGNING_REQUIRED = 0x02
+
+_SMB2_HEADER = struct.Struct('<4sHHIHHIIQIIQ16s')
+_SMB2_NEGOTIATE = struct.Struct('<HHHHI16sQ')
+_SMB2_NEGOTIATE_RESPONSE = struct.Struct('<HHHH16sI')
+
+# banner保存的最大字符数
+MAX_BANNER_LENGTH = 200
+
+
+def build_smb_negotiate():
+    """构造带NetBIOS会话头的SMB2 NEGOTIATE请求"""
+    header = _SMB2_HEADER.pack(b'\xfeSMB', 64, 0, 0, 0, 1, 0, 0, 0, 0, 0, 0, bytes(16))
+    body = _SMB2_NEGOTIATE.pack(36, len(SMB2_DIALECTS), 1, 0, 0, uuid.uuid4().bytes, 0)
+    message = header + body + struct.pack(f'<{len(SMB2_DIALECTS)}H', *SMB2_DIALECTS)
+    return struct.pack('>I', len(message)) + message
+
+
+def build_http_request(ip):
+    return f'HEAD / HTTP/1.0\r\nHost: {ip}\r\nUser-Agent: lan_scanner\r\nConnection: close\r\n\r\n'.encode()
+
+
+def _clean(raw):
+    text = raw.decode('utf-8', errors='replace')
+    return ''.join(c for c in text if c.isprintable()).strip()[:MAX_BANNER_LENGTH]
+
+
+def _ssh_complete(data):
+    start = data.find(b'SSH-')
+    return start >= 0 and b'\n' in data[start:]
+
+
+def _http_complete(data):
+    return b'\r\n\r\n' in data
+
+
+def _smb_complete(data):
+    if len(data) < 4:
+        return False
+    needed = min(int.from_bytes(data[1:4], 'big'), _SMB2_HEADER.size + _SMB2_NEGOTIATE_RESPONSE.size)
+    return len(data) - 4 >= needed
+
+
+def parse_ssh(data):
+    """返回SSH版本串(如SSH-2.0-OpenSSH_9.2p1 Debian-2)，不是SSH返回None"""
+    # RFC 4253允许服务端在版本串之前发送其他行
+    for line in data.split(b'\n'):
+        if line.startswith(b'SSH-'):
+            return _clean(line)
+    return None
+
+
+def parse_http(data):
+    """返回HTTP应答的Server头，没有Server头时返回状态行，不是HTTP返回None"""
+    head = data.split(b'\r\n\r\n', 1)[0]
+    lines = head.split(b'\r\n')
+    if not lines[0].startswith(b'HTTP/'):
+        return None
+    for line in lines[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'server':
+            return _clean(value)
+    return _clean(lines[0])
+
+
+def parse_smb(data):
+    """解析SMB2 NEGOTIATE应答，返回如'SMB 3.0.2 signing required'，失败返回None"""
+    message = data[4:]
+    if len(message) < _SMB2_HEADER.size + _SMB2_NEGOTIATE_RESPONSE.size or message[:4] != b'\xfeSMB':
+        return None
+    status = struct.unpack_from('<I', message, 8)[0]
+    if status != 0:
+        return None
+    _, security_mode, dialect, _, _, _ = _SMB2_NEGOTIATE_RESPONSE.unpack_from(message, _SMB2_HEADER.size)
+    name = SMB2_DIALECT_NAMES.get(dialect, f'0x{dialect:04x}')
+    signing = 'signing required' if security_mode & SMB2_NEGOTIATE_SIGNING_REQUIRED else 'signing optional'
+    return f'SMB {name} {signing}'
+
+
+class Fingerprinter:
+    """在发现阶段之后识别在线主机上的服务
+
+    ports为要连接的端口；每个连接最多读取max_bytes字节、耗时不超过timeout秒；
+    所有主机共享max_sockets个同时打开的连接；提供limiter(RateLimiter)时每个connect()都要先取得令牌。
+    提供db_manager时结果按(MAC, 端口)保存在fingerprints表中，MAC和IP都没变、
+    且不超过max_age秒的端口不再重复识别。
+    """
+
+    def __init__(self, ports=DEFAULT_FINGERPRINT_PORTS, timeout=2.0, max_bytes=2048, max_sockets=64,
+                 banner_wait=0.5, limiter=None, db_manager=None, max_age=86400):
+        self.ports = tuple(ports)
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.banner_wait = banner_wait
+        self.semaphore = asyncio.Semaphore(max_sockets)
+        self.limiter = limiter
+        self.db_manager = db_manager
+        self.max_age = max_age
+        self.probed = 0
+        self.skipped = 0
+
+    async def _recv(self, sock, data, complete):
+        loop = asyncio.get_running_loop()
+        while len(data) < self.max_bytes and not complete(data):
+            chunk = await loop.sock_recv(sock, self.max_bytes - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    async def _exchange(self, sock, ip, port):
+        """在已连接的socket上完成识别，返回(协议, banner)"""
+        loop = asyncio.get_running_loop()
+        service = SERVICE_PORTS.get(port)
+        if service == 'ssh':
+            return 'ssh', parse_ssh(await self._recv(sock, b'', _ssh_complete))
+        if service == 'smb':
+            await loop.sock_sendall(sock, build_smb_negotiate())
+            return 'smb', parse_smb(await self._recv(sock, b'', _smb_complete))
+        data = b''
+        if service is None:
+            # 未知端口: 先等待服务端主动发送的banner(SSH、FTP、SMTP等)
+            try:
+                data = await asyncio.wait_for(self._recv(sock, b'', lambda d: b'\n' in d), self.banner_wait)
+            except asyncio.TimeoutError:
+                data = b''
+            if data:
+                banner = parse_ssh(data)
+                if banner is not None:
+                    return 'ssh', banner
+                return 'banner', _clean(data.split(b'\n', 1)[0])
+        await loop.sock_sendall(sock, build_http_request(ip))
+        return 'http', parse_http(await self._recv(sock, b'', _http_complete))
+
+    async def grab(self, ip, port):
+        """识别一个端口上的服务，返回(协议, banner)，端口关闭或无法识别时返回('', '')"""
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            # 关闭时直接发送RST，不在本机留下TIME_WAIT连接
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            try:
+                started = time.monotonic()
+                await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), self.timeout)
+                remaining = self.timeout - (time.monotonic() - started)
+                service, banner = await asyncio.wait_for(self._exchange(sock, ip, port), max(remaining, 0.01))
+                return (service, banner) if banner else ('', '')
+            except (OSError, asyncio.TimeoutError):
+                return '', ''
+            finally:
+                sock.close()
+
+    async def fingerprint(self, ip, ports=None):
+        """识别一台主机，返回{端口: (协议, banner)}，包含没有识别出服务的端口"""
+        ports = self.ports if ports is None else ports
+        results = await asyncio.gather(*(self.grab(ip, port) for port in ports))
+        return dict(zip(ports, results))
+
+    async def run(self, hosts):
+        """识别hosts中的每台主机，结果写入host['services']({端口: (协议, banner)}，只含识别出的服务)"""
+        known = {}
+        if self.db_manager is not None:
+            since = datetime.now() - timedelta(seconds=self.max_age)
+            known = {(mac, port): (ip, service, banner)
+                     for mac, port, ip, service, banner, _ in self.db_manager.get_fingerprints(since)}
+
+        async def handle(host):
+            mac = host.get('mac', 'Unknown')
+            services = {}
+            pending = []
+            for port in self.ports:
+                entry = known.get((mac, port)) if mac != 'Unknown' else None
+                if entry is not None and entry[0] == host['ip']:
+                    services[port] = entry[1:]
+                else:
+                    pending.append(port)
+            self.skipped += len(self.ports) - len(pending)
+            self.probed += len(pending)
+            if pending:
+                services.update(await self.fingerprint(host['ip'], pending))
+            host['services'] = {port: services[port] for port in self.ports if services[port][0]}
+            if mac == 'Unknown':
+                return []
+            return [(mac, port, host['ip'], services[port][0], services[port][1]) for port in pending]
+
+        entries = await asyncio.gather(*(handle(host) for host in hosts))
+        if self.db_manager is not None:
+            self.db_manager.save_fingerprints([entry for host_entries in entries for entry in host_entries])
+        return hosts
+
+
+def format_services(services):
+    """把host['services']格式化为'22/ssh SSH-2.0-..., 80/http nginx'"""
+    return ', '.join(f'{port}/{service} {banner}' for port, (service, banner) in sorted(services.items()))
@@ -1,15 +1,90 @@
 #!/usr/bin/env python3
 import asyncio
 import argparse
+import array
+import bisect
+import collections
 import csv
+import errno
 import ipaddress
+import math
+import multiprocessing
 import os
 import platform
+import random
 import re
 import socket
+import struct
 import subprocess
+import threading
 import time
 
+import netlink
+from fingerprint import DEFAULT_FINGERPRINT_PORTS, Fingerprinter, format_services
+from oui import vendor_of
+from db_manager import DatabaseManager, HostnameCache, ScanCheckpoint
+from name_resolver import (DNS_TYPE_PTR, DnsPtrResolver, build_query, first_answer, hosts_file, peer_resolvers,
+                           system_lookup)
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+
+ETH_P_ARP = 0x0806
+ARP_REQUEST = 1
+ARP_REPLY = 2
+
+# TCP存活探测的默认端口(SMB、RDP、SSH、HTTP)
+DEFAULT_TCP_PORTS = (445, 3389, 22, 80)
+
+# 本机资源不足导致的发送失败，作为并发过高的信号
+LOCAL_SEND_ERRORS = (errno.ENOBUFS, errno.EAGAIN, errno.EMFILE, errno.ENFILE)
+
+# 预探测阶段使用的组播地址: mDNS服务枚举和SSDP(UPnP)发现
+MDNS_GROUP = ('224.0.0.251', 5353)
+MDNS_SERVICES_NAME = '_services._dns-sd._udp.local'
+SSDP_GROUP = ('239.255.255.250', 1900)
+SSDP_SEARCH = (b'M-SEARCH * HTTP/1.1\r\nHOST: 239.255.255.250:1900\r\n'
+               b'MAN: "ssdp:discover"\r\nMX: 1\r\nST: ssdp:all\r\n\r\n')
+
+# 被动监听的BPF过滤器: 只接收ARP，以及目的端口为67/68(DHCP)或5353(mDNS)的未分片UDP报文
+# (等价于tcpdump -dd "arp or (udp and not ip[6:2] & 0x1fff != 0 and dst port (67 or 68 or 5353))")
+PRESENCE_FILTER = [
+    (0x28, 0, 0, 12),       # ldh [12]             以太网类型
+    (0x15, 10, 0, 0x0806),  # jeq ARP              -> 接收
+    (0x15, 0, 10, 0x0800),  # jeq IPv4             否则丢弃
+    (0x30, 0, 0, 23),       # ldb [23]             IP协议号
+    (0x15, 0, 8, 17),       # jeq UDP              否则丢弃
+    (0x28, 0, 0, 20),       # ldh [20]             分片偏移
+    (0x45, 6, 0, 0x1fff),   # jset 0x1fff          分片 -> 丢弃
+    (0xb1, 0, 0, 14),       # ldxb 4*([14]&0xf)    IP头长度
+    (0x48, 0, 0, 16),       # ldh [x+16]           UDP目的端口
+    (0x15, 2, 0, 67),       # jeq 67               -> 接收
+    (0x15, 1, 0, 68),       # jeq 68               -> 接收
+    (0x15, 0, 1, 5353),     # jeq 5353             否则丢弃
+    (0x06, 0, 0, 0x40000),  # ret 接收
+    (0x06, 0, 0, 0),        # ret 丢弃
+]
+SO_ATTACH_FILTER = 26
+ETH_P_ALL = 0x0003
+PACKET_OUTGOING = 4
+
+# IPv6发现: ICMPv6回显和MLD(组播侦听者发现)
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+MLD_QUERY = 130
+MLD_REPORT = 131
+MLDV2_REPORT = 143
+IPV6_ALL_NODES = 'ff02::1'
+IPV6_MLDV2_ROUTERS = 'ff02::16'
+# MLD查询必须携带路由器告警逐跳选项(RFC 2710): 下一头部和长度由内核填写，选项5长度2值0，再填充2字节
+MLD_HOP_OPTIONS = bytes([0, 0, 5, 2, 0, 0, 1, 0])
+IPV6_HOPOPTS = getattr(socket, 'IPV6_HOPOPTS', 54)
+
+# Linux网卡ioctl请求号
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
+SIOCGIFHWADDR = 0x8927
+
 def get_local_ip():
     """获取本地IP地址"""
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -23,134 +98,1240 @@ def get_local_ip():
         s.close()
     return IP
 
-def get_network_range(local_ip, subnet_mask='255.255.255.0'):
-    """根据本地IP和子网掩码获取网络范围"""
+def get_network_range(local_ip, subnet_mask=None):
+    """根据本地IP和子网掩码获取网络范围
+
+    未指定subnet_mask时使用该地址所在网卡的实际前缀，找不到网卡时按/24处理
+    """
+    if subnet_mask is None:
+        for interface in get_interfaces():
+            if interface['ip'] == str(local_ip):
+                return interface['network']
+        subnet_mask = '255.255.255.0'
     # 计算网络地址和广播地址
     ip = ipaddress.IPv4Address(local_ip)
     mask = ipaddress.IPv4Address(subnet_mask)
     network = ipaddress.IPv4Network(f'{ip}/{mask}', strict=False)
     return network
 
-async def ping_host(ip):
+def ip_to_int(ip):
+    """IPv4地址(字符串、IPv4Address或整数)转为32位整数，无效地址抛出ValueError"""
+    if isinstance(ip, int):
+        return ip
+    try:
+        return struct.unpack('!I', socket.inet_aton(str(ip)))[0]
+    except OSError:
+        raise ValueError(f'无效的IPv4地址: {ip}')
+
+def int_to_ip(value):
+    """32位整数转为点分十进制字符串，只在输出和发送探测时调用"""
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+def _format_mac(raw):
+    return ':'.join(f'{b:02x}' for b in raw)
+
+def ip_ints(ips):
+    """把地址序列转为整数，跳过无效地址"""
+    for ip in ips:
+        try:
+            yield ip_to_int(ip)
+        except ValueError:
+            continue
+
+def parse_address_spec(spec, _files=()):
+    """把一项地址描述解析为整数区间列表[(起始, 结束)]
+
+    支持的格式:
+        192.168.1.10             单个地址
+        192.168.16.0/20          CIDR网段(包括网络地址和广播地址)
+        192.168.1.100-192.168.1.199 或 192.168.1.100-199   地址范围
+        @hosts.txt               文件中每行一项(可用逗号分隔，也可以再用@引用其他文件)，#之后为注释
+    也接受整数、IPv4Address和IPv4Network。无效的描述、无法读取的文件和循环引用的文件抛出ValueError。
+    _files为正在读取的文件(内部使用，用于发现循环引用)。
+    """
+    if isinstance(spec, int):
+        return [(spec, spec)]
+    if isinstance(spec, ipaddress.IPv4Network):
+        return [(int(spec.network_address), int(spec.broadcast_address))]
+    if isinstance(spec, ipaddress.IPv4Address):
+        return [(int(spec), int(spec))]
+
+    spec = str(spec).strip()
+    # 只有以@开头的描述是文件，与地址同名的文件不会被误读
+    if spec.startswith('@'):
+        path = spec[1:]
+        key = os.path.realpath(path)
+        if key in _files:
+            raise ValueError(f'地址文件循环引用: {path}')
+        intervals = []
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    for item in line.split('#', 1)[0].split(','):
+                        if item.strip():
+                            intervals.extend(parse_address_spec(item, _files + (key,)))
+        except (OSError, UnicodeDecodeError) as e:
+            raise ValueError(f'无法读取地址文件 {path}: {e}')
+        return intervals
+
+    try:
+        if '/' in spec:
+            network = ipaddress.IPv4Network(spec, strict=False)
+            return [(int(network.network_address), int(network.broadcast_address))]
+        if '-' in spec:
+            low, high = (part.strip() for part in spec.split('-', 1))
+            if high.isdigit():
+                # 简写形式，只给出结束地址的最后一段
+                high = low.rsplit('.', 1)[0] + '.' + high
+            start, end = int(ipaddress.IPv4Address(low)), int(ipaddress.IPv4Address(high))
+            if start > end:
+                raise ValueError(f'地址范围起点大于终点: {spec}')
+            return [(start, end)]
+        value = int(ipaddress.IPv4Address(spec))
+        return [(value, value)]
+    except ipaddress.AddressValueError:
+        raise ValueError(f'无效的地址描述: {spec}')
+
+class AddressSet:
+    """整数地址区间的集合
+
+    区间按起点排序并合并相邻和重叠的部分，成员判断用bisect，
+    复杂度只和区间数有关，排除一个/20和排除一个地址的开销相同。
+    """
+
+    def __init__(self, intervals=()):
+        self.starts = array.array('I')
+        self.ends = array.array('I')
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1] + 1:
+                if end > self.ends[-1]:
+                    self.ends[-1] = end
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    @classmethod
+    def parse(cls, specs):
+        """由地址描述(见parse_address_spec)构造集合
+
+        specs可以是None、AddressSet、单个描述(字符串中可用逗号分隔多项)或描述的序列
+        """
+        if specs is None:
+            return cls()
+        if isinstance(specs, AddressSet):
+            return specs
+        if isinstance(specs, (str, int, ipaddress.IPv4Address, ipaddress.IPv4Network)):
+            specs = [specs]
+        intervals = []
+        for spec in specs:
+            items = spec.split(',') if isinstance(spec, str) else [spec]
+            for item in items:
+                if not isinstance(item, str) or item.strip():
+                    intervals.extend(parse_address_spec(item))
+        return cls(intervals)
+
+    def __contains__(self, value):
+        index = bisect.bisect_right(self.starts, value) - 1
+        return index >= 0 and value <= self.ends[index]
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def __bool__(self):
+        return len(self.starts) > 0
+
+    def __repr__(self):
+        return f'AddressSet({list(self)!r})'
+
+    def count(self):
+        """集合中的地址总数"""
+        return sum(end - start + 1 for start, end in self)
+
+    def clip(self, first, last):
+        """只保留[first, last]之内的部分"""
+        return AddressSet((max(start, first), min(end, last)) for start, end in self
+                          if end >= first and start <= last)
+
+    def subtract(self, other):
+        """返回去掉other中地址之后的新集合"""
+        intervals = []
+        others = list(other)
+        index = 0
+        for start, end in self:
+            # 跳过完全在当前区间之前的部分
+            while index < len(others) and others[index][1] < start:
+                index += 1
+            position = index
+            while start <= end and position < len(others) and others[position][0] <= end:
+                low, high = others[position]
+                if low > start:
+                    intervals.append((start, low - 1))
+                start = max(start, high + 1)
+                position += 1
+            if start <= end:
+                intervals.append((start, end))
+        return AddressSet(intervals)
+
+    def addresses(self, skip=0):
+        """按顺序产出集合中的整数地址，skip为跳过的地址数(从中断处继续)"""
+        for start, end in self:
+            size = end - start + 1
+            if skip >= size:
+                skip -= size
+                continue
+            yield from range(start + skip, end + 1)
+            skip = 0
+
+    def shuffled(self, rng=None, skip=0):
+        """按随机顺序产出集合中的整数地址
+
+        使用仿射置换 i -> (a * i + c) mod n (a与n互质)把序号打乱，
+        不需要生成并打乱整个地址列表，内存占用只和区间数有关。
+        相同种子的rng得到相同的顺序，skip为跳过的地址数(从中断处继续)。
+        """
+        rng = rng or random.Random()
+        total = self.count()
+        if total == 0:
+            return
+        # 每个区间第一个地址的序号，用于把序号映射回地址
+        offsets = []
+        position = 0
+        for start, end in self:
+            offsets.append(position)
+            position += end - start + 1
+        multiplier = 1
+        if total > 2:
+            while True:
+                multiplier = rng.randrange(total // 2, total)
+                if math.gcd(multiplier, total) == 1:
+                    break
+        increment = rng.randrange(total)
+        for index in range(skip, total):
+            position = (multiplier * index + increment) % total
+            interval = bisect.bisect_right(offsets, position) - 1
+            yield self.starts[interval] + position - offsets[interval]
+
+def _interface_ioctl(sock, request, ifname):
+    import fcntl
+    return fcntl.ioctl(sock.fileno(), request, struct.pack('256s', ifname[:15].encode()))
+
+def get_interface_info(ifname):
+    """获取网卡的IPv4地址、所在网段和MAC地址，网卡没有IPv4地址时返回None"""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        ip = socket.inet_ntoa(_interface_ioctl(s, SIOCGIFADDR, ifname)[20:24])
+        mask = socket.inet_ntoa(_interface_ioctl(s, SIOCGIFNETMASK, ifname)[20:24])
+        hwaddr = _interface_ioctl(s, SIOCGIFHWADDR, ifname)[18:24]
+    except (OSError, ImportError):
+        return None
+    finally:
+        s.close()
+    return {
+        'name': ifname,
+        'ip': ip,
+        'network': ipaddress.IPv4Network(f'{ip}/{mask}', strict=False),
+        'mac': _format_mac(hwaddr),
+    }
+
+def get_interface_mac(ifname):
+    """获取网卡的MAC地址，没有链路层地址时返回'00:00:00:00:00:00'"""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        return _format_mac(_interface_ioctl(s, SIOCGIFHWADDR, ifname)[18:24])
+    except (OSError, ImportError):
+        return '00:00:00:00:00:00'
+    finally:
+        s.close()
+
+def get_interfaces():
+    """列出本机所有IPv4地址及其所在网段(含VLAN子接口和同一网卡上的多个地址)
+
+    通过netlink读取每个地址的实际前缀长度，平台不支持时退回到按网卡名ioctl查询
+    (每个网卡只能得到主地址)。
+
+    返回:
+        [{'name': 网卡名, 'ip': 地址, 'network': IPv4Network, 'mac': MAC地址}, ...]，不含回环地址
+    """
+    try:
+        addresses = netlink.dump_addresses()
+    except OSError:
+        addresses = None
+    interfaces = []
+    if addresses is None:
+        try:
+            names = socket.if_nameindex()
+        except (OSError, AttributeError):
+            return []
+        interfaces = [info for info in (get_interface_info(name) for _, name in names) if info]
+    else:
+        macs = {}
+        for address in addresses:
+            try:
+                name = socket.if_indextoname(address['ifindex'])
+            except OSError:
+                continue
+            if name not in macs:
+                macs[name] = get_interface_mac(name)
+            interfaces.append({
+                'name': name,
+                'ip': address['ip'],
+                'network': ipaddress.IPv4Network(f"{address['ip']}/{address['prefixlen']}", strict=False),
+                'mac': macs[name],
+            })
+    return [interface for interface in interfaces if not ipaddress.IPv4Address(interface['ip']).is_loopback]
+
+def find_interface(network):
+    """查找与目标网段直接相连的网卡(ARP只能在本地网段内使用)"""
+    for info in get_interfaces():
+        if info['mac'] == '00:00:00:00:00:00':
+            continue  # 跳过没有链路层地址的网卡
+        if info['network'].overlaps(network):
+            return info
+    return None
+
+async def arp_sweep(network, interface=None, exclude_ips=None, timeout=0.6, retries=1, hosts=None, limiter=None):
+    """通过AF_PACKET socket对整个网段广播ARP请求，一次性得到在线主机的IP和MAC
+
+    参数:
+        network: 目标网段(IPv4Network)
+        interface: 网卡信息(get_interface_info的返回值)，为空时自动查找
+        exclude_ips: 要排除的地址(格式见AddressSet.parse)
+        timeout: 等待应答的总时间(秒)，平均分配给每一轮请求
+        retries: 对未应答地址重发请求的次数
+        hosts: 要探测的地址(字符串、IPv4Address或整数)，默认为网段内的所有主机地址
+        limiter: RateLimiter，限制ARP请求的发送速率
+
+    返回:
+        [{'ip': ..., 'mac': ...}, ...]
+        目标网段不在本地链路上、平台不支持或没有权限时抛出OSError
+    """
+    if not hasattr(socket, 'AF_PACKET'):
+        raise OSError('当前平台不支持AF_PACKET')
+    if interface is None:
+        interface = find_interface(network)
+    if interface is None:
+        raise OSError(f'没有与 {network} 直接相连的网卡')
+
+    exclude = AddressSet.parse(exclude_ips)
+    if hosts is None:
+        first, last = host_bounds(network)
+        hosts = range(first, last + 1)
+    targets = [value for value in ip_ints(hosts) if value not in exclude]
+    target_set = set(targets)
+    found = {}
+
+    # 本机不会应答自己发出的ARP请求，直接记录
+    local_value = ip_to_int(interface['ip'])
+    if local_value in target_set:
+        found[local_value] = interface['mac']
+
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+    sock.bind((interface['name'], ETH_P_ARP))
+    sock.setblocking(False)
+
+    src_mac = bytes.fromhex(interface['mac'].replace(':', ''))
+    src_ip = socket.inet_aton(interface['ip'])
+    frame_head = b'\xff' * 6 + src_mac + struct.pack('!H', ETH_P_ARP)
+    arp_head = struct.pack('!HHBBH', 1, 0x0800, 6, 4, ARP_REQUEST) + src_mac + src_ip + b'\x00' * 6
+
+    def on_readable():
+        while True:
+            try:
+                frame = sock.recv(128)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if len(frame) < 42:
+                continue
+            op = struct.unpack('!H', frame[20:22])[0]
+            if op != ARP_REPLY:
+                continue
+            sender = struct.unpack('!I', frame[28:32])[0]
+            if sender in target_set and sender not in found:
+                found[sender] = _format_mac(frame[22:28])
+
+    loop = asyncio.get_running_loop()
+    loop.add_reader(sock.fileno(), on_readable)
+    try:
+        for _ in range(retries + 1):
+            pending = [value for value in targets if value not in found]
+            if not pending:
+                break
+            for count, value in enumerate(pending, 1):
+                if limiter is not None:
+                    await limiter.acquire()
+                frame = frame_head + arp_head + struct.pack('!I', value)
+                while True:
+                    try:
+                        sock.send(frame)
+                        break
+                    except BlockingIOError:
+                        await asyncio.sleep(0.001)
+                if count % 256 == 0:
+                    # 让出事件循环以便及时处理应答
+                    await asyncio.sleep(0)
+            await asyncio.sleep(timeout / (retries + 1))
+    finally:
+        loop.remove_reader(sock.fileno())
+        sock.close()
+
+    return [{'ip': int_to_ip(value), 'mac': mac} for value, mac in found.items()]
+
+async def broadcast_discover(network, interface=None, timeout=0.5, engine=None, limiter=None):
+    """扫描前的预探测: 向网段广播地址发送ICMP回显，并向本地组播组发送mDNS和SSDP查询
+
+    查询从临时端口发出，响应者按"传统单播"方式直接回复到该端口，不需要加入组播组。
+    所有应答在timeout秒内收集，返回应答者的IP集合(字符串)。组播只在本地链路上有效，
+    目标网段不与本机直接相连时只发送广播ICMP。
+
+    参数:
+        network: 目标网段(IPv4Network)
+        interface: 网卡信息(get_interface_info的返回值)，为空时自动查找
+        engine: 已打开的IcmpEngine，为空时临时打开一个
+        limiter: RateLimiter，每个查询包占用一个令牌
+    """
+    if interface is None:
+        interface = find_interface(network)
+    responders = set()
+    sockets = []
+    loop = asyncio.get_running_loop()
+
+    def on_readable(sock):
+        while True:
+            try:
+                _, addr = sock.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            responders.add(addr[0])
+
+    if interface is not None:
+        queries = [
+            (MDNS_GROUP, build_query(0, MDNS_SERVICES_NAME, DNS_TYPE_PTR, flags=0)),
+            (SSDP_GROUP, SSDP_SEARCH),
+        ]
+        for group, payload in queries:
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.setblocking(False)
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface['ip']))
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+                sock.bind((interface['ip'], 0))
+            except OSError:
+                continue
+            sockets.append(sock)
+            loop.add_reader(sock.fileno(), on_readable, sock)
+            if limiter is not None:
+                await limiter.acquire()
+            try:
+                sock.sendto(payload, group)
+            except OSError:
+                pass
+
+    owns_engine = engine is None
+    if owns_engine:
+        engine = IcmpEngine.open()
+    try:
+        if engine is not None and network.prefixlen < 31:
+            if limiter is not None:
+                await limiter.acquire()
+            responders |= await engine.broadcast(network.broadcast_address, timeout)
+        else:
+            await asyncio.sleep(timeout)
+    finally:
+        if owns_engine and engine is not None:
+            engine.close()
+        for sock in sockets:
+            loop.remove_reader(sock.fileno())
+            sock.close()
+
+    return responders
+
+def get_ipv6_interfaces(path='/proc/net/if_inet6'):
+    """读取本机的IPv6地址，返回有链路本地地址的网卡
+
+    返回:
+        [{'name': 网卡名, 'index': 网卡序号, 'addresses': [IPv6地址, ...]}, ...]，不含回环网卡
+    """
+    interfaces = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 6 or fields[5] == 'lo':
+                    continue
+                try:
+                    address = ipaddress.IPv6Address(bytes.fromhex(fields[0]))
+                    index = int(fields[1], 16)
+                except ValueError:
+                    continue
+                interface = interfaces.setdefault(fields[5], {'name': fields[5], 'index': index, 'addresses': [],
+                                                              'link_local': False})
+                interface['addresses'].append(str(address))
+                interface['link_local'] |= address.is_link_local
+    except OSError:
+        return []
+    return [{'name': i['name'], 'index': i['index'], 'addresses': i['addresses']}
+            for i in interfaces.values() if i['link_local']]
+
+def _open_icmpv6(hop_options=None):
+    sock = socket.socket(socket.AF_INET6, socket.SOCK_RAW, socket.IPPROTO_ICMPV6)
+    try:
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, 1)
+        if hop_options is not None:
+            sock.setsockopt(socket.IPPROTO_IPV6, IPV6_HOPOPTS, hop_options)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+async def ipv6_discover(interfaces=None, timeout=1.0, limiter=None):
+    """IPv6邻居发现: /64无法遍历，改为让链路上的主机自己应答
+
+    在每个网卡上向ff02::1发送ICMPv6回显请求和MLD通用查询，收集回显应答和MLDv2报告的源地址，
+    再向每个应答者单播一次回显请求，让内核完成邻居解析，最后从内核的IPv6邻居表读取(IPv6, MAC)。
+    Windows不应答组播回显，但会应答MLD查询。没有root权限时只读取现有的邻居表。
+
+    参数:
+        interfaces: get_ipv6_interfaces的返回值，为空时使用所有有链路本地地址的网卡
+        timeout: 等待应答的时间(秒)
+        limiter: RateLimiter，每个查询包占用一个令牌
+
+    返回:
+        [{'ip': IPv6地址, 'mac': MAC地址, 'interface': 网卡名}, ...]，平台不支持时返回空列表
+    """
+    if interfaces is None:
+        interfaces = get_ipv6_interfaces()
+    if not interfaces:
+        return []
+    names = {interface['index']: interface['name'] for interface in interfaces}
+    local = {address for interface in interfaces for address in interface['addresses']}
+    ident = random.randint(0, 0xffff)
+    responders = {}
+    sockets = []
+    loop = asyncio.get_running_loop()
+
+    def on_readable(sock):
+        while True:
+            try:
+                packet, addr = sock.recvfrom(1500)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if not packet:
+                continue
+            if packet[0] == ICMPV6_ECHO_REPLY:
+                if len(packet) < 8 or struct.unpack('!H', packet[4:6])[0] != ident:
+                    continue
+            elif packet[0] not in (MLD_REPORT, MLDV2_REPORT):
+                continue
+            address = addr[0].split('%')[0]
+            # 全局地址的应答没有scope_id(为0)，单播时也不需要
+            if address not in local and (addr[3] in names or addr[3] == 0):
+                responders[address] = addr[3]
+
+    async def send(sock, packet, address, index):
+        if limiter is not None:
+            await limiter.acquire()
+        try:
+            sock.sendto(packet, (address, 0, 0, index))
+        except OSError:
+            pass
+
+    try:
+        try:
+            echo_sock = _open_icmpv6()
+            sockets.append(echo_sock)
+            mld_sock = _open_icmpv6(MLD_HOP_OPTIONS)
+            sockets.append(mld_sock)
+        except OSError:
+            echo_sock = mld_sock = None
+        if mld_sock is not None:
+            for sock in sockets:
+                loop.add_reader(sock.fileno(), on_readable, sock)
+            echo = struct.pack('!BBHHH', ICMPV6_ECHO_REQUEST, 0, 0, ident, 1) + b'lan_scanner'
+            # MLDv2通用查询(RFC 3810): 最大响应延迟1000毫秒，组地址为::，QRV=2，QQIC=125秒，没有源地址。
+            # 不用MLDv1格式，否则对方会退回v1兼容模式，报告发往各个组地址而收不到
+            query = struct.pack('!BBHHH', MLD_QUERY, 0, 0, 1000, 0) + bytes(16) + struct.pack('!BBH', 2, 125, 0)
+            for interface in interfaces:
+                index = interface['index']
+                # MLDv2报告发往ff02::16，加入该组才能收到
+                try:
+                    mld_sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP,
+                                        socket.inet_pton(socket.AF_INET6, IPV6_MLDV2_ROUTERS) + struct.pack('@I', index))
+                except OSError:
+                    pass
+                await send(echo_sock, echo, IPV6_ALL_NODES, index)
+                await send(mld_sock, query, IPV6_ALL_NODES, index)
+                # 从链路本地地址发出的回显只会得到链路本地地址的应答，
+                # 再从本机的每个全局地址各发一次，让对方用同一范围的地址应答
+                for source in interface['addresses']:
+                    if ipaddress.IPv6Address(source).is_link_local:
+                        continue
+                    if limiter is not None:
+                        await limiter.acquire()
+                    pktinfo = socket.inet_pton(socket.AF_INET6, source) + struct.pack('@I', index)
+                    try:
+                        echo_sock.sendmsg([echo], [(socket.IPPROTO_IPV6, socket.IPV6_PKTINFO, pktinfo)],
+                                          0, (IPV6_ALL_NODES, 0, 0, index))
+                    except OSError:
+                        pass
+            await asyncio.sleep(timeout)
+            # 单播回显让内核对每个应答者做邻居解析
+            for address, index in list(responders.items()):
+                await send(echo_sock, echo, address, index)
+            await asyncio.sleep(min(timeout, 0.3))
+    finally:
+        for sock in sockets:
+            loop.remove_reader(sock.fileno())
+            sock.close()
+
+    try:
+        neighbors = netlink.dump_neighbors(socket.AF_INET6)
+    except OSError:
+        return []
+    results = []
+    for neighbor in neighbors:
+        address = ipaddress.IPv6Address(neighbor['ip'])
+        if (neighbor['mac'] is None or neighbor['ifindex'] not in names or address.is_multicast
+                or netlink.presence_of(neighbor['state']) == 'offline'):
+            continue
+        results.append({'ip': neighbor['ip'], 'mac': neighbor['mac'], 'interface': names[neighbor['ifindex']]})
+    return results
+
+def attach_ipv6(hosts, neighbors):
+    """按MAC地址把IPv6邻居附加到IPv4扫描结果，每台主机的'ipv6'为其IPv6地址列表"""
+    by_mac = collections.defaultdict(list)
+    for neighbor in neighbors:
+        by_mac[neighbor['mac']].append(neighbor['ip'])
+    for host in hosts:
+        host['ipv6'] = sorted(by_mac.get(host['mac'], []), key=ipaddress.IPv6Address)
+    return hosts
+
+class AdaptiveConcurrency:
+    """AIMD(加性增、乘性减)自适应并发控制器，取代固定大小的信号量
+
+    开始时每完成一个探测并发上限加1(慢启动)，第一次出现拥塞信号后改为每完成
+    约"当前上限"个探测加1；出现拥塞信号时上限乘以decrease，始终限制在
+    [min_limit, max_limit]之内。拥塞信号包括:
+      - 发送失败(ENOBUFS等本机资源不足)
+      - 预期在线的主机(如ARP表中的设备)探测超时
+      - 一批应答的RTT中位数明显高于此前最好的一批
+    空地址的超时是扫描的常态，不作为拥塞信号。两次减小之间至少间隔cooldown秒，
+    避免同一次拥塞中在途的探测反复触发。
+    """
+
+    def __init__(self, initial=100, min_limit=8, max_limit=1024, decrease=0.5,
+                 rtt_window=32, rtt_tolerance=3.0, cooldown=1.0):
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.decrease = decrease
+        self.rtt_window = rtt_window
+        self.rtt_tolerance = rtt_tolerance
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.peak = self.current
+        self.slow_start = True
+        self.last_decrease = None
+        self.best_rtt = None
+        self._rtts = []
+        self._waiters = collections.deque()
+
+    @property
+    def current(self):
+        """当前有效并发数"""
+        return int(self.limit)
+
+    async def acquire(self):
+        while self.in_flight >= self.current:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def _wake(self):
+        free = self.current - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def _increase(self):
+        self.limit += 1 if self.slow_start else 1 / self.limit
+        self.limit = min(self.limit, self.max_limit)
+        self.peak = max(self.peak, self.current)
+        self._wake()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if self.last_decrease is not None and now - self.last_decrease < self.cooldown:
+            return
+        self.last_decrease = now
+        self.slow_start = False
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+
+    def on_success(self, rtt=None):
+        """探测得到应答，rtt为往返时间(秒)"""
+        if rtt is not None:
+            self._rtts.append(rtt)
+            if len(self._rtts) >= self.rtt_window:
+                median = sorted(self._rtts)[len(self._rtts) // 2]
+                self._rtts = []
+                if self.best_rtt is None or median < self.best_rtt:
+                    self.best_rtt = median
+                elif median > self.best_rtt * self.rtt_tolerance + 0.005:
+                    self._decrease()
+                    return
+        self._increase()
+
+    def on_timeout(self, expected=False):
+        """探测超时，expected表示该主机预期在线"""
+        if expected:
+            self._decrease()
+        else:
+            self._increase()
+
+    def on_error(self):
+        """发送失败"""
+        self._decrease()
+
+class RateLimiter:
+    """令牌桶发包速率限制，所有探测方式(ICMP、ARP、TCP、系统ping)共用
+
+    令牌以rate个/秒的速度补充，最多积累burst个；每发一个探测包取一个令牌。
+    令牌不足时按先后顺序预约后续的令牌并等待，发包速度平稳，不会出现突发。
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('发包速率必须大于0')
+        self.rate = rate
+        self.burst = max(1, burst if burst is not None else int(rate // 10))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self, count=1):
+        """取count个令牌，令牌不足时等待"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # 允许令牌数为负，表示已经预约给在等待的探测
+        self.tokens -= count
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+class ScanDeadline:
+    """整次扫描的时间预算，到期时返回部分结果而不是超时运行
+
+    发现阶段在截止前reserve秒停止取新地址并取消仍在进行的探测，留出时间给已发现主机的
+    MAC和主机名阶段；这些补充阶段以及服务识别、IPv6发现只能使用剩余时间，到期即放弃，
+    主机保留'Unknown'等默认值。total和done为目标地址数和已探测完成的地址数，
+    coverage为覆盖比例(1.0表示完整扫描)，dropped记录每个阶段被放弃的次数。
+    """
+
+    def __init__(self, seconds, reserve=None):
+        self.seconds = seconds
+        self.at = time.monotonic() + seconds
+        # 默认留出预算的10%，最多2秒
+        self.reserve = reserve if reserve is not None else min(2.0, seconds * 0.1)
+        self.total = 0
+        self.done = 0
+        self.dropped = collections.Counter()
+
+    def remaining(self):
+        """距截止时间的秒数，已过期时为负数"""
+        return self.at - time.monotonic()
+
+    def probe_remaining(self):
+        """发现阶段还可以使用的秒数"""
+        return self.remaining() - self.reserve
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    @property
+    def coverage(self):
+        return self.done / self.total if self.total else 1.0
+
+    async def limit(self, awaitable, stage, default=None):
+        """在剩余时间内等待awaitable，到期时取消它、记录放弃的阶段并返回default"""
+        try:
+            return await asyncio.wait_for(awaitable, max(self.remaining(), 0))
+        except asyncio.TimeoutError:
+            self.dropped[stage] += 1
+            return default
+
+    def summary(self):
+        """返回如'覆盖 63% (161/254)，放弃: 主机名(3)'的说明"""
+        text = f'覆盖 {self.coverage:.0%} ({self.done}/{self.total})'
+        if self.dropped:
+            text += '，放弃: ' + ', '.join(f'{stage}({count})' for stage, count in self.dropped.items())
+        return text
+
+def _icmp_checksum(data):
+    """计算ICMP校验和(RFC 1071)"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+class IcmpEngine:
+    """单socket的ICMP回显引擎
+
+    所有回显请求都从同一个socket发出，应答按(源IP, 序列号)匹配到等待中的请求，
+    避免为每个地址启动一个ping子进程。Linux下优先使用非特权的SOCK_DGRAM ICMP
+    socket(内核负责填写标识符)，否则在有权限时使用原始socket。
+    """
+
+    def __init__(self, sock, raw):
+        self.sock = sock
+        self.raw = raw
+        self.seq = 0
+        self.pending = {}
+        self.listeners = {}
+        self.loop = asyncio.get_running_loop()
+        if raw:
+            self.ident = random.randrange(1, 0xffff)
+        else:
+            # SOCK_DGRAM模式下内核用本地端口作为ICMP标识符
+            self.sock.bind(('', 0))
+            self.ident = self.sock.getsockname()[1]
+        self.loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    @classmethod
+    def open(cls):
+        """打开ICMP socket，不可用(无权限或平台不支持)时返回None"""
+        candidates = []
+        if platform.system().lower() in ('linux', 'darwin'):
+            candidates.append((socket.SOCK_DGRAM, False))
+        candidates.append((socket.SOCK_RAW, True))
+
+        for sock_type, raw in candidates:
+            try:
+                sock = socket.socket(socket.AF_INET, sock_type, socket.IPPROTO_ICMP)
+            except (OSError, AttributeError):
+                continue
+            sock.setblocking(False)
+            try:
+                return cls(sock, raw)
+            except (OSError, NotImplementedError):
+                # 例如Windows的Proactor事件循环不支持add_reader
+                sock.close()
+        return None
+
+    def _build_packet(self, seq):
+        payload = struct.pack('!d', time.monotonic()).ljust(56, b'\x00')
+        header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, self.ident, seq)
+        checksum = _icmp_checksum(header + payload)
+        header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, self.ident, seq)
+        return header + payload
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if self.raw:
+                # 原始socket收到的数据包含IP头
+                data = data[(data[0] & 0x0f) * 4:] if data else data
+            if len(data) < 8:
+                continue
+            icmp_type, _, _, ident, seq = struct.unpack('!BBHHH', data[:8])
+            if icmp_type != ICMP_ECHO_REPLY:
+                continue
+            # 非特权socket只会收到发给自己的应答，原始socket需要校验标识符
+            if self.raw and ident != self.ident:
+                continue
+            # 广播请求的应答来自多个地址，全部记录下来
+            listener = self.listeners.get(seq)
+            if listener is not None:
+                listener.add(addr[0])
+                continue
+            future = self.pending.pop((addr[0], seq), None)
+            if future is not None and not future.done():
+                future.set_result(time.monotonic())
+
+    async def ping(self, ip, timeout=1.0):
+        """向ip发送一次回显请求，返回往返时间(秒)，超时返回None
+
+        发送失败时抛出OSError。
+        """
+        ip = str(ip)
+        self.seq = (self.seq + 1) & 0xffff
+        key = (ip, self.seq)
+        future = self.loop.create_future()
+        self.pending[key] = future
+        packet = self._build_packet(self.seq)
+        try:
+            for _ in range(50):
+                try:
+                    sent_at = time.monotonic()
+                    self.sock.sendto(packet, (ip, 0))
+                    break
+                except BlockingIOError:
+                    # 发送缓冲区已满，稍后重试
+                    await asyncio.sleep(0.001)
+            else:
+                raise BlockingIOError('ICMP发送缓冲区已满')
+            received_at = await asyncio.wait_for(future, timeout)
+            return received_at - sent_at
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.pending.pop(key, None)
+
+    async def broadcast(self, address, timeout=0.5):
+        """向广播地址发送一次回显请求，返回timeout秒内应答的所有IP
+
+        多数系统默认忽略广播ping，只有部分设备(打印机、嵌入式设备等)会应答。
+        """
+        self.seq = (self.seq + 1) & 0xffff
+        seq = self.seq
+        responders = set()
+        self.listeners[seq] = responders
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            self.sock.sendto(self._build_packet(seq), (str(address), 0))
+            await asyncio.sleep(timeout)
+        except OSError:
+            pass
+        finally:
+            self.listeners.pop(seq, None)
+        return responders
+
+    def close(self):
+        """关闭socket并取消所有等待中的请求"""
+        try:
+            self.loop.remove_reader(self.sock.fileno())
+        except (ValueError, OSError):
+            pass
+        self.sock.close()
+        for future in self.pending.values():
+            if not future.done():
+                future.cancel()
+        self.pending.clear()
+
+async def _ping_subprocess(ip, timeout=1.0):
+    """调用系统ping命令检测主机(ICMP socket不可用时的后备方案)"""
     os_type = platform.system().lower()
     if os_type == 'windows':
-        command = ['ping', '-n', '1', '-w', '1000', str(ip)]  # 缩短超时时间
+        command = ['ping', '-n', '1', '-w', str(int(timeout * 1000)), str(ip)]
     elif os_type == 'linux':
-        command = ['ping', '-c', '1', '-W', '1', str(ip)]  # 缩短等待时间
+        # -W只接受整数秒
+        command = ['ping', '-c', '1', '-W', str(max(1, math.ceil(timeout))), str(ip)]
     else:
         return False
 
     try:
-        # 设置子进程超时为2秒
+        # 子进程启动和等待的保护超时随探测超时调整
         proc = await asyncio.wait_for(
             asyncio.create_subprocess_exec(
                 *command,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             ),
-            timeout=2.0
+            timeout=timeout + 1.0
         )
-        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=5.0)
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout + 4.0)
         return proc.returncode == 0
     except (asyncio.TimeoutError, subprocess.SubprocessError, Exception):
         return False
 
-async def get_hostname(ip):
-    """根据IP地址获取主机名(异步版)"""
-    ip_str = str(ip)
+class RttEstimator:
+    """平滑RTT和RTT偏差估计(RFC 6298)"""
 
-    # 方法1: 标准DNS解析（异步）
-    try:
-        loop = asyncio.get_event_loop()
-        hostname, _, _ = await loop.run_in_executor(None, socket.gethostbyaddr, ip_str)
-        return hostname
-    except (socket.herror, socket.gaierror):
-        pass
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.backoff = 1
 
-    # Linux系统专用多重fallback
-    if platform.system().lower() == 'linux':
-        # 方法2: 异步执行getent命令
-        try:
-            proc = await asyncio.create_subprocess_exec(
-                'getent', 'hosts', ip_str,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, _ = await proc.communicate()
-            result = stdout.decode().strip()
-            parts = result.split()
-            if len(parts) >= 2 and parts[0] == ip_str:
-                return parts[1]
-        except (asyncio.TimeoutError, subprocess.SubprocessError):
-            pass
+    def update(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.backoff = 1
 
-        # 方法3: 异步读取/etc/hosts文件
-        try:
-            loop = asyncio.get_event_loop()
-            with await loop.run_in_executor(None, open, '/etc/hosts', 'r') as f:
-                content = await loop.run_in_executor(None, f.read)
-                for line in content.split('\n'):
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    columns = line.split()
-                    if columns and columns[0] == ip_str and len(columns) >= 2:
-                        return columns[1]
-        except IOError:
-            pass
+    def rto(self, granularity=0.01):
+        """超时时间 = (SRTT + max(G, 4*RTTVAR)) * 退避倍数"""
+        return (self.srtt + max(granularity, 4 * self.rttvar)) * self.backoff
+
+class TimingModel:
+    """按主机和子网估计RTT，为每次探测给出超时时间和重试次数
+
+    - 有历史应答的主机: 按该主机的RTT估计超时，并重试2次，避免慢速主机被误判离线；
+      连续超时按倍数退避
+    - 子网内有应答、但该地址没有历史的主机: 按子网的RTT估计超时，且不低于子网平滑RTT的2倍
+      (同一子网的设备响应快慢不一)，超时较短时重试1次；空地址段的扫描因此随样本增加而加快
+    - 完全没有数据: 使用initial_timeout，不重试
+    超时时间限制在[min_timeout, max_timeout]之内。主机的估计可以通过export()/load()
+    保存到数据库，供后续扫描使用。
+    """
+
+    def __init__(self, initial_timeout=1.0, min_timeout=0.1, max_timeout=3.0, subnet_prefix=24):
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.subnet_prefix = subnet_prefix
+        self.subnet_mask = (0xFFFFFFFF << (32 - subnet_prefix)) & 0xFFFFFFFF
+        self.hosts = {}
+        self.subnets = {}
+
+    def _subnet(self, ip):
+        return ip_to_int(ip) & self.subnet_mask
+
+    def _clamp(self, timeout):
+        return min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def plan(self, ip):
+        """返回(超时秒数, 重试次数)"""
+        ip = str(ip)
+        host = self.hosts.get(ip)
+        if host is not None and host.srtt is not None:
+            return self._clamp(host.rto()), 2
+        subnet = self.subnets.get(self._subnet(ip))
+        if subnet is not None and subnet.srtt is not None:
+            timeout = self._clamp(max(subnet.rto(), 2 * subnet.srtt))
+            return timeout, 1 if timeout * 2 <= self.initial_timeout else 0
+        return self.initial_timeout, 0
+
+    def observe(self, ip, rtt):
+        """记录一次应答的往返时间"""
+        ip = str(ip)
+        self.hosts.setdefault(ip, RttEstimator()).update(rtt)
+        self.subnets.setdefault(self._subnet(ip), RttEstimator()).update(rtt)
+
+    def observe_timeout(self, ip):
+        """记录一次超时，有历史的主机下次使用加倍的超时时间"""
+        host = self.hosts.get(str(ip))
+        if host is not None:
+            host.backoff = min(host.backoff * 2, 8)
+
+    def is_known(self, ip):
+        return str(ip) in self.hosts
+
+    def limited(self, max_timeout):
+        """返回共用同一组RTT估计、但超时上限为max_timeout的视图"""
+        view = TimingModel(min(self.initial_timeout, max_timeout), min(self.min_timeout, max_timeout),
+                           max_timeout, self.subnet_prefix)
+        view.hosts = self.hosts
+        view.subnets = self.subnets
+        return view
+
+    def export(self):
+        """导出主机的估计: [(ip, srtt, rttvar), ...]"""
+        return [(ip, est.srtt, est.rttvar) for ip, est in self.hosts.items() if est.srtt is not None]
+
+    def load(self, rows):
+        """载入export()导出的估计"""
+        for ip, srtt, rttvar in rows:
+            estimator = RttEstimator()
+            estimator.srtt = srtt
+            estimator.rttvar = rttvar
+            self.hosts[ip] = estimator
+            subnet = self.subnets.setdefault(self._subnet(ip), RttEstimator())
+            subnet.update(srtt)
 
-        # 方法4: 异步FQDN解析
+async def ping_host(ip, engine=None, controller=None, timing=None, limiter=None):
+    """检测主机是否在线，提供ICMP引擎时使用内置引擎，否则调用系统ping命令
+
+    提供timing(TimingModel)时按其估计决定超时和重试次数，并把测得的RTT反馈给它；
+    发送失败时通知并发控制器(controller.on_error)。
+    提供limiter(RateLimiter)时每次发送前先取得令牌。
+    """
+    timeout, retries = timing.plan(ip) if timing is not None else (1.0, 0)
+    for _ in range(retries + 1):
+        if limiter is not None:
+            await limiter.acquire()
+        if engine is None:
+            if await _ping_subprocess(ip, timeout):
+                return True
+            continue
         try:
-            loop = asyncio.get_event_loop()
-            fqdn = await loop.run_in_executor(None, socket.getfqdn, ip_str)
-            if fqdn != ip_str:
-                return fqdn
-        except socket.error:
-            pass
+            rtt = await engine.ping(ip, timeout)
+        except OSError:
+            if controller is not None:
+                controller.on_error()
+            return False
+        if rtt is not None:
+            if timing is not None:
+                timing.observe(ip, rtt)
+            return True
+    if timing is not None:
+        timing.observe_timeout(ip)
+    return False
+
+class TcpProber:
+    """TCP connect存活探测，用于不响应ICMP的主机
+
+    对端口列表并发发起非阻塞connect()，收到SYN-ACK(连接成功)或RST(连接被拒绝)
+    都说明主机在线；任一端口有结果即提前结束并取消其余连接。所有主机共享
+    max_sockets个同时打开的socket；提供limiter(RateLimiter)时每个connect()都要先取得令牌。
+    """
+
+    def __init__(self, ports=DEFAULT_TCP_PORTS, timeout=1.0, max_sockets=512, controller=None, limiter=None):
+        self.ports = tuple(ports)
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_sockets)
+        self.controller = controller
+        self.limiter = limiter
+
+    async def _connect(self, ip, port, timeout):
+        """返回True表示主机在线，False表示端口无应答，None表示主机不可达"""
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            # 关闭时直接发送RST，不在本机留下TIME_WAIT连接
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            try:
+                await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+                return True
+            except ConnectionRefusedError:
+                return True
+            except asyncio.TimeoutError:
+                return False
+            except OSError as e:
+                if e.errno in (errno.EHOSTUNREACH, errno.ENETUNREACH, errno.EHOSTDOWN):
+                    return None
+                if e.errno in LOCAL_SEND_ERRORS and self.controller is not None:
+                    self.controller.on_error()
+                return False
+            finally:
+                sock.close()
 
-        # 方法5: 异步执行dig命令
+    async def probe(self, ip, timing=None):
+        """探测主机是否在线，提供timing(TimingModel)时按其估计决定超时并反馈RTT"""
+        ip = str(ip)
+        timeout = timing.plan(ip)[0] if timing is not None else self.timeout
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(self._connect(ip, port, timeout)) for port in self.ports]
         try:
-            proc = await asyncio.create_subprocess_exec(
-                'dig', '-x', ip_str, '+short',
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, _ = await proc.communicate()
-            hostname = stdout.decode().strip()
-            if hostname:
-                return hostname.rstrip('.')
-        except (asyncio.TimeoutError, subprocess.SubprocessError, FileNotFoundError):
-            pass
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                if result:
+                    if timing is not None:
+                        timing.observe(ip, time.monotonic() - started)
+                    return True
+                if result is None:
+                    return False
+            return False
+        finally:
+            for task in tasks:
+                task.cancel()
+
+async def probe_host(ip, engine=None, tcp_prober=None, icmp=True, controller=None, timing=None, limiter=None):
+    """组合ICMP和TCP探测，在同一轮中并发进行，任一方式确认在线即返回True"""
+    probes = []
+    if icmp:
+        probes.append(asyncio.ensure_future(ping_host(ip, engine, controller, timing, limiter)))
+    if tcp_prober is not None:
+        probes.append(asyncio.ensure_future(tcp_prober.probe(ip, timing)))
+    try:
+        for next_done in asyncio.as_completed(probes):
+            if await next_done:
+                return True
+        return False
+    finally:
+        for probe in probes:
+            probe.cancel()
 
-    return 'Unknown'
+async def get_hostname(ip, resolver=None, peers=None, limiter=None):
+    """根据IP地址获取主机名(异步版)
 
-async def get_mac_address(ip):
-    """根据IP地址获取MAC地址(异步版)"""
-    if platform.system().lower() == 'windows':
-        command = ['arp', '-a', str(ip)]
-    else:
-        command = ['arp', '-n', str(ip)]
+    先查/etc/hosts，然后直接向DNS服务器发送PTR查询，同时用mDNS、LLMNR和NetBIOS直接询问主机本身
+    (peers，见name_resolver.peer_resolvers)，取第一个有效结果；结果按TTL缓存，重复扫描时不再发出查询。
+    系统解析器通常查询同样的DNS服务器，只在DNS服务器没有明确答复(超时或出错)时才询问，
+    NXDOMAIN之后不再发出同样的查询。
+    提供limiter(RateLimiter)时系统解析器的查询和自行创建的解析器的每个查询都要先取得令牌，
+    传入的resolver和peers应当在创建时指定同一个limiter；未提供limiter时系统解析器使用resolver的limiter。
+    """
+    ip_str = str(ip)
+    hostname = hosts_file.lookup(ip_str)
+    if hostname:
+        return hostname
+
+    own_resolver = resolver is None
+    if own_resolver:
+        resolver = DnsPtrResolver(limiter=limiter)
+    own_peers = peers is None
+    if own_peers:
+        peers = peer_resolvers(limiter=limiter)
+    if limiter is None:
+        limiter = resolver.limiter
+
+    async def dns_lookup():
+        hostname, answered = await resolver.lookup(ip_str)
+        if hostname or answered:
+            return hostname
+        return await system_lookup(ip_str, limiter)
 
     try:
-        proc = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, _ = await proc.communicate()
-        output = stdout.decode()
-        mac_pattern = r'([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})'
-        match = re.search(mac_pattern, output)
-        return match.group(0) if match else 'Unknown'
-    except Exception:
-        return 'Unknown'
+        lookups = [dns_lookup()]
+        lookups.extend(peer.resolve(ip_str) for peer in peers)
+        hostname = await first_answer(lookups)
+    finally:
+        if own_resolver:
+            resolver.close()
+        if own_peers:
+            for peer in peers:
+                peer.close()
+    return hostname or 'Unknown'
+
+async def get_mac_address(ip, neighbors=None):
+    """根据IP地址获取MAC地址(异步版)，查询内核邻居表而不是为每台主机调用arp命令"""
+    if neighbors is None:
+        neighbors = NeighborTable()
+    return await neighbors.lookup(ip)
 
-async def scan_ip(ip):
+async def lookup_hostname(ip, mac, resolver=None, hostname_cache=None, peers=None, limiter=None):
+    """获取主机名，MAC和IP都未变化且缓存未过期时直接使用缓存"""
+    if hostname_cache is not None:
+        hostname = hostname_cache.get(mac, str(ip))
+        if hostname is not None:
+            return hostname
+    hostname = await get_hostname(ip, resolver, peers, limiter)
+    if hostname_cache is not None:
+        hostname_cache.put(mac, str(ip), hostname)
+    return hostname
+
+async def scan_ip(ip, engine=None, neighbors=None, resolver=None):
     """扫描单个IP地址，返回结果(异步版)"""
-    if await ping_host(ip):
-        hostname = await get_hostname(ip)
-        mac = await get_mac_address(ip)
-        return {'ip': str(ip), 'hostname': hostname, 'mac': mac}
+    if await ping_host(ip, engine):
+        hostname = await get_hostname(ip, resolver)
+        mac = await get_mac_address(ip, neighbors)
+        return {'ip': str(ip), 'hostname': hostname, 'mac': mac, 'vendor': vendor_of(mac)}
     return None
 
 async def get_arp_table():
@@ -171,74 +1352,1111 @@ async def get_arp_table():
     stdout, _ = await proc.communicate()
     return stdout.decode('utf-8', errors='ignore')
 
-async def scan_network(exclude_ips=None, network_range=None):
-    """扫描网络并返回在线主机列表(结合ARP表和主动扫描)"""
-    # 获取本地IP和网络范围
-    local_ip = get_local_ip()
-    if network_range:
+def parse_proc_net_arp(content):
+    """解析/proc/net/arp的内容，返回{IP: MAC}
+
+    只保留已完成解析(ATF_COM)的条目，未完成(incomplete)和全零MAC的条目被忽略。
+    """
+    table = {}
+    for line in content.splitlines()[1:]:
+        columns = line.split()
+        if len(columns) < 4:
+            continue
+        ip, _, flags, mac = columns[:4]
         try:
-            network = ipaddress.IPv4Network(network_range, strict=False)
+            if not int(flags, 16) & 0x2:
+                continue
         except ValueError:
-            print(f"无效的网络范围: {network_range}")
-            network = get_network_range(local_ip)
+            continue
+        if mac == '00:00:00:00:00:00':
+            continue
+        table[ip] = mac.lower()
+    return table
+
+def parse_arp_output(output):
+    """解析arp -a/arp -n命令的输出，返回{IP: MAC}"""
+    table = {}
+    for line in output.splitlines():
+        ip_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', line)
+        mac_match = re.search(r'([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})', line)
+        if ip_match and mac_match:
+            table[ip_match.group(1)] = mac_match.group(0)
+    return table
+
+async def get_neighbor_table(path='/proc/net/arp'):
+    """读取一次系统邻居表，返回{IP: MAC}
+
+    Linux下直接读取/proc/net/arp，其他系统执行一次arp命令并解析输出。
+    """
+    if platform.system().lower() == 'linux':
+        try:
+            with open(path, 'r') as f:
+                return parse_proc_net_arp(f.read())
+        except OSError:
+            pass
+    try:
+        return parse_arp_output(await get_arp_table())
+    except (OSError, subprocess.SubprocessError):
+        return {}
+
+class NeighborTable:
+    """IP到MAC的邻居表索引，每次扫描读取一次，查找为O(1)
+
+    刚被确认在线的主机可能在读表之后才进入内核邻居表，这时会重新读取一次；
+    并发的刷新请求共用同一次读取，两次读取之间至少间隔refresh_interval秒。
+    """
+
+    def __init__(self, refresh_interval=0.05):
+        self.refresh_interval = refresh_interval
+        self.entries = {}
+        self.loaded_at = None
+        self._refreshing = None
+
+    async def _load(self):
+        try:
+            if self.loaded_at is not None:
+                wait = self.refresh_interval - (time.monotonic() - self.loaded_at)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            started = time.monotonic()
+            self.entries = await get_neighbor_table()
+            self.loaded_at = started
+        finally:
+            self._refreshing = None
+
+    async def refresh(self):
+        """重新读取邻居表"""
+        if self._refreshing is None:
+            self._refreshing = asyncio.ensure_future(self._load())
+        await asyncio.shield(self._refreshing)
+        return self.entries
+
+    async def lookup(self, ip, since=None):
+        """查询IP对应的MAC地址，查不到返回'Unknown'
+
+        参数:
+            ip: IP地址
+            since: 确认主机在线的时刻(time.monotonic())，邻居表在此之前读取时会重新读取
+        """
+        ip = str(ip)
+        if since is None:
+            since = time.monotonic()
+        while ip not in self.entries and (self.loaded_at is None or self.loaded_at < since):
+            await self.refresh()
+        return self.entries.get(ip, 'Unknown')
+
+def _parse_dhcp(payload):
+    """从DHCP报文中取出(IP, MAC)，只有能确定客户端地址的报文(ACK或续租)才返回"""
+    if len(payload) < 240 or payload[236:240] != b'\x63\x82\x53\x63':
+        return None
+    op = payload[0]
+    ciaddr, yiaddr = payload[12:16], payload[16:20]
+    mac = _format_mac(payload[28:34])
+    message_type = None
+    position = 240
+    while position < len(payload) and payload[position] != 255:
+        option = payload[position]
+        if option == 0:
+            position += 1
+            continue
+        if position + 1 >= len(payload):
+            break
+        length = payload[position + 1]
+        if option == 53 and length >= 1 and position + 2 < len(payload):
+            message_type = payload[position + 2]
+        position += 2 + length
+    if op == 2 and message_type == 5:
+        # DHCPACK: 服务器分配给客户端的地址
+        address = yiaddr if yiaddr != b'\x00' * 4 else ciaddr
+    elif op == 1 and message_type in (3, 8):
+        # 续租的REQUEST和INFORM: 客户端已经在使用ciaddr
+        address = ciaddr
     else:
-        network = get_network_range(local_ip)
+        return None
+    if address == b'\x00' * 4:
+        return None
+    return socket.inet_ntoa(address), mac
 
-    # 获取ARP表中的设备
-    arp_output = await get_arp_table()
-    arp_hosts = set()
+def parse_presence_frame(frame):
+    """从以太网帧中提取设备出现的证据
 
-    # 解析ARP表输出
-    for line in arp_output.split('\n'):
-        if platform.system().lower() == 'windows':
-            match = re.search(r'(\d+\.\d+\.\d+\.\d+)', line)
-        else:
-            match = re.search(r'(\d+\.\d+\.\d+\.\d+)', line)
-        if match:
-            ip = match.group(1)
+    返回:
+        [(ip, mac, 来源)]，来源为'arp'、'dhcp'或'mdns'；不相关的帧返回空列表
+    """
+    if len(frame) < 14:
+        return []
+    offset = 14
+    ethertype = struct.unpack('!H', frame[12:14])[0]
+    if ethertype == 0x8100 and len(frame) >= 18:
+        # 802.1Q VLAN标签
+        ethertype = struct.unpack('!H', frame[16:18])[0]
+        offset = 18
+
+    if ethertype == ETH_P_ARP:
+        if len(frame) < offset + 28:
+            return []
+        sender_ip = frame[offset + 14:offset + 18]
+        # 发送者地址为0.0.0.0的是地址冲突检测探测(RFC 5227)，对方尚未使用该地址
+        if sender_ip == b'\x00' * 4:
+            return []
+        return [(socket.inet_ntoa(sender_ip), _format_mac(frame[offset + 8:offset + 14]), 'arp')]
+
+    if ethertype != 0x0800 or len(frame) < offset + 20:
+        return []
+    header_length = (frame[offset] & 0x0f) * 4
+    if frame[offset + 9] != socket.IPPROTO_UDP or len(frame) < offset + header_length + 8:
+        return []
+    udp = offset + header_length
+    destination_port = struct.unpack('!H', frame[udp + 2:udp + 4])[0]
+    source_ip = frame[offset + 12:offset + 16]
+    if destination_port == 5353:
+        if source_ip == b'\x00' * 4:
+            return []
+        return [(socket.inet_ntoa(source_ip), _format_mac(frame[6:12]), 'mdns')]
+    if destination_port in (67, 68):
+        lease = _parse_dhcp(frame[udp + 8:])
+        if lease is not None:
+            return [(lease[0], lease[1], 'dhcp')]
+    return []
+
+def _attach_presence_filter(sock):
+    """给AF_PACKET socket附加BPF过滤器，失败时返回False(由用户态解析过滤)"""
+    import ctypes
+    program = b''.join(struct.pack('HBBI', *instruction) for instruction in PRESENCE_FILTER)
+    buffer = ctypes.create_string_buffer(program)
+    fprog = struct.pack('HL', len(PRESENCE_FILTER), ctypes.addressof(buffer))
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+        return True
+    except OSError:
+        return False
+
+class PresenceMonitor:
+    """被动监听ARP、DHCP和mDNS流量，记录设备的最近出现时间，不发送任何探测
+
+    AF_PACKET socket上附加了BPF过滤器，内核只把这三类报文交给进程。
+    观察结果先在内存中按(MAC, IP)合并，每隔flush_interval秒批量写入数据库的
+    host_presence表。需要root权限(CAP_NET_RAW)。
+    """
+
+    def __init__(self, interface, db_manager, network=None, flush_interval=5.0):
+        self.interface = interface
+        self.db_manager = db_manager
+        self.bounds = (int(network.network_address), int(network.broadcast_address)) if network else None
+        self.flush_interval = flush_interval
+        self.sock = None
+        self.loop = None
+        self.pending = {}
+        self.seen = set()
+        self.observed = 0
+
+    def open(self):
+        """打开监听socket，平台不支持或没有权限时抛出OSError"""
+        if not hasattr(socket, 'AF_PACKET'):
+            raise OSError('当前平台不支持AF_PACKET')
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        _attach_presence_filter(self.sock)
+        self.sock.bind((self.interface['name'], ETH_P_ALL))
+        self.sock.setblocking(False)
+        self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(self.sock.fileno(), self._on_readable)
+        return self
+
+    def _on_readable(self):
+        now = time.time()
+        while True:
             try:
-                ip_obj = ipaddress.IPv4Address(ip)
-                if ip_obj in network:
-                    arp_hosts.add(ip)
-            except ValueError:
+                frame, address = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            # 本机发出的报文不说明其他设备在线
+            if address[2] == PACKET_OUTGOING:
                 continue
+            for ip, mac, source in parse_presence_frame(frame):
+                self.observe(ip, mac, source, now)
+
+    def observe(self, ip, mac, source, now=None):
+        """记录一次设备出现(也用于内核邻居表通知等其他来源)"""
+        if self.bounds is not None:
+            value = ip_to_int(ip)
+            if not self.bounds[0] <= value <= self.bounds[1]:
+                return
+        self.pending[(mac, ip)] = (now or time.time(), source)
+        self.seen.add((mac, ip))
+        self.observed += 1
+
+    def flush(self):
+        """把累积的观察结果批量写入数据库"""
+        if not self.pending:
+            return
+        entries = [(mac, ip, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(seen_at)), source)
+                   for (mac, ip), (seen_at, source) in self.pending.items()]
+        self.pending = {}
+        self.db_manager.save_presence(entries)
+
+    async def run(self, duration):
+        """监听duration秒，期间定时批量写入"""
+        deadline = time.monotonic() + duration
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(self.flush_interval, remaining))
+                self.flush()
+        finally:
+            self.flush()
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.loop.remove_reader(self.sock.fileno())
+            except (ValueError, OSError):
+                pass
+            self.sock.close()
+            self.sock = None
+        self.flush()
+
+def get_target_network(network_range=None, local_ip=None):
+    """解析要扫描的网段，未指定或无效时使用本地网段"""
+    if local_ip is None:
+        local_ip = get_local_ip()
+    if network_range:
+        try:
+            return ipaddress.IPv4Network(network_range, strict=False)
+        except ValueError:
+            print(f"无效的网络范围: {network_range}")
+    return get_network_range(local_ip)
 
-    # 准备要扫描的所有主机
-    all_hosts = list(network.hosts())
-    if exclude_ips:
-        exclude_set = set(str(ip) for ip in exclude_ips)
-        all_hosts = [ip for ip in all_hosts if str(ip) not in exclude_set]
+# 流水线阶段之间传递的结束标记
+_STAGE_DONE = object()
 
-    # 优先扫描ARP表中的设备
-    online_hosts = []
-    semaphore = asyncio.Semaphore(100)
+async def _run_stage(inbox, outbox, handler, concurrency):
+    """流水线的一级: concurrency个协程从inbox取主机，经handler处理后放入outbox
 
-    async def process_host(ip):
-        async with semaphore:
+    上游放入_STAGE_DONE表示结束，本级处理完剩余主机后向下游传递_STAGE_DONE。
+    handler出错时该主机原样传给下游。
+    """
+    async def worker():
+        while True:
+            host = await inbox.get()
+            if host is _STAGE_DONE:
+                # 放回结束标记，让同级的其他协程也能退出
+                inbox.put_nowait(_STAGE_DONE)
+                return
             try:
-                if await ping_host(str(ip)):
-                    hostname = await get_hostname(str(ip))
-                    mac = await get_mac_address(str(ip))
-                    return {'ip': str(ip), 'hostname': hostname, 'mac': mac}
+                host = await handler(host)
             except Exception:
                 pass
-        return None
+            if host is not None:
+                await outbox.put(host)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    await outbox.put(_STAGE_DONE)
+
+def host_bounds(network, shard=None):
+    """返回网段内主机地址的整数范围(first, last)
+
+    shard为(序号, 总数)时只返回第序号个连续分片的范围，分片为空时first > last。
+    """
+    if network.prefixlen >= 31:
+        first = int(network.network_address)
+        last = int(network.broadcast_address)
+    else:
+        first = int(network.network_address) + 1
+        last = int(network.broadcast_address) - 1
+    if shard is not None:
+        index, count = shard
+        size = -(-(last - first + 1) // count)
+        first, last = first + index * size, min(last, first + (index + 1) * size - 1)
+    return first, last
 
-    # 先扫描ARP表中的设备
-    print("正在扫描ARP表中的设备...")
-    arp_tasks = [process_host(ipaddress.IPv4Address(ip)) for ip in arp_hosts if ip not in (exclude_ips or [])]
-    arp_results = await asyncio.gather(*arp_tasks)
-    online_hosts.extend([r for r in arp_results if r])
+async def scan_stream(network, exclude_ips=None, mode='icmp', tcp_ports=None, hostname_cache=None,
+                      concurrency=100, controller=None, timing=None, shard=None,
+                      mac_concurrency=16, name_concurrency=64, include=None, limiter=None,
+                      random_order=False, broadcast=False, trust_neighbors=True, checkpoint_db=None,
+                      resume=False, checkpoint_interval=5.0, deadline=None):
+    """逐台产出在线主机的异步迭代器: async for host in scan_stream(network)
 
-    # 再扫描网络中的其他设备
-    print("正在扫描网络中的其他设备...")
-    other_hosts = [ip for ip in all_hosts if str(ip) not in arp_hosts]
-    other_tasks = [process_host(ip) for ip in other_hosts]
-    other_results = await asyncio.gather(*other_tasks)
-    online_hosts.extend([r for r in other_results if r])
+    扫描分为流水线的几个阶段: 发现(探测主机是否在线) -> MAC地址 -> 主机名，
+    阶段之间用队列连接，各自有独立的并发数。目标地址从生成器中按需取出，
+    发现阶段同时探测的主机数由自适应并发控制器决定；每台主机走完所有阶段后
+    立即产出{'ip', 'hostname', 'mac', 'vendor', 'interface', 'network'}，内存占用与网段大小无关。
+    interface为与网段直接相连的网卡名(不直接相连时为None)，network为所扫描的网段。
+    ARP表中已有的设备排在前面，与其余地址一起依次进入发现阶段。
+
+    参数:
+        network: 目标网段(IPv4Network)
+        exclude_ips: 要排除的地址，可以是单个地址、CIDR、a-b范围或文件(见AddressSet.parse)
+        mode: 'icmp'、'arp'或'tcp'，含义见scan_network
+        tcp_ports: TCP存活探测端口
+        hostname_cache: db_manager.HostnameCache，扫描结束时写回数据库
+        concurrency: 初始并发数(未提供controller时使用)
+        controller: AdaptiveConcurrency，调用方可以通过controller.current读取当前并发数
+        timing: TimingModel，按历史RTT决定每次探测的超时和重试，多次扫描之间可复用
+        shard: (序号, 总数)，只扫描网段的第序号个连续分片(见scan_sharded)
+        mac_concurrency: MAC地址阶段的并发数
+        name_concurrency: 主机名阶段的并发数
+        include: 只扫描网段中的这些地址，格式同exclude_ips，为空时扫描整个网段
+        limiter: RateLimiter，限制所有探测包(ICMP、ARP、TCP)的总发送速率
+        random_order: 为True时按随机顺序扫描地址(ARP表中的设备仍然最先探测)
+        broadcast: 为True时在逐个探测之前先做广播/组播预探测(见broadcast_discover)
+        trust_neighbors: 为True时内核邻居表中状态为REACHABLE的设备直接视为在线，不再探测
+        checkpoint_db: DatabaseManager，提供时每checkpoint_interval秒把扫描进度和已发现的主机
+            保存为检查点(见db_manager.ScanCheckpoint)，完整结束时删除，中途停止或出错时保留
+        resume: 为True时从同一网段、同样地址空间和扫描顺序的检查点继续，
+            先产出检查点中的主机，只探测剩余的地址
+        deadline: ScanDeadline，提供时有RTT历史(曾经在线)的主机紧随ARP表中的设备优先探测，
+            到期前停止发现阶段并放弃来不及完成的补充信息，目标地址数和完成数累加到deadline上
+    """
+    if controller is None:
+        controller = AdaptiveConcurrency(initial=concurrency)
+    if timing is None:
+        timing = TimingModel()
+    # 目标地址空间是整数区间的集合，排除的地址在生成任何探测之前就已减去，
+    # 只在发送探测和输出结果时转为字符串
+    first, last = host_bounds(network, shard)
+    space = AddressSet([(first, last)]) if include is None else AddressSet.parse(include).clip(first, last)
+    space = space.subtract(AddressSet.parse(exclude_ips))
+    link = find_interface(network)
+    tags = {'interface': link['name'] if link else None, 'network': str(network)}
+
+    # 检查点: 地址空间按扫描顺序编号，cursor之前的地址都已探测完成。
+    # 随机顺序由检查点中的种子决定，恢复时得到与中断前相同的顺序
+    checkpoint = None
+    if checkpoint_db is not None:
+        space_key = f"{mode}:{'random' if random_order else 'sequential'}:" + \
+            ','.join(f'{int_to_ip(start)}-{int_to_ip(end)}' for start, end in space)
+        checkpoint = ScanCheckpoint(checkpoint_db, str(network), space_key, space.count(),
+                                    resume=resume, interval=checkpoint_interval)
+        if checkpoint.resumed:
+            print(f"从检查点继续扫描 {network}: 已完成 {checkpoint.cursor}/{checkpoint.total} 个地址，"
+                  f"已发现 {len(checkpoint.hosts)} 台主机(保存于 {checkpoint.updated_time})")
+    seed = checkpoint.seed if checkpoint is not None else random.randrange(1 << 31)
+    cursor = checkpoint.cursor if checkpoint is not None else 0
+    resumed_hosts = checkpoint.hosts if checkpoint is not None else []
+    resumed = {ip_to_int(host['ip']) for host in resumed_hosts}
+
+    def ordered(skip):
+        return space.shuffled(random.Random(seed), skip) if random_order else space.addresses(skip)
+
+    if deadline is not None:
+        deadline.total += space.count()
+        deadline.done += len(resumed)
+
+    # ARP扫描模式下已得到IP和MAC的主机不需要再探测
+    known_macs = {}
+    if mode == 'arp':
+        try:
+            hosts = (value for value in ordered(cursor) if value not in resumed)
+            for host in await arp_sweep(network, interface=link, hosts=hosts, limiter=limiter):
+                known_macs[ip_to_int(host['ip'])] = host['mac']
+            if deadline is not None:
+                deadline.done += space.count() - len(resumed)
+        except OSError as e:
+            print(f"ARP扫描不可用({e})，改用ICMP扫描")
+            mode = 'icmp'
+
+    # 所有主机共用一个ICMP socket，不可用时退回到系统ping命令
+    use_icmp = mode == 'icmp'
+    engine = IcmpEngine.open() if use_icmp and not known_macs else None
+    if use_icmp and not known_macs and engine is None:
+        print("ICMP socket不可用，使用系统ping命令检测主机")
+
+    # 预探测: 广播ICMP、mDNS和SSDP的应答者与ARP表中的设备一起优先探测
+    responders = set()
+    if broadcast and not known_macs:
+        responders = set(ip_ints(await broadcast_discover(network, interface=link, engine=engine, limiter=limiter)))
+
+    # 获取ARP表中的设备(同时作为本次扫描的IP到MAC索引)
+    neighbors = NeighborTable()
+    await neighbors.refresh()
+
+    # 内核邻居表状态: REACHABLE的设备刚被内核确认过，直接报告在线不再探测；
+    # STALE/DELAY/PROBE的设备状态不确定，优先探测；FAILED的设备按普通地址处理
+    reachable = {}
+    failed = set()
+    if trust_neighbors and not known_macs:
+        try:
+            kernel_neighbors = netlink.dump_neighbors()
+        except OSError:
+            kernel_neighbors = []
+        for neighbor in kernel_neighbors:
+            value = ip_to_int(neighbor['ip'])
+            if value not in space:
+                continue
+            presence = netlink.presence_of(neighbor['state'])
+            if presence == 'online' and neighbor['mac']:
+                reachable[value] = neighbor['mac']
+            elif presence == 'offline':
+                failed.add(value)
+    arp_hosts = array.array('I', sorted(
+        value for value in responders.union(ip_ints(neighbors.entries))
+        if value in space and value not in reachable and value not in failed and value not in resumed))
+    for value in resumed:
+        reachable.pop(value, None)
+    # 有时间预算时，曾经应答过的主机(RTT历史)紧随ARP表中的设备探测
+    known_live = array.array('I')
+    if deadline is not None:
+        excluded = set(arp_hosts).union(reachable, failed, resumed)
+        known_live = array.array('I', sorted(
+            value for value in ip_ints(timing.hosts) if value in space and value not in excluded))
+
+    def targets():
+        if known_macs:
+            yield from known_macs
+            return
+        # 先报告内核确认可达的设备，再优先扫描ARP表中和预探测发现的设备，
+        # 最后按顺序扫描网络中的其他设备(从检查点继续时跳过已完成的部分)
+        yield from reachable
+        yield from arp_hosts
+        yield from known_live
+        for value in ordered(cursor):
+            if value not in reachable and value not in resumed and value not in prioritized:
+                yield value
+
+    prioritized = set(arp_hosts).union(known_live)
+
+    # 检查点的进度: 扫描顺序中连续完成的地址数。地址并发探测、完成顺序不定，
+    # completed暂存已完成但前面还有未完成地址的部分
+    completed = set(resumed)
+    progress_iter = ordered(cursor)
+    progress = {'position': cursor, 'next': next(progress_iter, None)}
+
+    def mark_done(value):
+        """一个地址已探测完成(离线，或在线且已产出)"""
+        if checkpoint is None:
+            return
+        completed.add(value)
+        while progress['next'] in completed:
+            completed.discard(progress['next'])
+            progress['position'] += 1
+            progress['next'] = next(progress_iter, None)
+        if checkpoint.due():
+            checkpoint.save(progress['position'])
 
+    # ARP扫描已经探测完所有地址，没有应答的地址现在就完成了，应答的主机产出后完成
+    if mode == 'arp' and checkpoint is not None:
+        for value in ordered(cursor):
+            if value not in known_macs and value not in resumed:
+                mark_done(value)
+
+    tcp_prober = None
+    if mode == 'tcp' or tcp_ports:
+        tcp_prober = TcpProber(tcp_ports or DEFAULT_TCP_PORTS, controller=controller, limiter=limiter)
+
+    # 所有主机名查询共用一个DNS socket，mDNS、LLMNR和NetBIOS也各共用一个socket，发送同样受limiter限制
+    resolver = DnsPtrResolver(limiter=limiter)
+    peers = peer_resolvers(limiter=limiter)
+
+    expected = set(arp_hosts)
+    alive_at = {}
+
+    async def discover(value):
+        """发现阶段: 在并发控制器的许可下探测主机，并把结果反馈给控制器"""
+        ip = int_to_ip(value)
+        known_mac = known_macs.get(value) or reachable.get(value)
+        if known_mac:
+            return {'ip': ip, 'hostname': 'Unknown', 'mac': known_mac, 'vendor': 'Unknown', **tags}
+        async with controller:
+            started = time.monotonic()
+            alive = await probe_host(ip, engine, tcp_prober, use_icmp, controller, timing, limiter)
+            if alive:
+                controller.on_success(time.monotonic() - started)
+            else:
+                controller.on_timeout(value in expected or timing.is_known(ip))
+        if not alive:
+            return None
+        alive_at[ip] = time.monotonic()
+        return {'ip': ip, 'hostname': 'Unknown', 'mac': 'Unknown', 'vendor': 'Unknown', **tags}
+
+    async def enrich_mac(host):
+        if host['mac'] == 'Unknown':
+            lookup = neighbors.lookup(host['ip'], alive_at.pop(host['ip'], None))
+            host['mac'] = await (deadline.limit(lookup, 'MAC地址', 'Unknown') if deadline else lookup)
+        # 厂商查询是内存中的二分查找，随MAC阶段一起完成
+        host['vendor'] = vendor_of(host['mac'])
+        return host
+
+    async def enrich_name(host):
+        lookup = lookup_hostname(host['ip'], host['mac'], resolver, hostname_cache, peers, limiter)
+        host['hostname'] = await (deadline.limit(lookup, '主机名', 'Unknown') if deadline else lookup)
+        return host
+
+    # 发现阶段和各个补充信息阶段通过队列串联，每个阶段有独立的并发数，
+    # 反向解析再慢也不会占用发现阶段的名额
+    target_iter = targets()
+    discovered = asyncio.Queue(maxsize=controller.max_limit)
+    with_mac = asyncio.Queue(maxsize=controller.max_limit)
+    results = asyncio.Queue(maxsize=controller.max_limit)
+
+    # 发现阶段的工作协程数跟随并发上限增长，不预先创建max_limit个；
+    # 上限减小时多出的工作协程在controller.acquire()处等待
+    workers = []
+
+    def add_workers():
+        while len(workers) < controller.current:
+            workers.append(asyncio.ensure_future(discovery_worker()))
+
+    async def discovery_worker():
+        for value in target_iter:
+            if deadline is not None and deadline.probe_remaining() <= 0:
+                break
+            try:
+                host = await discover(value)
+            except Exception:
+                host = None
+            add_workers()
+            if deadline is not None and not known_macs:
+                deadline.done += 1
+            if host:
+                await discovered.put(host)
+            else:
+                mark_done(value)
+
+    async def wait_workers():
+        # 等待期间可能有新的工作协程加入
+        while not all(worker.done() for worker in workers):
+            await asyncio.wait([worker for worker in workers if not worker.done()])
+        for worker in workers:
+            worker.result()
+
+    async def run_discovery():
+        add_workers()
+        try:
+            if deadline is None:
+                await wait_workers()
+            else:
+                # 到期时取消仍在进行的探测，已发现的主机继续走完后续阶段
+                try:
+                    await asyncio.wait_for(wait_workers(), max(deadline.probe_remaining(), 0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        await discovered.put(_STAGE_DONE)
+
+    async def run_pipeline():
+        try:
+            await asyncio.gather(
+                run_discovery(),
+                _run_stage(discovered, with_mac, enrich_mac, mac_concurrency),
+                _run_stage(with_mac, results, enrich_name, name_concurrency),
+            )
+        except Exception as e:
+            await results.put(e)
+
+    runner = asyncio.ensure_future(run_pipeline())
+    finished = False
+    try:
+        # 先产出检查点中已发现的主机
+        for host in resumed_hosts:
+            yield host
+        while True:
+            host = await results.get()
+            if host is _STAGE_DONE:
+                finished = True
+                break
+            if isinstance(host, Exception):
+                raise host
+            if checkpoint is not None:
+                checkpoint.add_host(host)
+            yield host
+            mark_done(ip_to_int(host['ip']))
+    finally:
+        runner.cancel()
+        try:
+            await runner
+        except asyncio.CancelledError:
+            pass
+        if checkpoint is not None:
+            if finished:
+                checkpoint.finish()
+            else:
+                checkpoint.save(progress['position'])
+        if engine is not None:
+            engine.close()
+        resolver.close()
+        for peer in peers:
+            peer.close()
+        if hostname_cache is not None:
+            hostname_cache.flush()
+
+class ShardedConcurrency:
+    """分片扫描的并发汇总: 全局并发上下限按分片数平分，current/peak为各分片之和"""
+
+    def __init__(self, min_limit=8, max_limit=1024):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.shard_current = {}
+        self.shard_peak = {}
+
+    @property
+    def current(self):
+        return sum(self.shard_current.values())
+
+    @property
+    def peak(self):
+        return sum(self.shard_peak.values())
+
+def _shard_worker(conn, network_str, shard, options):
+    """分片工作进程: 在自己的事件循环中扫描一个分片，通过管道逐台发回结果
+
+    消息格式: ('host', 主机), ('concurrency', (当前, 峰值)),
+    ('done', 统计信息), ('error', 错误信息)
+    """
+    async def run():
+        db_manager = DatabaseManager(options['db_path']) if options['db_path'] else None
+        hostname_cache = None
+        if db_manager is not None:
+            hostname_cache = HostnameCache(db_manager, ttl=options['hostname_ttl'])
+        timing = TimingModel()
+        timing.load(options['timings'])
+        controller = AdaptiveConcurrency(initial=options['initial_concurrency'],
+                                         min_limit=options['min_concurrency'],
+                                         max_limit=options['max_concurrency'])
+        limiter = RateLimiter(options['rate'], options['burst']) if options['rate'] else None
+        checkpoint_db = DatabaseManager(options['checkpoint_path']) if options['checkpoint_path'] else None
+        # 截止时刻是主进程的time.monotonic()，同一台机器上各进程的单调时钟相同
+        deadline = None
+        if options['deadline'] is not None:
+            deadline = ScanDeadline(options['deadline'] - time.monotonic(), options['deadline_reserve'])
+
+        async def report():
+            while True:
+                conn.send(('concurrency', (controller.current, controller.peak)))
+                await asyncio.sleep(0.5)
+
+        reporter = asyncio.ensure_future(report())
+        try:
+            async for host in scan_stream(ipaddress.IPv4Network(network_str), options['exclude_ips'],
+                                          options['mode'], options['tcp_ports'], hostname_cache,
+                                          controller=controller, timing=timing, shard=shard,
+                                          include=options['include'], limiter=limiter,
+                                          random_order=options['random_order'],
+                                          broadcast=options['broadcast'], checkpoint_db=checkpoint_db,
+                                          resume=options['resume'], deadline=deadline):
+                conn.send(('host', host))
+        finally:
+            reporter.cancel()
+            if db_manager is not None:
+                db_manager.close()
+            if checkpoint_db is not None:
+                checkpoint_db.close()
+        conn.send(('concurrency', (controller.current, controller.peak)))
+        return {
+            'timings': timing.export(),
+            'cache_hits': hostname_cache.hits if hostname_cache else 0,
+            'cache_misses': hostname_cache.misses if hostname_cache else 0,
+            'deadline': (deadline.total, deadline.done, dict(deadline.dropped)) if deadline else None,
+        }
+
+    try:
+        conn.send(('done', asyncio.run(run())))
+    except Exception as e:
+        conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        conn.close()
+
+async def scan_sharded(network, shards, exclude_ips=None, mode='icmp', tcp_ports=None, hostname_cache=None,
+                       controller=None, timing=None, include=None, limiter=None, random_order=False,
+                       broadcast=False, checkpoint_db=None, resume=False, deadline=None):
+    """多进程分片扫描，逐台产出在线主机
+
+    网段按地址平均分成shards个连续分片，每个分片由一个独立进程运行自己的事件循环
+    (scan_stream)扫描，结果通过管道实时发回并合并。全局并发上下限按分片数平分。
+
+    参数:
+        network: 目标网段(IPv4Network)
+        shards: 分片(进程)数
+        hostname_cache: db_manager.HostnameCache，各进程打开同一个数据库使用主机名缓存，
+            命中统计累加到该对象上
+        controller: ShardedConcurrency，用于读取各分片的并发之和
+        timing: TimingModel，用于给各分片提供历史RTT，并合并各分片新的测量结果
+        limiter: RateLimiter，速率和突发量按分片数平分给各进程
+        checkpoint_db: DatabaseManager，各进程打开同一个数据库，每个分片保存自己的检查点
+        deadline: ScanDeadline，各分片使用同一个截止时刻，覆盖统计累加到该对象上
+        其余参数同scan_stream
+    """
+    if controller is None:
+        controller = ShardedConcurrency()
+    options = {
+        # 地址描述在主进程中解析(文件只读一次)，各分片收到的是整数区间
+        'exclude_ips': AddressSet.parse(exclude_ips),
+        'include': AddressSet.parse(include) if include is not None else None,
+        'mode': mode,
+        'tcp_ports': tcp_ports,
+        'db_path': hostname_cache.db_manager.db_path if hostname_cache is not None else None,
+        'hostname_ttl': hostname_cache.ttl if hostname_cache is not None else 0,
+        'timings': timing.export() if timing is not None else [],
+        'initial_concurrency': max(1, 100 // shards),
+        'min_concurrency': max(1, controller.min_limit // shards),
+        'max_concurrency': max(1, controller.max_limit // shards),
+        'rate': limiter.rate / shards if limiter is not None else 0,
+        'burst': max(1, limiter.burst // shards) if limiter is not None else None,
+        'random_order': random_order,
+        'broadcast': broadcast,
+        'checkpoint_path': checkpoint_db.db_path if checkpoint_db is not None else None,
+        'resume': resume,
+        'deadline': deadline.at if deadline is not None else None,
+        'deadline_reserve': deadline.reserve if deadline is not None else None,
+    }
+
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue()
+    # 使用spawn启动，避免fork继承正在运行的事件循环
+    context = multiprocessing.get_context('spawn')
+    workers = []
+    for index in range(shards):
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        process = context.Process(target=_shard_worker, args=(child_conn, str(network), (index, shards), options),
+                                  daemon=True)
+        process.start()
+        child_conn.close()
+        workers.append((index, process, parent_conn))
+
+    def drain(index, conn):
+        """在线程中读取一个分片的管道，把消息转交给事件循环"""
+        try:
+            while True:
+                message = conn.recv()
+                loop.call_soon_threadsafe(messages.put_nowait, (index, message))
+                if message[0] in ('done', 'error'):
+                    return
+        except (EOFError, OSError):
+            loop.call_soon_threadsafe(messages.put_nowait, (index, ('error', '分片进程意外退出')))
+
+    readers = [threading.Thread(target=drain, args=(index, conn), daemon=True) for index, _, conn in workers]
+    for reader in readers:
+        reader.start()
+
+    try:
+        remaining = shards
+        while remaining:
+            index, (kind, payload) = await messages.get()
+            if kind == 'host':
+                yield payload
+            elif kind == 'concurrency':
+                controller.shard_current[index], controller.shard_peak[index] = payload
+            elif kind == 'done':
+                remaining -= 1
+                controller.shard_current[index] = 0
+                if timing is not None:
+                    timing.load(payload['timings'])
+                if hostname_cache is not None:
+                    hostname_cache.hits += payload['cache_hits']
+                    hostname_cache.misses += payload['cache_misses']
+                if deadline is not None and payload['deadline'] is not None:
+                    total, done, dropped = payload['deadline']
+                    deadline.total += total
+                    deadline.done += done
+                    deadline.dropped.update(dropped)
+            else:
+                remaining -= 1
+                print(f"分片 {index + 1}/{shards} 扫描出错: {payload}")
+    finally:
+        for _, process, conn in workers:
+            if process.is_alive():
+                process.terminate()
+            process.join(timeout=1.0)
+            conn.close()
+
+async def scan_interfaces(interfaces=None, exclude_ips=None, mode='icmp', tcp_ports=None, hostname_cache=None,
+                          controller=None, timing=None, include=None, limiter=None, random_order=False,
+                          broadcast=False, checkpoint_db=None, resume=False, deadline=None):
+    """同时扫描本机所有网卡所在的网段，逐台产出在线主机
+
+    每个网段运行一个scan_stream，所有网段共用同一个并发控制器(全局并发预算)、
+    速率限制、RTT模型和主机名缓存。多个地址属于同一网段时只扫描一次，
+    与include没有交集的网段不扫描。产出的主机带有'interface'和'network'。
+
+    参数:
+        interfaces: get_interfaces的返回值，为空时使用本机所有网卡
+        其余参数同scan_stream
+    """
+    if interfaces is None:
+        interfaces = get_interfaces()
+    if controller is None:
+        controller = AdaptiveConcurrency()
+    include_set = AddressSet.parse(include) if include is not None else None
+    networks = []
+    for interface in interfaces:
+        network = interface['network']
+        if network in networks:
+            continue
+        if include_set is not None and not include_set.clip(*host_bounds(network)):
+            continue
+        networks.append(network)
+
+    results = asyncio.Queue(maxsize=controller.max_limit)
+
+    async def scan_one(network):
+        try:
+            async for host in scan_stream(network, exclude_ips, mode, tcp_ports, hostname_cache,
+                                          controller=controller, timing=timing, include=include,
+                                          limiter=limiter, random_order=random_order, broadcast=broadcast,
+                                          checkpoint_db=checkpoint_db, resume=resume, deadline=deadline):
+                await results.put(host)
+        except Exception as e:
+            print(f"网段 {network} 扫描出错: {e}")
+        finally:
+            await results.put(_STAGE_DONE)
+
+    tasks = [asyncio.ensure_future(scan_one(network)) for network in networks]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            host = await results.get()
+            if host is _STAGE_DONE:
+                remaining -= 1
+            else:
+                yield host
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def scan_incremental(network, db_manager, full_sweep=False, exclude_ips=None, mode='icmp', tcp_ports=None,
+                           hostname_cache=None, controller=None, timing=None, include=None, limiter=None,
+                           random_order=False, known_timeout=0.5, max_age_days=30, on_change=None,
+                           deadline=None, broadcast=False):
+    """增量扫描: 先探测扫描历史中出现过的地址，从未出现过的地址只在full_sweep为True时扫描
+
+    已知地址来自db_manager: 最近一次扫描在线的地址和max_age_days天内出现过的地址。
+    已知地址的探测超时不超过known_timeout秒(有RTT历史的主机按各自的估计)，该阶段结束时
+    立即报告状态变化: 对每个新上线或已离线的地址调用on_change(ip, '上线'或'离线')，
+    未提供时打印。full_sweep为True时再扫描网段中其余的地址，发现的新设备同样报告上线。
+    扫描历史为空时总是做完整扫描。逐台产出在线主机，其余参数同scan_stream。
+    提供deadline(ScanDeadline)时已知地址先用预算，到期时没有探测完的已知地址不报告离线。
+    broadcast只用于完整扫描阶段(见scan_stream)。
+    """
+    if timing is None:
+        timing = TimingModel()
+    if controller is None:
+        controller = AdaptiveConcurrency()
+    if on_change is None:
+        def on_change(ip, change):
+            print(f"设备{change}: {ip}")
+
+    first, last = host_bounds(network)
+    last_online = {ip for ip in db_manager.get_last_online_ips(str(network))
+                   if first <= ip_to_int(ip) <= last}
+    seen = [ip for ip in db_manager.get_seen_ips(str(network), max_age_days)
+            if first <= ip_to_int(ip) <= last]
+    exclude = AddressSet.parse(exclude_ips)
+    known = AddressSet.parse(seen).subtract(exclude)
+    if include is not None:
+        # 只保留include中的已知地址(交集)
+        inside = AddressSet.parse(include).clip(first, last)
+        known = inside.subtract(inside.subtract(known))
+    if not known:
+        full_sweep = True
+
+    online = set()
+    if known:
+        done_before = deadline.done if deadline is not None else 0
+        async for host in scan_stream(network, exclude, mode, tcp_ports, hostname_cache,
+                                      controller=controller, timing=timing.limited(known_timeout),
+                                      include=known, limiter=limiter, random_order=random_order,
+                                      deadline=deadline):
+            online.add(host['ip'])
+            if host['ip'] not in last_online:
+                on_change(host['ip'], '上线')
+            yield host
+        # 截止时间到时不知道哪些已知地址还没有探测，不报告离线
+        if deadline is None or deadline.done - done_before >= known.count():
+            for ip in sorted(last_online - online, key=ip_to_int):
+                if ip_to_int(ip) in known:
+                    on_change(ip, '离线')
+
+    if full_sweep and not (deadline is not None and deadline.probe_remaining() <= 0):
+        async for host in scan_stream(network, AddressSet([*exclude, *known]), mode, tcp_ports, hostname_cache,
+                                      controller=controller, timing=timing, include=include,
+                                      limiter=limiter, random_order=random_order, broadcast=broadcast,
+                                      deadline=deadline):
+            if host['ip'] not in last_online:
+                on_change(host['ip'], '上线')
+            yield host
+
+async def run_fingerprinter(fingerprinter, hosts, deadline=None):
+    """识别hosts的服务；提供deadline时只使用剩余时间，来不及识别的主机services为空"""
+    if deadline is None:
+        await fingerprinter.run(hosts)
+        return
+    await deadline.limit(fingerprinter.run(hosts), '服务识别')
+    for host in hosts:
+        host.setdefault('services', {})
+
+def open_scan_stream(exclude_ips=None, network_range=None, mode='icmp', tcp_ports=None, hostname_cache=None,
+                     controller=None, timing=None, shards=1, include=None, limiter=None, random_order=False,
+                     broadcast=False, all_interfaces=False, checkpoint_db=None, resume=False, deadline=None,
+                     incremental_db=None, full_sweep=False, local_ip=None):
+    """按参数选择扫描方式，返回(逐台产出在线主机的异步迭代器, 所扫描的网段)
+
+    all_interfaces为True时扫描本机所有网卡所在的网段(scan_interfaces)，网段为逗号分隔的列表；
+    提供incremental_db(DatabaseManager)时做增量扫描(scan_incremental，full_sweep含义见该函数)；
+    shards大于1时分片扫描(scan_sharded)；否则扫描单个网段(scan_stream)。
+    参数含义见scan_network，scan_network和命令行都通过这里选择扫描方式。
+    """
+    if all_interfaces:
+        interfaces = get_interfaces()
+        network = ', '.join(dict.fromkeys(str(interface['network']) for interface in interfaces))
+        stream = scan_interfaces(interfaces, exclude_ips, mode, tcp_ports, hostname_cache,
+                                 controller=controller, timing=timing, include=include,
+                                 limiter=limiter, random_order=random_order, broadcast=broadcast,
+                                 checkpoint_db=checkpoint_db, resume=resume, deadline=deadline)
+        return stream, network
+    network = get_target_network(network_range, local_ip or get_local_ip())
+    if incremental_db is not None:
+        stream = scan_incremental(network, incremental_db, full_sweep, exclude_ips, mode, tcp_ports,
+                                  hostname_cache, controller=controller, timing=timing, include=include,
+                                  limiter=limiter, random_order=random_order, deadline=deadline,
+                                  broadcast=broadcast)
+    elif shards > 1:
+        stream = scan_sharded(network, shards, exclude_ips, mode, tcp_ports, hostname_cache,
+                              controller=controller, timing=timing, include=include,
+                              limiter=limiter, random_order=random_order, broadcast=broadcast,
+                              checkpoint_db=checkpoint_db, resume=resume, deadline=deadline)
+    else:
+        stream = scan_stream(network, exclude_ips, mode, tcp_ports, hostname_cache,
+                             controller=controller, timing=timing, include=include,
+                             limiter=limiter, random_order=random_order, broadcast=broadcast,
+                             checkpoint_db=checkpoint_db, resume=resume, deadline=deadline)
+    return stream, network
+
+async def scan_network(exclude_ips=None, network_range=None, mode='icmp', tcp_ports=None,
+                       hostname_cache=None, controller=None, timing=None, shards=1, include=None,
+                       limiter=None, random_order=False, broadcast=False, fingerprinter=None, ipv6=False,
+                       all_interfaces=False, checkpoint_db=None, resume=False, deadline=None):
+    """扫描网络并返回在线主机列表(结合ARP表和主动扫描)
+
+    mode为'arp'时在本地网段上使用ARP广播扫描，一次得到IP和MAC，
+    目标网段不在本地链路上或没有权限时自动退回到ICMP扫描。
+    mode为'tcp'时只用TCP connect探测；mode为'icmp'且指定了tcp_ports时，
+    ICMP和TCP探测在同一轮中并发进行。
+    提供hostname_cache(db_manager.HostnameCache)时，MAC和IP未变化的主机不再做反向解析，
+    新结果在扫描结束时写回数据库。
+    controller为AdaptiveConcurrency，不提供时使用默认范围，可在扫描过程中读取当前并发数。
+    timing为TimingModel，按主机和子网的RTT估计调整超时，定时扫描时应在多轮之间复用。
+    shards大于1时把网段分给多个进程并行扫描(见scan_sharded)，此时controller应为ShardedConcurrency。
+    exclude_ips和include可以包含单个地址、CIDR、a-b范围和文件(见AddressSet.parse)。
+    limiter为RateLimiter，限制所有探测的总发包速率；random_order为True时按随机顺序扫描。
+    broadcast为True时先发送广播ICMP和mDNS/SSDP组播查询，应答者优先探测。
+    提供fingerprinter(fingerprint.Fingerprinter)时，发现结束后在同一事件循环中识别在线主机的服务，
+    结果写入每台主机的'services'。
+    ipv6为True时与IPv4扫描同时做IPv6邻居发现(见ipv6_discover)，双栈主机按MAC得到'ipv6'地址列表。
+    all_interfaces为True时忽略network_range和shards，同时扫描本机所有网卡所在的网段(见scan_interfaces)，
+    返回的network为逗号分隔的网段列表；每台主机的'network'是它所在的网段。
+    提供checkpoint_db(DatabaseManager)时定期保存扫描进度，扫描被停止、进程被杀死后，
+    resume为True的下一次扫描从检查点继续，只探测剩余的地址(见scan_stream)。
+    提供deadline(ScanDeadline)时整次扫描(含IPv6发现和服务识别)在截止时间内结束:
+    先探测ARP表中和曾经在线的主机，补充信息和服务识别在时间不够时放弃，到期取消剩余的探测，
+    返回部分结果；deadline.coverage为已探测地址的比例，deadline.dropped为放弃的阶段。
+
+    这是open_scan_stream的简单封装，需要边扫描边处理结果时直接使用open_scan_stream或scan_stream。
+    """
+    local_ip = get_local_ip()
+    ipv6_task = asyncio.ensure_future(ipv6_discover(limiter=limiter)) if ipv6 else None
+    stream, network = open_scan_stream(exclude_ips, network_range, mode, tcp_ports, hostname_cache,
+                                       controller=controller, timing=timing, shards=shards, include=include,
+                                       limiter=limiter, random_order=random_order, broadcast=broadcast,
+                                       all_interfaces=all_interfaces, checkpoint_db=checkpoint_db,
+                                       resume=resume, deadline=deadline, local_ip=local_ip)
+    online_hosts = [host async for host in stream]
+    if ipv6_task is not None:
+        neighbors = await (deadline.limit(ipv6_task, 'IPv6发现', []) if deadline else ipv6_task)
+        attach_ipv6(online_hosts, neighbors)
+    if fingerprinter is not None:
+        await run_fingerprinter(fingerprinter, online_hosts, deadline)
     return online_hosts, local_ip, network
 
+async def presence_daemon(network, db_manager, interval=60, quiet_after=300, exclude_ips=None,
+                          mode='icmp', tcp_ports=None, limiter=None):
+    """持续监测模式: 以被动监听为主，只对已经安静的设备做主动确认
+
+    启动时做一次完整扫描作为基线，之后每个周期被动监听interval秒(见PresenceMonitor)，
+    同时订阅内核邻居表通知(见netlink.NeighborMonitor): 表项变为REACHABLE记为出现，
+    变为FAILED直接判定离线。周期结束时只探测quiet_after秒内没有任何流量、
+    且内核也无法确定状态的设备，在线的刷新最近出现时间。
+    设备状态保存在db_manager的host_presence表中。没有root权限时只使用内核通知。
+    """
+    interface = find_interface(network)
+    if interface is None:
+        print(f"没有与 {network} 直接相连的网卡，无法被动监听")
+        return
+    monitor = PresenceMonitor(interface, db_manager, network=network)
+    try:
+        monitor.open()
+    except OSError as e:
+        print(f"无法打开被动监听socket({e})，只使用内核邻居表通知")
+
+    def on_neighbor(neighbor):
+        if neighbor['event'] == 'new' and neighbor['mac'] and netlink.presence_of(neighbor['state']) == 'online':
+            monitor.observe(neighbor['ip'], neighbor['mac'], 'netlink')
+
+    neighbor_monitor = netlink.NeighborMonitor(callback=on_neighbor)
+    try:
+        neighbor_monitor.open()
+    except OSError as e:
+        neighbor_monitor = None
+        if monitor.sock is None:
+            print(f"无法订阅内核邻居表通知({e})")
+            return
+
+    def record_probed(hosts, known_macs):
+        # 本机不在ARP表中，使用网卡的MAC地址
+        known_macs = dict(known_macs, **{interface['ip']: interface['mac']})
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        db_manager.save_presence([
+            (host['mac'] if host['mac'] != 'Unknown' else known_macs.get(host['ip'], 'Unknown'),
+             host['ip'], now, 'probe')
+            for host in hosts
+        ])
+
+    try:
+        print(f"基线扫描 {network} ...")
+        hosts = [host async for host in scan_stream(network, exclude_ips, mode, tcp_ports, limiter=limiter)]
+        record_probed(hosts, {})
+        print(f"基线扫描完成，发现{len(hosts)}台在线主机，开始在 {interface['name']} 上被动监听")
+        reported_offline = set()
+
+        while True:
+            monitor.observed = 0
+            monitor.seen = set()
+            await monitor.run(interval)
+            print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] 被动观察到 {len(monitor.seen)} 台设备"
+                  f"({monitor.observed} 个报文)")
+
+            first, last = int(network.network_address), int(network.broadcast_address)
+            quiet = {ip: mac for mac, ip, _ in db_manager.get_quiet_hosts(quiet_after)
+                     if first <= ip_to_int(ip) <= last}
+            offline = {}
+            if neighbor_monitor is not None:
+                # 内核已经判定地址解析失败的设备不需要再探测
+                for ip in list(quiet):
+                    _, state = neighbor_monitor.states.get(ip, (None, 0))
+                    if netlink.presence_of(state) == 'offline':
+                        offline[ip] = quiet.pop(ip)
+            if quiet:
+                confirmed = [host async for host in scan_stream(network, exclude_ips, mode, tcp_ports,
+                                                                include=list(quiet), limiter=limiter)]
+                record_probed(confirmed, quiet)
+                online = {host['ip'] for host in confirmed}
+                offline.update((ip, mac) for ip, mac in quiet.items() if ip not in online)
+                print(f"主动确认 {len(quiet)} 台安静设备，{len(confirmed)} 台在线")
+            # 只报告新离线的设备
+            for ip in sorted(set(offline) - reported_offline, key=ip_to_int):
+                print(f"设备离线: {ip} ({offline[ip]})")
+            reported_offline = set(offline)
+    finally:
+        monitor.close()
+        if neighbor_monitor is not None:
+            neighbor_monitor.close()
+
 def export_to_csv(online_hosts, csv_file='online_hosts.csv'):
     """将在线主机列表导出到CSV文件"""
     if not online_hosts:
@@ -253,10 +2471,10 @@ def export_to_csv(online_hosts, csv_file='online_hosts.csv'):
         with open(csv_file, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             # 写入表头
-            writer.writerow(['序号', '主机名', 'IP地址', 'MAC地址'])
+            writer.writerow(['序号', '主机名', 'IP地址', 'MAC地址', '厂商'])
             # 写入数据
             for idx, host in enumerate(online_hosts, 1):
-                writer.writerow([idx, host['hostname'], host['ip'], host['mac']])
+                writer.writerow([idx, host['hostname'], host['ip'], host['mac'], host.get('vendor', 'Unknown')])
         print(f"\n在线主机列表已导出到: {os.path.abspath(csv_file)}")
     except Exception as e:
         print(f"导出CSV文件时出错: {e}")
@@ -273,11 +2491,11 @@ def print_results(online_hosts, csv_file=None):
     # 准备表格数据
     table_data = []
     for idx, host in enumerate(online_hosts, 1):
-        table_data.append([idx, host['hostname'], host['ip'], host['mac']])
+        table_data.append([idx, host['hostname'], host['ip'], host['mac'], host.get('vendor', 'Unknown')])
 
     # 打印表格
     print("\n在线主机列表:")
-    print(tabulate(table_data, headers=['序号', '主机名', 'IP地址', 'MAC地址'], tablefmt='grid'))
+    print(tabulate(table_data, headers=['序号', '主机名', 'IP地址', 'MAC地址', '厂商'], tablefmt='grid'))
     print(f"\n共发现 {len(online_hosts)} 台在线主机")
 
     # 导出到CSV文件
@@ -287,6 +2505,16 @@ def print_results(online_hosts, csv_file=None):
         # 默认不导出，除非指定了文件路径
         pass
 
+def parse_port_list(text):
+    """解析逗号分隔的端口列表"""
+    try:
+        ports = [int(port) for port in text.split(',') if port.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'无效的端口列表: {text}')
+    if not ports or any(not 0 < port < 65536 for port in ports):
+        raise argparse.ArgumentTypeError(f'无效的端口列表: {text}')
+    return ports
+
 async def main():
     print("局域网主机扫描工具")
     print("====================")
@@ -295,14 +2523,93 @@ async def main():
     parser = argparse.ArgumentParser(description='局域网主机扫描工具')
     parser.add_argument('-t', '--interval', type=int, help='定时执行间隔（秒），0表示只执行一次')
     parser.add_argument('-o', '--output', help='CSV文件输出路径，例如: online_hosts.csv')
-    parser.add_argument('-e', '--exclude', nargs='+', help='要排除的IP地址列表，例如: 192.168.1.1 192.168.1.100')
+    parser.add_argument('-e', '--exclude', nargs='+',
+                        help='要排除的地址，支持单个IP、CIDR、a-b范围和@文件，例如: 192.168.1.1 10.0.16.0/20 192.168.1.100-199 @exclude.txt')
+    parser.add_argument('-i', '--include', nargs='+', help='只扫描这些地址，格式同--exclude')
+    parser.add_argument('-m', '--mode', choices=['icmp', 'arp', 'tcp'], default='icmp',
+                        help='发现方式: icmp(默认)、arp(本地网段ARP广播，需要root权限)或tcp(TCP connect探测)')
+    parser.add_argument('-p', '--tcp-ports', type=parse_port_list,
+                        help='TCP存活探测端口(逗号分隔)，icmp模式下与ICMP并发探测，例如: 445,3389,22,80')
+    parser.add_argument('--db', help='数据库路径，用于保存扫描结果和缓存主机名(按MAC和IP)，例如: lan_scanner.db')
+    parser.add_argument('--hostname-ttl', type=int, default=3600, help='主机名缓存有效期（秒），默认3600')
+    parser.add_argument('--min-concurrency', type=int, default=8, help='自适应并发下限，默认8')
+    parser.add_argument('--max-concurrency', type=int, default=1024, help='自适应并发上限，默认1024')
+    parser.add_argument('--shards', type=int, default=1, help='分片扫描使用的进程数，默认1(不分片)')
+    parser.add_argument('--rate', type=float, default=0, help='每秒最多发送的探测包数，0表示不限制')
+    parser.add_argument('--burst', type=int, help='速率限制允许的突发包数，默认为速率的十分之一')
+    parser.add_argument('--random-order', action='store_true', help='按随机顺序扫描目标地址')
+    parser.add_argument('--broadcast', action='store_true',
+                        help='扫描前先发送广播ICMP和mDNS/SSDP组播查询，应答的设备优先探测')
+    parser.add_argument('--daemon', action='store_true',
+                        help='持续监测模式: 被动监听ARP/DHCP/mDNS流量更新设备状态，只主动确认安静的设备(需要root权限)')
+    parser.add_argument('--fingerprint', action='store_true',
+                        help='发现结束后识别在线主机的服务(SSH版本、HTTP Server头、SMB协商)，指定--db时跳过未变化的设备')
+    parser.add_argument('--fingerprint-ports', type=parse_port_list, default=DEFAULT_FINGERPRINT_PORTS,
+                        help='服务识别端口(逗号分隔)，默认22,80,445,8080')
+    parser.add_argument('--fingerprint-sockets', type=int, default=64, help='服务识别同时打开的连接数上限，默认64')
+    parser.add_argument('--ipv6', action='store_true',
+                        help='同时做IPv6邻居发现(向ff02::1发送回显和MLD查询，读取IPv6邻居表)，需要root权限')
+    parser.add_argument('--all-interfaces', action='store_true',
+                        help='同时扫描本机所有网卡(含VLAN子接口)所在的网段，共用并发预算，不能与--shards同时使用')
+    parser.add_argument('--incremental', type=int, default=0, metavar='N',
+                        help='增量扫描: 每轮先用短超时探测历史中出现过的地址，每N轮才扫描一次其余地址(需要--db)')
+    parser.add_argument('--resume', action='store_true',
+                        help='从上次中断的检查点继续扫描，只探测剩余的地址(需要--db，指定--db时扫描进度定期保存，不能与--incremental同时使用)')
+    parser.add_argument('--deadline', type=float, default=0,
+                        help='每轮扫描的时间预算（秒）: 优先探测ARP表中和曾经在线的主机，到期返回部分结果并报告覆盖比例，0表示不限制')
+    parser.add_argument('--quiet-after', type=int, default=300,
+                        help='持续监测模式下设备多少秒没有流量后主动确认，默认300')
     args = parser.parse_args()
 
     interval = args.interval if args.interval is not None else 0
     csv_file = args.output
-    exclude_ips = args.exclude if args.exclude is not None else []
+    try:
+        exclude_ips = AddressSet.parse(args.exclude)
+        include = AddressSet.parse(args.include) if args.include else None
+    except ValueError as e:
+        print(f"地址参数错误: {e}")
+        return
+
+    limiter = RateLimiter(args.rate, args.burst) if args.rate > 0 else None
+
+    if args.all_interfaces and args.shards > 1:
+        print("--all-interfaces不能与--shards同时使用")
+        return
+    if args.incremental > 0 and (not args.db or args.shards > 1 or args.all_interfaces):
+        print("--incremental需要--db，且不能与--shards或--all-interfaces同时使用")
+        return
+    if args.resume and not args.db:
+        print("--resume需要--db")
+        return
+    if args.resume and args.incremental > 0:
+        # 增量扫描每轮的地址空间随扫描历史变化，没有可以继续的检查点
+        print("--resume不能与--incremental同时使用")
+        return
+
+    if args.daemon:
+        db_manager = DatabaseManager(args.db) if args.db else DatabaseManager()
+        try:
+            network = get_target_network(local_ip=get_local_ip())
+            await presence_daemon(network, db_manager, interval=interval if interval > 0 else 60,
+                                  quiet_after=args.quiet_after, exclude_ips=exclude_ips, mode=args.mode,
+                                  tcp_ports=args.tcp_ports, limiter=limiter)
+        finally:
+            db_manager.close()
+        return
+
+    # RTT估计在多轮扫描之间复用，指定数据库时从历史记录载入
+    timing = TimingModel()
+    if args.db:
+        db_manager = DatabaseManager(args.db)
+        try:
+            timing.load(db_manager.get_host_timings())
+        finally:
+            db_manager.close()
 
     first_run = True
+    cycle = 0
+    # 只有第一轮从检查点继续，之后的定时扫描都是完整扫描
+    resume = args.resume
     while True:
         if first_run and interval > 0:
             # 如果是第一次运行且设置了interval，则等待interval秒后再扫描
@@ -311,12 +2618,73 @@ async def main():
             first_run = False
         
         print("\n开始扫描，请稍候...")
+        db_manager = DatabaseManager(args.db) if args.db else None
         try:
-            online_hosts, local_ip, network = await scan_network(exclude_ips)
+            hostname_cache = None
+            if db_manager is not None:
+                hostname_cache = HostnameCache(db_manager, ttl=args.hostname_ttl)
+            local_ip = get_local_ip()
+            deadline = ScanDeadline(args.deadline) if args.deadline > 0 else None
+            if args.shards > 1 and not args.all_interfaces and args.incremental <= 0:
+                controller = ShardedConcurrency(min_limit=args.min_concurrency, max_limit=args.max_concurrency)
+            else:
+                controller = AdaptiveConcurrency(min_limit=args.min_concurrency, max_limit=args.max_concurrency)
+            full_sweep = False
+            if args.incremental > 0:
+                full_sweep = cycle % args.incremental == 0
+                print("完整扫描" if full_sweep else "增量扫描: 只探测历史中出现过的地址")
+            stream, network = open_scan_stream(exclude_ips, mode=args.mode, tcp_ports=args.tcp_ports,
+                                               hostname_cache=hostname_cache, controller=controller,
+                                               timing=timing, shards=args.shards, include=include,
+                                               limiter=limiter, random_order=args.random_order,
+                                               broadcast=args.broadcast, all_interfaces=args.all_interfaces,
+                                               checkpoint_db=db_manager, resume=resume, deadline=deadline,
+                                               incremental_db=db_manager if args.incremental > 0 else None,
+                                               full_sweep=full_sweep, local_ip=local_ip)
+            ipv6_task = asyncio.ensure_future(ipv6_discover(limiter=limiter)) if args.ipv6 else None
+            online_hosts = []
+            async for host in stream:
+                online_hosts.append(host)
+                print(f"发现在线主机: {host['ip']} ({host['hostname']}) {host['interface'] or ''}  [并发: {controller.current}]")
             print(f"扫描完成，发现{len(online_hosts)}台在线主机")
+            print(f"并发: 结束时 {controller.current}，峰值 {controller.peak}")
+            if ipv6_task is not None:
+                neighbors = await (deadline.limit(ipv6_task, 'IPv6发现', []) if deadline else ipv6_task)
+                attach_ipv6(online_hosts, neighbors)
+                print(f"IPv6邻居发现: {len(neighbors)} 个地址，"
+                      f"{sum(1 for host in online_hosts if host['ipv6'])} 台双栈主机")
+                for neighbor in neighbors:
+                    print(f"  {neighbor['ip']} ({neighbor['mac']}, {neighbor['interface']})")
+                if db_manager is not None:
+                    db_manager.save_ipv6_addresses(
+                        [(neighbor['mac'], neighbor['ip'], neighbor['interface']) for neighbor in neighbors])
+            if args.fingerprint:
+                fingerprinter = Fingerprinter(args.fingerprint_ports, max_sockets=args.fingerprint_sockets,
+                                              limiter=limiter, db_manager=db_manager)
+                await run_fingerprinter(fingerprinter, online_hosts, deadline)
+                print(f"服务识别: 连接 {fingerprinter.probed} 个端口，跳过未变化的 {fingerprinter.skipped} 个")
+                for host in online_hosts:
+                    if host['services']:
+                        print(f"  {host['ip']}: {format_services(host['services'])}")
+            if deadline is not None:
+                if deadline.coverage < 1 or deadline.dropped:
+                    print(f"截止时间到，结果不完整: {deadline.summary()}")
+                else:
+                    print(f"在截止时间内完成，剩余 {max(deadline.remaining(), 0):.1f} 秒")
+            if hostname_cache is not None:
+                stats = hostname_cache.stats()
+                print(f"主机名缓存: 命中 {stats['hits']}，未命中 {stats['misses']}，命中率 {stats['hit_rate']:.0%}")
+            if db_manager is not None:
+                db_manager.save_host_timings(timing.export())
+                db_manager.save_scan_result(online_hosts, local_ip, network)
+            cycle += 1
+            resume = False
         except Exception as e:
             print(f"扫描出错: {e}")
             return
+        finally:
+            if db_manager is not None:
+                db_manager.close()
 
         print(f"\n本地IP地址: {local_ip}")
         print(f"扫描网络范围: {network}")
@@ -12,7 +12,7 @@ from tkcalendar import DateEntry
 
 # 导入lan_scanner.py中的功能
 import lan_scanner as scanner
-from db_manager import DatabaseManager
+from db_manager import DatabaseManager, HostnameCache
 # 导入数据库管理模块
 from db_manager import save_results_to_db
 
@@ -93,7 +93,7 @@ class LanScannerGUI:
         self.exclude_entry.pack(side=tk.LEFT, padx=5)
         self.exclude_entry.insert(0, "")
 
-        self.exclude_help = ttk.Label(self.exclude_frame, text="(逗号分隔)")
+        self.exclude_help = ttk.Label(self.exclude_frame, text="(逗号分隔，支持CIDR、a-b范围、@文件)")
         self.exclude_help.pack(side=tk.LEFT)
 
         # 从数据库选择IP按钮
@@ -221,12 +221,61 @@ class LanScannerGUI:
         self.datetime_help = ttk.Label(self.schedule_frame, text="(YYYY-MM-DD HH:MM)")
         self.datetime_help.pack(side=tk.LEFT, padx=5)
 
+        # 当前有效并发数(扫描过程中由自适应并发控制器调整)
+        self.concurrency_controller = None
+        self.concurrency_label = ttk.Label(self.control_row2, text="并发: -")
+        self.concurrency_label.pack(side=tk.RIGHT, padx=10)
+
+        # 分片扫描的进程数
+        self.shards_spinbox = ttk.Spinbox(self.control_row2, from_=1, to=os.cpu_count() or 1, width=4)
+        self.shards_spinbox.set(1)
+        self.shards_spinbox.pack(side=tk.RIGHT)
+        self.shards_label = ttk.Label(self.control_row2, text="分片进程:")
+        self.shards_label.pack(side=tk.RIGHT, padx=(10, 0))
+
+        # 同时扫描本机所有网卡所在的网段
+        self.all_interfaces_var = tk.BooleanVar()
+        self.all_interfaces_check = ttk.Checkbutton(self.control_row2, text="所有网卡", variable=self.all_interfaces_var)
+        self.all_interfaces_check.pack(side=tk.RIGHT, padx=(10, 0))
+
+        # 从上次中断的检查点继续扫描
+        self.resume_var = tk.BooleanVar()
+        self.resume_check = ttk.Checkbutton(self.control_row2, text="断点续扫", variable=self.resume_var)
+        self.resume_check.pack(side=tk.RIGHT, padx=(10, 0))
+
+        # IPv6邻居发现(与IPv4扫描同时进行)
+        self.ipv6_var = tk.BooleanVar()
+        self.ipv6_check = ttk.Checkbutton(self.control_row2, text="IPv6发现", variable=self.ipv6_var)
+        self.ipv6_check.pack(side=tk.RIGHT, padx=(10, 0))
+
+        # 扫描前的广播/组播预探测
+        self.broadcast_var = tk.BooleanVar()
+        self.broadcast_check = ttk.Checkbutton(self.control_row2, text="广播预探测", variable=self.broadcast_var)
+        self.broadcast_check.pack(side=tk.RIGHT, padx=(10, 0))
+
+        # 发包速率限制(0表示不限制)和随机扫描顺序
+        self.random_order_var = tk.BooleanVar()
+        self.random_order_check = ttk.Checkbutton(self.control_row2, text="随机顺序", variable=self.random_order_var)
+        self.random_order_check.pack(side=tk.RIGHT, padx=(10, 0))
+        self.rate_spinbox = ttk.Spinbox(self.control_row2, from_=0, to=100000, increment=100, width=7)
+        self.rate_spinbox.set(0)
+        self.rate_spinbox.pack(side=tk.RIGHT)
+        self.rate_label = ttk.Label(self.control_row2, text="速率(包/秒):")
+        self.rate_label.pack(side=tk.RIGHT, padx=(10, 0))
+
+        # 每次扫描的时间预算，到期返回部分结果，0表示不限制
+        self.deadline_spinbox = ttk.Spinbox(self.control_row2, from_=0, to=86400, increment=10, width=6)
+        self.deadline_spinbox.set(0)
+        self.deadline_spinbox.pack(side=tk.RIGHT)
+        self.deadline_label = ttk.Label(self.control_row2, text="时限(秒):")
+        self.deadline_label.pack(side=tk.RIGHT, padx=(10, 0))
+
         # 创建结果显示区域
         self.result_frame = ttk.LabelFrame(self.main_frame, text="扫描结果", padding="10")
         self.result_frame.pack(fill=tk.BOTH, expand=True)
 
         # 创建树状视图来显示结果（支持多选）
-        columns = ("index", "status", "hostname", "ip", "mac", "user", "department", "notes")
+        columns = ("index", "status", "hostname", "ip", "mac", "vendor", "user", "department", "notes")
         self.tree = ttk.Treeview(self.result_frame, columns=columns, show="headings", selectmode='extended')
 
         # 设置列标题
@@ -235,6 +284,7 @@ class LanScannerGUI:
         self.tree.heading("hostname", text="主机名")
         self.tree.heading("ip", text="IP地址")
         self.tree.heading("mac", text="MAC地址")
+        self.tree.heading("vendor", text="厂商")
         self.tree.heading("user", text="使用人")
         self.tree.heading("department", text="部门")
         self.tree.heading("notes", text="备注")
@@ -245,6 +295,7 @@ class LanScannerGUI:
         self.tree.column("hostname", width=120)
         self.tree.column("ip", width=120)
         self.tree.column("mac", width=180)
+        self.tree.column("vendor", width=160)
         self.tree.column("user", width=100)
         self.tree.column("department", width=100)
         self.tree.column("notes", width=180)
@@ -662,7 +713,7 @@ class LanScannerGUI:
         # 在表格中显示结果
         for i, (weight, ip, info, user_name, department, status, note) in enumerate(sorted_list, 1):
             self.tree.insert('', tk.END, values=(
-                i, status, info['hostname'], ip, info['mac'],
+                i, status, info['hostname'], ip, info['mac'], scanner.vendor_of(info['mac']),
                 user_name, department, note  # 备注留空
             ))
         
@@ -703,7 +754,7 @@ class LanScannerGUI:
                 with open(export_path, 'w', newline='', encoding='utf-8') as f:
                     writer = csv.writer(f)
                     # 写入表头
-                    writer.writerow(["序号", "状态", "主机名", "IP地址", "MAC地址", "使用人", "部门", "备注"])
+                    writer.writerow(["序号", "状态", "主机名", "IP地址", "MAC地址", "厂商", "使用人", "部门", "备注"])
 
                     # 写入数据行
                     for item in items:
@@ -832,7 +883,8 @@ class LanScannerGUI:
             
             # 插入表格
             self.tree.insert("", tk.END, values=(
-                idx, status, hostname, ip_address, mac_address, user_name, department, notes
+                idx, status, hostname, ip_address, mac_address, scanner.vendor_of(mac_address),
+                user_name, department, notes
             ))
         
         # 处理未登记资产
@@ -854,7 +906,7 @@ class LanScannerGUI:
             # 插入表格（序号延续已登记资产）
             self.tree.insert("", tk.END, values=(
                 len(all_assets) + unregistered_macs.index(mac_address) + 1,
-                status, hostname, ip_address, mac_address, "", "", ""
+                status, hostname, ip_address, mac_address, scanner.vendor_of(mac_address), "", "", ""
             ))
 
         total_count = len(all_assets) + len(unregistered_macs)
@@ -869,15 +921,71 @@ class LanScannerGUI:
             self.add_status("开始扫描，请稍候...")
             # 获取自定义网段
             network_range = self.network_entry.get().strip()
-            if network_range:
+            if self.all_interfaces:
+                network_range = None
+                self.add_status("扫描本机所有网卡所在的网段")
+            elif network_range:
                 self.add_status(f"使用自定义网段: {network_range}")
             
-            if hasattr(self, 'exclude_ips') and self.exclude_ips:
-                self.add_status(f"排除IP列表: {', '.join(self.exclude_ips)}")
-                # 确保scanner.scan_network返回的是协程
-                online_hosts, local_ip, network = await scanner.scan_network(exclude_ips=self.exclude_ips, network_range=network_range)
-            else:
-                online_hosts, local_ip, network = await scanner.scan_network(network_range=network_range)
+            # 扫描线程中单独打开数据库连接，用于主机名缓存和RTT历史
+            cache_db = DatabaseManager()
+            try:
+                hostname_cache = HostnameCache(cache_db)
+                # 按历史RTT估计调整每台主机的探测超时
+                timing = scanner.TimingModel()
+                timing.load(cache_db.get_host_timings())
+                if self.shards > 1 and not self.all_interfaces:
+                    self.concurrency_controller = scanner.ShardedConcurrency()
+                    self.add_status(f"使用 {self.shards} 个进程分片扫描")
+                else:
+                    self.concurrency_controller = scanner.AdaptiveConcurrency()
+                limiter = scanner.RateLimiter(self.rate) if self.rate > 0 else None
+                if limiter is not None:
+                    self.add_status(f"发包速率限制: {self.rate:g} 包/秒")
+                exclude_ips = None
+                if hasattr(self, 'exclude_ips') and self.exclude_ips:
+                    self.add_status(f"排除IP列表: {', '.join(self.exclude_ips)}")
+                    exclude_ips = self.exclude_ips
+                if self.resume:
+                    self.add_status("从上次中断的检查点继续扫描")
+                deadline = scanner.ScanDeadline(self.deadline) if self.deadline > 0 else None
+                if deadline is not None:
+                    self.add_status(f"扫描时限: {self.deadline:g} 秒")
+                # 扫描进度定期保存为检查点；停止扫描时取消扫描任务，进度在取消时保存
+                scan = asyncio.ensure_future(scanner.scan_network(exclude_ips=exclude_ips, network_range=network_range,
+                                                                  hostname_cache=hostname_cache,
+                                                                  controller=self.concurrency_controller,
+                                                                  timing=timing, shards=self.shards,
+                                                                  limiter=limiter,
+                                                                  random_order=self.random_order,
+                                                                  broadcast=self.broadcast,
+                                                                  ipv6=self.ipv6,
+                                                                  all_interfaces=self.all_interfaces,
+                                                                  checkpoint_db=cache_db, resume=self.resume,
+                                                                  deadline=deadline))
+                watcher = asyncio.ensure_future(self.cancel_when_stopped(scan))
+                try:
+                    online_hosts, local_ip, network = await scan
+                except asyncio.CancelledError:
+                    cache_db.save_host_timings(timing.export())
+                    self.add_status("扫描已取消，进度已保存，勾选“断点续扫”可从中断处继续")
+                    return
+                finally:
+                    watcher.cancel()
+                # 只有第一次扫描从检查点继续
+                self.resume = False
+                cache_db.save_host_timings(timing.export())
+            finally:
+                cache_db.close()
+
+            self.add_status(f"并发: 结束时 {self.concurrency_controller.current}，峰值 {self.concurrency_controller.peak}")
+
+            stats = hostname_cache.stats()
+            self.add_status(f"主机名缓存: 命中 {stats['hits']}，未命中 {stats['misses']}")
+            if deadline is not None and (deadline.coverage < 1 or deadline.dropped):
+                self.add_status(f"时限已到，结果不完整: {deadline.summary()}")
+            if self.ipv6:
+                self.add_status(f"IPv6: {sum(1 for host in online_hosts if host.get('ipv6'))} 台双栈主机")
 
             self.add_status(f"本地IP地址: {local_ip}")
             self.add_status(f"扫描网络范围: {network}")
@@ -894,6 +1002,12 @@ class LanScannerGUI:
             self.add_status(f"扫描出错: {e}")
             self.root.after(0, lambda: self.stop_scan())
 
+    async def cancel_when_stopped(self, task):
+        """点击停止后取消正在进行的扫描任务"""
+        while self.scanning and not task.done():
+            await asyncio.sleep(0.2)
+        task.cancel()
+
     def start_scan(self):
         if self.scanning:
             return
@@ -930,13 +1044,38 @@ class LanScannerGUI:
             else:
                 self.csv_file = None
 
-            # 获取排除IP列表
-            exclude_ips_text = self.exclude_entry.get().strip()
-            self.exclude_ips = []
-            if exclude_ips_text:
-                self.exclude_ips = [ip.strip() for ip in exclude_ips_text.split(',') if ip.strip()]
+            self.shards = int(self.shards_spinbox.get())
+            if self.shards < 1:
+                messagebox.showerror("错误", "分片进程数必须大于0")
+                return
+
+            self.rate = float(self.rate_spinbox.get())
+            if self.rate < 0:
+                messagebox.showerror("错误", "发包速率不能小于0")
+                return
+            self.deadline = float(self.deadline_spinbox.get())
+            if self.deadline < 0:
+                messagebox.showerror("错误", "扫描时限不能小于0")
+                return
+            self.random_order = self.random_order_var.get()
+            self.broadcast = self.broadcast_var.get()
+            self.ipv6 = self.ipv6_var.get()
+            self.all_interfaces = self.all_interfaces_var.get()
+            self.resume = self.resume_var.get()
+
         except ValueError:
-            messagebox.showerror("错误", "请输入有效的间隔时间")
+            messagebox.showerror("错误", "请输入有效的间隔时间、分片进程数、发包速率和扫描时限")
+            return
+
+        # 获取排除IP列表，提前检查格式，扫描时按区间排除
+        exclude_ips_text = self.exclude_entry.get().strip()
+        self.exclude_ips = []
+        if exclude_ips_text:
+            self.exclude_ips = [ip.strip() for ip in exclude_ips_text.split(',') if ip.strip()]
+        try:
+            scanner.AddressSet.parse(self.exclude_ips)
+        except ValueError as e:
+            messagebox.showerror("错误", f"排除地址格式无效: {e}")
             return
 
         # 更新按钮状态
@@ -950,6 +1089,14 @@ class LanScannerGUI:
         self.scan_thread = threading.Thread(target=self.scan_loop)
         self.scan_thread.daemon = True
         self.scan_thread.start()
+        self.update_concurrency_label()
+
+    def update_concurrency_label(self):
+        """扫描期间定时刷新当前并发数"""
+        if self.concurrency_controller is not None:
+            self.concurrency_label.config(text=f"并发: {self.concurrency_controller.current}")
+        if self.scanning:
+            self.root.after(500, self.update_concurrency_label)
 
     def scan_loop(self):
         mode = self.mode_var.get()
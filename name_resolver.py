@@ -0,0 +1,555 @@
+import asyncio
+import ipaddress
+import os
+import random
+import socket
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DNS_PORT = 53
+DNS_TYPE_CNAME = 5
+DNS_TYPE_SOA = 6
+DNS_TYPE_PTR = 12
+DNS_CLASS_IN = 1
+DNS_RCODE_NOERROR = 0
+DNS_RCODE_NXDOMAIN = 3
+
+# 没有SOA记录时否定应答的缓存时间(秒)
+DEFAULT_NEGATIVE_TTL = 60
+# 服务器失败(SERVFAIL/超时)时的短暂缓存，避免同一次扫描内反复查询
+FAILURE_TTL = 5
+# 缓存中表示查询失败的值，与否定应答(None)区分
+_FAILED = object()
+
+# 系统解析器(gethostbyaddr)专用线程池，避免占满默认线程池
+_system_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='resolver')
+
+
+def read_resolv_conf(path='/etc/resolv.conf'):
+    """读取resolv.conf中的DNS服务器地址，读取失败或为空时使用本机"""
+    servers = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                columns = line.split()
+                if len(columns) >= 2 and columns[0] == 'nameserver':
+                    address = columns[1].split('%')[0]
+                    try:
+                        if ipaddress.ip_address(address).version == 4:
+                            servers.append(address)
+                    except ValueError:
+                        continue
+    except OSError:
+        pass
+    return servers or ['127.0.0.1']
+
+
+def ptr_name(ip):
+    """IPv4地址对应的反向解析域名，例如 1.2.168.192.in-addr.arpa"""
+    return ipaddress.ip_address(str(ip)).reverse_pointer
+
+
+def build_query(qid, name, qtype, flags=0x0100):
+    """构造DNS查询报文(默认设置RD递归标志)"""
+    question = b''.join(bytes([len(label)]) + label.encode() for label in name.rstrip('.').split('.'))
+    question += b'\x00' + struct.pack('!HH', qtype, DNS_CLASS_IN)
+    return struct.pack('!HHHHHH', qid, flags, 1, 0, 0, 0) + question
+
+
+def _read_name(data, offset):
+    """读取(可能被压缩的)域名，返回(域名, 名字之后的偏移)"""
+    labels = []
+    end = None
+    jumps = 0
+    while True:
+        if offset >= len(data):
+            raise ValueError('DNS报文被截断')
+        length = data[offset]
+        if length & 0xc0 == 0xc0:
+            if offset + 1 >= len(data) or jumps > 32:
+                raise ValueError('无效的DNS压缩指针')
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3f) << 8) | data[offset + 1]
+            jumps += 1
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode('utf-8', errors='replace'))
+        offset += length
+    return '.'.join(labels), end if end is not None else offset
+
+
+def parse_response(data):
+    """解析DNS应答报文
+
+    返回:
+        字典: id, rcode, question(查询的域名), answers([(域名, 类型, TTL, 数据)]),
+        negative_ttl(权威部分SOA给出的否定缓存时间，没有则为None)
+    """
+    if len(data) < 12:
+        raise ValueError('DNS报文过短')
+    qid, flags, qdcount, ancount, nscount, _ = struct.unpack('!HHHHHH', data[:12])
+    offset = 12
+    question = None
+    for _ in range(qdcount):
+        question, offset = _read_name(data, offset)
+        offset += 4
+
+    def read_records(count, offset):
+        records = []
+        for _ in range(count):
+            name, offset = _read_name(data, offset)
+            if offset + 10 > len(data):
+                raise ValueError('DNS报文被截断')
+            rtype, _, ttl, rdlength = struct.unpack('!HHIH', data[offset:offset + 10])
+            offset += 10
+            rdata_offset = offset
+            offset += rdlength
+            if rtype in (DNS_TYPE_PTR, DNS_TYPE_CNAME):
+                rdata, _ = _read_name(data, rdata_offset)
+            elif rtype == DNS_TYPE_SOA:
+                _, pos = _read_name(data, rdata_offset)
+                _, pos = _read_name(data, pos)
+                rdata = struct.unpack('!IIIII', data[pos:pos + 20])
+            else:
+                rdata = data[rdata_offset:offset]
+            records.append((name, rtype, ttl, rdata))
+        return records, offset
+
+    answers, offset = read_records(ancount, offset)
+    negative_ttl = None
+    try:
+        authority, offset = read_records(nscount, offset)
+    except (ValueError, struct.error):
+        authority = []
+    for _, rtype, ttl, rdata in authority:
+        if rtype == DNS_TYPE_SOA:
+            negative_ttl = min(ttl, rdata[4])
+
+    return {
+        'id': qid,
+        'rcode': flags & 0x000f,
+        'question': question,
+        'answers': answers,
+        'negative_ttl': negative_ttl,
+    }
+
+
+class TtlCache:
+    """按TTL过期的缓存，同时保存肯定结果和否定结果(值为None)"""
+
+    def __init__(self, max_entries=65536):
+        self.max_entries = max_entries
+        self.entries = {}
+
+    def get(self, key):
+        """返回(是否命中, 值)"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return False, None
+        return True, value
+
+    def put(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        if len(self.entries) >= self.max_entries:
+            self._evict()
+        self.entries[key] = (value, time.monotonic() + ttl)
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [key for key, (_, expires_at) in self.entries.items() if expires_at < now]
+        for key in expired:
+            del self.entries[key]
+        # 仍然已满时淘汰最早插入的四分之一
+        if len(self.entries) >= self.max_entries:
+            for key in list(self.entries)[:self.max_entries // 4]:
+                del self.entries[key]
+
+
+# 进程内共享的反向解析缓存，定时扫描的多轮之间复用
+ptr_cache = TtlCache()
+
+
+class _DnsProtocol(asyncio.DatagramProtocol):
+    def __init__(self, resolver):
+        self.resolver = resolver
+
+    def datagram_received(self, data, addr):
+        self.resolver._on_response(data, addr)
+
+    def error_received(self, exc):
+        pass
+
+
+class DnsPtrResolver:
+    """直接向resolv.conf中的DNS服务器发送PTR查询的异步解析器
+
+    所有查询共用一个UDP socket并按事务ID匹配应答，可以同时有大量查询在途；
+    结果(包括否定结果)按TTL缓存在ptr_cache中。
+    提供limiter(限速器，需有async acquire())时每发送一个查询先取得一个令牌。
+    """
+
+    def __init__(self, servers=None, timeout=1.0, retries=1, cache=None, limiter=None):
+        self.servers = servers or read_resolv_conf()
+        self.timeout = timeout
+        self.retries = retries
+        self.cache = ptr_cache if cache is None else cache
+        self.limiter = limiter
+        self.transport = None
+        self.pending = {}
+        self._opening = None
+
+    async def open(self):
+        """打开UDP socket，并发调用时只打开一次"""
+        if self.transport is None:
+            if self._opening is None:
+                loop = asyncio.get_running_loop()
+                self._opening = asyncio.ensure_future(loop.create_datagram_endpoint(
+                    lambda: _DnsProtocol(self), local_addr=('0.0.0.0', 0)))
+            try:
+                transport, _ = await asyncio.shield(self._opening)
+            finally:
+                self._opening = None
+            if self.transport is None:
+                self.transport = transport
+        return self
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        for future, _ in self.pending.values():
+            if not future.done():
+                future.cancel()
+        self.pending.clear()
+
+    def _on_response(self, data, addr):
+        try:
+            response = parse_response(data)
+        except (ValueError, struct.error, IndexError):
+            return
+        entry = self.pending.get(response['id'])
+        if entry is None:
+            return
+        future, name = entry
+        if addr[0] not in self.servers or (response['question'] or '').lower() != name.lower():
+            return
+        if not future.done():
+            future.set_result(response)
+
+    def _new_id(self):
+        while True:
+            qid = random.randrange(0x10000)
+            if qid not in self.pending:
+                return qid
+
+    async def resolve(self, ip):
+        """反向解析IP，返回主机名；没有PTR记录或查询失败返回None"""
+        hostname, _ = await self.lookup(ip)
+        return hostname
+
+    async def lookup(self, ip):
+        """反向解析IP，返回(主机名, DNS服务器是否给出了明确答复)
+
+        有PTR记录时为(主机名, True)，NXDOMAIN或没有PTR记录时为(None, True)，
+        所有服务器超时或出错时为(None, False)
+        """
+        name = ptr_name(ip)
+        hit, hostname = self.cache.get(name)
+        if hit:
+            return (None, False) if hostname is _FAILED else (hostname, True)
+        await self.open()
+
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            server = self.servers[attempt % len(self.servers)]
+            qid = self._new_id()
+            future = loop.create_future()
+            self.pending[qid] = (future, name)
+            try:
+                if self.limiter is not None:
+                    await self.limiter.acquire()
+                self.transport.sendto(build_query(qid, name, DNS_TYPE_PTR), (server, DNS_PORT))
+                response = await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                continue
+            finally:
+                self.pending.pop(qid, None)
+
+            rcode = response['rcode']
+            if rcode == DNS_RCODE_NOERROR:
+                ttl = None
+                for _, rtype, record_ttl, rdata in response['answers']:
+                    ttl = record_ttl if ttl is None else min(ttl, record_ttl)
+                    if rtype == DNS_TYPE_PTR:
+                        hostname = rdata.rstrip('.')
+                        self.cache.put(name, hostname, ttl)
+                        return hostname, True
+            if rcode in (DNS_RCODE_NOERROR, DNS_RCODE_NXDOMAIN):
+                negative_ttl = response['negative_ttl']
+                self.cache.put(name, None, DEFAULT_NEGATIVE_TTL if negative_ttl is None else negative_ttl)
+                return None, True
+            # SERVFAIL/REFUSED等，换下一个服务器重试
+
+        self.cache.put(name, _FAILED, FAILURE_TTL)
+        return None, False
+
+
+# 对端名字解析(mDNS、LLMNR、NetBIOS)的结果缓存
+peer_cache = TtlCache()
+PEER_POSITIVE_TTL = 300
+
+
+class _PeerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, resolver):
+        self.resolver = resolver
+
+    def datagram_received(self, data, addr):
+        self.resolver._on_response(data, addr)
+
+    def error_received(self, exc):
+        pass
+
+
+class PeerResolver:
+    """直接询问目标主机本身的名字解析协议(mDNS、LLMNR、NetBIOS)的基类
+
+    每种协议所有主机共用一个UDP socket，查询以单播发送到目标主机的协议端口，
+    应答按(源IP, 事务ID)匹配。没有PTR记录的终端往往会回答这些协议。
+    结果(包括无应答)按TTL缓存，键为(协议, IP)。
+    提供limiter(限速器，需有async acquire())时每发送一个查询先取得一个令牌。
+    """
+
+    port = None
+    protocol = None
+
+    def __init__(self, timeout=0.5, cache=None, limiter=None):
+        self.timeout = timeout
+        self.cache = peer_cache if cache is None else cache
+        self.limiter = limiter
+        self.transport = None
+        self.pending = {}
+        self._opening = None
+
+    async def open(self):
+        """打开UDP socket，并发调用时只打开一次"""
+        if self.transport is None:
+            if self._opening is None:
+                loop = asyncio.get_running_loop()
+                self._opening = asyncio.ensure_future(loop.create_datagram_endpoint(
+                    lambda: _PeerProtocol(self), local_addr=('0.0.0.0', 0)))
+            try:
+                transport, _ = await asyncio.shield(self._opening)
+            finally:
+                self._opening = None
+            if self.transport is None:
+                self.transport = transport
+        return self
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        for future in self.pending.values():
+            if not future.done():
+                future.cancel()
+        self.pending.clear()
+
+    def _on_response(self, data, addr):
+        if len(data) < 12:
+            return
+        future = self.pending.get((addr[0], struct.unpack('!H', data[:2])[0]))
+        if future is not None and not future.done():
+            future.set_result(data)
+
+    def _new_id(self, ip):
+        while True:
+            qid = random.randrange(0x10000)
+            if (ip, qid) not in self.pending:
+                return qid
+
+    def build(self, qid, ip):
+        """构造查询报文"""
+        raise NotImplementedError
+
+    def parse(self, data, ip):
+        """从应答中取出主机名，没有则返回None"""
+        raise NotImplementedError
+
+    async def resolve(self, ip):
+        """询问ip本身的名字，返回主机名；无应答返回None"""
+        ip = str(ip)
+        key = (self.protocol, ip)
+        hit, hostname = self.cache.get(key)
+        if hit:
+            return hostname
+        await self.open()
+
+        loop = asyncio.get_running_loop()
+        qid = self._new_id(ip)
+        future = loop.create_future()
+        self.pending[(ip, qid)] = future
+        hostname = None
+        try:
+            if self.limiter is not None:
+                await self.limiter.acquire()
+            self.transport.sendto(self.build(qid, ip), (ip, self.port))
+            hostname = self.parse(await asyncio.wait_for(future, self.timeout), ip)
+        except (asyncio.TimeoutError, OSError, ValueError, struct.error, IndexError):
+            pass
+        finally:
+            self.pending.pop((ip, qid), None)
+        self.cache.put(key, hostname, PEER_POSITIVE_TTL if hostname else DEFAULT_NEGATIVE_TTL)
+        return hostname
+
+
+class MdnsResolver(PeerResolver):
+    """mDNS反向查询: 向目标的5353端口单播PTR查询(RFC 6762的传统单播方式)"""
+
+    port = 5353
+    protocol = 'mdns'
+
+    def build(self, qid, ip):
+        return build_query(qid, ptr_name(ip), DNS_TYPE_PTR, flags=0)
+
+    def parse(self, data, ip):
+        response = parse_response(data)
+        for _, rtype, _, rdata in response['answers']:
+            if rtype == DNS_TYPE_PTR:
+                return rdata.rstrip('.')
+        return None
+
+
+class LlmnrResolver(MdnsResolver):
+    """LLMNR反向查询: 向目标的5355端口单播PTR查询(RFC 4795)"""
+
+    port = 5355
+    protocol = 'llmnr'
+
+
+# NetBIOS节点状态查询的名字"*"(一级编码)
+_NBSTAT_NAME = b'\x20' + b'CK' + b'A' * 30 + b'\x00'
+NBSTAT_TYPE = 0x21
+
+
+class NetbiosResolver(PeerResolver):
+    """NetBIOS节点状态查询(137/udp)，返回工作站名"""
+
+    port = 137
+    protocol = 'netbios'
+
+    def build(self, qid, ip):
+        return struct.pack('!HHHHHH', qid, 0, 1, 0, 0, 0) + _NBSTAT_NAME + struct.pack('!HH', NBSTAT_TYPE, 1)
+
+    def parse(self, data, ip):
+        _, offset = _read_name(data, 12)
+        rtype, _, _, _ = struct.unpack('!HHIH', data[offset:offset + 10])
+        if rtype != NBSTAT_TYPE:
+            return None
+        offset += 10
+        count = data[offset]
+        offset += 1
+        fallback = None
+        for index in range(count):
+            entry = data[offset + index * 18:offset + (index + 1) * 18]
+            if len(entry) < 18:
+                break
+            name = entry[:15].decode('latin-1').rstrip(' \x00')
+            suffix = entry[15]
+            group = struct.unpack('!H', entry[16:18])[0] & 0x8000
+            if group or not name:
+                continue
+            # 后缀0x00为工作站服务，0x20为文件服务
+            if suffix == 0x00:
+                return name
+            if suffix == 0x20 and fallback is None:
+                fallback = name
+        return fallback
+
+
+def peer_resolvers(timeout=0.5, limiter=None):
+    """创建一组对端名字解析器(mDNS、LLMNR、NetBIOS)，用完后逐个close()"""
+    return [MdnsResolver(timeout, limiter=limiter), LlmnrResolver(timeout, limiter=limiter),
+            NetbiosResolver(timeout, limiter=limiter)]
+
+
+class HostsFile:
+    """/etc/hosts的IP到主机名索引，文件修改后才重新读取"""
+
+    def __init__(self, path='/etc/hosts'):
+        self.path = path
+        self.mtime = None
+        self.entries = {}
+
+    def lookup(self, ip):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None
+        if mtime != self.mtime:
+            entries = {}
+            try:
+                with open(self.path, 'r') as f:
+                    for line in f:
+                        columns = line.split('#', 1)[0].split()
+                        if len(columns) >= 2:
+                            entries.setdefault(columns[0], columns[1])
+            except OSError:
+                return None
+            self.entries = entries
+            self.mtime = mtime
+        return self.entries.get(str(ip))
+
+
+hosts_file = HostsFile()
+
+# 系统解析器结果的缓存(系统解析器不返回TTL，使用固定时间)
+system_cache = TtlCache()
+SYSTEM_POSITIVE_TTL = 300
+
+
+async def system_lookup(ip, limiter=None):
+    """通过系统解析器(nsswitch)反向解析，覆盖hosts文件以外的其他名字来源
+
+    系统解析器可能发出DNS查询，提供limiter时先取得一个令牌
+    """
+    ip = str(ip)
+    hit, hostname = system_cache.get(ip)
+    if hit:
+        return hostname
+    if limiter is not None:
+        await limiter.acquire()
+    loop = asyncio.get_running_loop()
+    try:
+        hostname, _, _ = await loop.run_in_executor(_system_executor, socket.gethostbyaddr, ip)
+    except (socket.herror, socket.gaierror, OSError):
+        hostname = None
+    if hostname == ip:
+        hostname = None
+    system_cache.put(ip, hostname, SYSTEM_POSITIVE_TTL if hostname else DEFAULT_NEGATIVE_TTL)
+    return hostname
+
+
+async def first_answer(lookups):
+    """并发执行多个解析协程，返回第一个有效结果，全部失败返回None"""
+    tasks = [asyncio.ensure_future(lookup) for lookup in lookups]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                result = await next_done
+            except Exception:
+                continue
+            if result:
+                return result
+        return None
+    finally:
+        for task in tasks:
+            task.cancel()
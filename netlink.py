@@ -0,0 +1,244 @@
+import asyncio
+import socket
+import struct
+
+# rtnetlink消息类型和标志(linux/rtnetlink.h, linux/netlink.h)
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+RTM_NEWNEIGH = 28
+RTM_DELNEIGH = 29
+RTM_GETNEIGH = 30
+NLM_F_REQUEST = 0x01
+NLM_F_DUMP = 0x300
+RTNLGRP_NEIGH = 3
+
+NDA_DST = 1
+NDA_LLADDR = 2
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+
+# 邻居表项状态(linux/neighbour.h)
+NUD_INCOMPLETE = 0x01
+NUD_REACHABLE = 0x02
+NUD_STALE = 0x04
+NUD_DELAY = 0x08
+NUD_PROBE = 0x10
+NUD_FAILED = 0x20
+NUD_NOARP = 0x40
+NUD_PERMANENT = 0x80
+
+_NLMSGHDR = struct.Struct('=IHHII')
+_NDMSG = struct.Struct('=BxxxiHBB')
+_IFADDRMSG = struct.Struct('=BBBBI')
+_RTATTR = struct.Struct('=HH')
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def presence_of(state):
+    """把内核邻居状态映射为在线状态
+
+    返回:
+        'online'   REACHABLE: 内核最近确认过对方可达
+        'uncertain' STALE/DELAY/PROBE: 一段时间没有确认，需要探测
+        'offline'  FAILED/INCOMPLETE: 地址解析失败
+        None       其他(PERMANENT、NOARP)，静态表项不能说明对方是否在线
+    """
+    if state & NUD_REACHABLE:
+        return 'online'
+    if state & (NUD_STALE | NUD_DELAY | NUD_PROBE):
+        return 'uncertain'
+    if state & (NUD_FAILED | NUD_INCOMPLETE):
+        return 'offline'
+    return None
+
+
+def parse_messages(data):
+    """把netlink数据拆分为(消息类型, 消息体)"""
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size or offset + length > len(data):
+            break
+        yield msg_type, data[offset + _NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+
+def parse_attributes(payload, offset):
+    """解析rtattr列表，返回{类型: 数据}"""
+    attributes = {}
+    while offset + _RTATTR.size <= len(payload):
+        length, attr_type = _RTATTR.unpack_from(payload, offset)
+        if length < _RTATTR.size:
+            break
+        attributes[attr_type] = payload[offset + _RTATTR.size:offset + length]
+        offset += _align(length)
+    return attributes
+
+
+def parse_neighbor(msg_type, payload):
+    """解析RTM_NEWNEIGH/RTM_DELNEIGH消息
+
+    返回:
+        {'event': 'new'或'del', 'family', 'ifindex', 'state', 'ip', 'mac'}，
+        不是邻居消息或没有目的地址时返回None；没有链路层地址时mac为None
+    """
+    if msg_type not in (RTM_NEWNEIGH, RTM_DELNEIGH) or len(payload) < _NDMSG.size:
+        return None
+    family, ifindex, state, _, _ = _NDMSG.unpack_from(payload)
+    attributes = parse_attributes(payload, _NDMSG.size)
+    destination = attributes.get(NDA_DST)
+    if destination is None or family not in (socket.AF_INET, socket.AF_INET6):
+        return None
+    lladdr = attributes.get(NDA_LLADDR)
+    return {
+        'event': 'new' if msg_type == RTM_NEWNEIGH else 'del',
+        'family': family,
+        'ifindex': ifindex,
+        'state': state,
+        'ip': socket.inet_ntop(family, destination),
+        'mac': ':'.join(f'{b:02x}' for b in lladdr) if lladdr and len(lladdr) == 6 else None,
+    }
+
+
+def parse_address(msg_type, payload):
+    """解析RTM_NEWADDR消息
+
+    返回:
+        {'family', 'ifindex', 'prefixlen', 'scope', 'ip', 'label'}，不是地址消息时返回None
+    """
+    if msg_type != RTM_NEWADDR or len(payload) < _IFADDRMSG.size:
+        return None
+    family, prefixlen, _, scope, ifindex = _IFADDRMSG.unpack_from(payload)
+    attributes = parse_attributes(payload, _IFADDRMSG.size)
+    # 点对点链路上IFA_ADDRESS是对端地址，本机地址在IFA_LOCAL中
+    address = attributes.get(IFA_LOCAL) or attributes.get(IFA_ADDRESS)
+    if address is None or family not in (socket.AF_INET, socket.AF_INET6):
+        return None
+    return {
+        'family': family,
+        'ifindex': ifindex,
+        'prefixlen': prefixlen,
+        'scope': scope,
+        'ip': socket.inet_ntop(family, address),
+        'label': attributes.get(IFA_LABEL, b'').split(b'\0', 1)[0].decode(errors='replace'),
+    }
+
+
+def _dump(msg_type, body, parse, timeout=1.0):
+    """发送NLM_F_DUMP请求并收集全部应答，平台不支持时抛出OSError"""
+    if not hasattr(socket, 'AF_NETLINK'):
+        raise OSError('当前平台不支持netlink')
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+    try:
+        sock.settimeout(timeout)
+        sock.bind((0, 0))
+        header = _NLMSGHDR.pack(_NLMSGHDR.size + len(body), msg_type, NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+        sock.send(header + body)
+        results = []
+        while True:
+            data = sock.recv(65536)
+            for reply_type, payload in parse_messages(data):
+                if reply_type == NLMSG_DONE:
+                    return results
+                if reply_type == NLMSG_ERROR:
+                    error = struct.unpack_from('=i', payload)[0] if len(payload) >= 4 else 0
+                    if error:
+                        raise OSError(-error, 'netlink请求失败')
+                    return results
+                item = parse(reply_type, payload)
+                if item is not None:
+                    results.append(item)
+    finally:
+        sock.close()
+
+
+def dump_neighbors(family=socket.AF_INET):
+    """读取内核邻居表，返回parse_neighbor格式的列表"""
+    body = _NDMSG.pack(family, 0, 0, 0, 0)
+    return _dump(RTM_GETNEIGH, body, parse_neighbor)
+
+
+def dump_addresses(family=socket.AF_INET):
+    """读取本机所有网卡地址(含前缀长度)，返回parse_address格式的列表"""
+    body = _IFADDRMSG.pack(family, 0, 0, 0, 0)
+    return _dump(RTM_GETADDR, body, parse_address)
+
+
+class NeighborMonitor:
+    """订阅rtnetlink邻居表变化(RTNLGRP_NEIGH)，不需要root权限
+
+    内核每次改变邻居表项状态都会发出通知: 收到对方的流量或应答时进入REACHABLE，
+    一段时间没有确认变为STALE，地址解析失败变为FAILED。states保存每个地址的
+    最新(MAC, 状态)，提供callback时对每个通知调用callback(neighbor)。
+    """
+
+    def __init__(self, callback=None, family=socket.AF_INET):
+        self.callback = callback
+        self.family = family
+        self.states = {}
+        self.sock = None
+        self.loop = None
+
+    def open(self):
+        """打开订阅socket并载入当前邻居表，平台不支持时抛出OSError"""
+        if not hasattr(socket, 'AF_NETLINK'):
+            raise OSError('当前平台不支持netlink')
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        try:
+            self.sock.bind((0, 1 << (RTNLGRP_NEIGH - 1)))
+            self.sock.setblocking(False)
+            # 先订阅再读取，避免两步之间的变化丢失
+            for neighbor in dump_neighbors(self.family):
+                self.states[neighbor['ip']] = (neighbor['mac'], neighbor['state'])
+            self.loop = asyncio.get_running_loop()
+            self.loop.add_reader(self.sock.fileno(), self._on_readable)
+        except OSError:
+            self.sock.close()
+            self.sock = None
+            raise
+        return self
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # ENOBUFS: 通知太多来不及读取，重新读取整个邻居表
+                self._resync()
+                return
+            for msg_type, payload in parse_messages(data):
+                neighbor = parse_neighbor(msg_type, payload)
+                if neighbor is None or neighbor['family'] != self.family:
+                    continue
+                if neighbor['event'] == 'del':
+                    self.states.pop(neighbor['ip'], None)
+                else:
+                    previous = self.states.get(neighbor['ip'], (None, 0))[0]
+                    self.states[neighbor['ip']] = (neighbor['mac'] or previous, neighbor['state'])
+                if self.callback is not None:
+                    self.callback(neighbor)
+
+    def _resync(self):
+        try:
+            neighbors = dump_neighbors(self.family)
+        except OSError:
+            return
+        self.states = {neighbor['ip']: (neighbor['mac'], neighbor['state']) for neighbor in neighbors}
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.loop.remove_reader(self.sock.fileno())
+            except (ValueError, OSError, AttributeError):
+                pass
+            self.sock.close()
+            self.sock = None
@@ -0,0 +1,121 @@
+"""按MAC地址的前24位(OUI)查询网卡厂商
+
+厂商数据来自IEEE MA-L注册表，保存在同目录的oui.tsv中(每行"6位十六进制前缀<TAB>厂商名"，
+按前缀排序)。第一次查询时才载入: 前缀存入紧凑的32位整数数组，用bisect查找，
+厂商名去重后共享同一个字符串对象。查询结果按MAC前8个字符记忆，
+同一厂商的设备再次查询只需一次字典查找。
+
+更新数据: 下载 https://standards-oui.ieee.org/oui/oui.csv (或oui.txt)后运行
+    python oui.py oui.csv
+"""
+import array
+import bisect
+import csv
+import os
+import sys
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'oui.tsv')
+
+
+class OuiTable:
+    """OUI前缀到厂商名的只读索引，首次lookup时载入数据文件"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.prefixes = None
+        self.names = None
+        self.memo = {}
+
+    def load(self):
+        prefixes = array.array('I')
+        names = []
+        interned = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    prefix, _, name = line.rstrip('\n').partition('\t')
+                    try:
+                        value = int(prefix, 16)
+                    except ValueError:
+                        continue
+                    prefixes.append(value)
+                    names.append(interned.setdefault(name, name))
+        except OSError:
+            pass
+        # 数据文件应当已经排序，这里保证bisect的前提成立
+        if any(prefixes[i] > prefixes[i + 1] for i in range(len(prefixes) - 1)):
+            order = sorted(range(len(prefixes)), key=prefixes.__getitem__)
+            prefixes = array.array('I', (prefixes[i] for i in order))
+            names = [names[i] for i in order]
+        self.prefixes = prefixes
+        self.names = names
+
+    def lookup(self, mac):
+        """返回MAC地址对应的厂商名，未知或无效的地址返回'Unknown'"""
+        key = mac[:8]
+        vendor = self.memo.get(key)
+        if vendor is not None:
+            return vendor
+        if self.prefixes is None:
+            self.load()
+        try:
+            # 接受aa:bb:cc:..、aa-bb-cc-..和aabbcc..格式
+            if len(mac) >= 8 and not mac[2].isalnum():
+                value = int(key.replace(mac[2], ''), 16)
+            else:
+                value = int(mac[:6], 16)
+        except (ValueError, TypeError, IndexError):
+            return 'Unknown'
+        index = bisect.bisect_left(self.prefixes, value)
+        if index < len(self.prefixes) and self.prefixes[index] == value:
+            vendor = self.names[index]
+        else:
+            vendor = 'Unknown'
+        self.memo[key] = vendor
+        return vendor
+
+
+default_table = OuiTable()
+
+# 查询MAC地址的厂商(使用随程序提供的oui.tsv)
+vendor_of = default_table.lookup
+
+
+def read_ieee_registry(path):
+    """读取IEEE发布的oui.csv或oui.txt，返回{前缀整数: 厂商名}"""
+    entries = {}
+    with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        if path.lower().endswith('.csv'):
+            for row in csv.reader(f):
+                if len(row) >= 3 and row[0] == 'MA-L':
+                    try:
+                        entries[int(row[1], 16)] = row[2].strip()
+                    except ValueError:
+                        continue
+        else:
+            for line in f:
+                if '(base 16)' in line:
+                    prefix, _, name = line.partition('(base 16)')
+                    try:
+                        entries[int(prefix.strip(), 16)] = name.strip()
+                    except ValueError:
+                        continue
+    return entries
+
+
+def write_table(entries, path=DEFAULT_PATH):
+    """把{前缀整数: 厂商名}按前缀排序写成oui.tsv格式"""
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        for prefix in sorted(entries):
+            name = ' '.join(entries[prefix].split())
+            if name:
+                f.write(f'{prefix:06X}\t{name}\n')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print('用法: python oui.py <IEEE oui.csv或oui.txt>')
+        sys.exit(1)
+    registry = read_ieee_registry(sys.argv[1])
+    write_table(registry)
+    print(f'已写入 {len(registry)} 条OUI记录到 {DEFAULT_PATH}')
@@ -0,0 +1,23 @@
+"""测试共用的辅助函数: 把仓库根目录加入sys.path，读取tests/fixtures中的数据"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'tests', 'fixtures')
+
+sys.path.insert(0, ROOT)
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def read_hex_fixture(name):
+    """读取"名称 十六进制数据"格式的报文文件，#开头的行为注释"""
+    packets = {}
+    for line in read_fixture(name).splitlines():
+        if line.strip() and not line.startswith('#'):
+            key, data = line.split()
+            packets[key] = bytes.fromhex(data)
+    return packets
@@ -0,0 +1,164 @@
+"""地址描述解析(parse_address_spec)和整数区间集合(AddressSet)的测试"""
+import ipaddress
+import os
+import random
+import tempfile
+import unittest
+
+from support import FIXTURES
+
+from lan_scanner import AddressSet, ip_to_int, parse_address_spec
+
+
+class AddressSpecTest(unittest.TestCase):
+
+    def test_formats(self):
+        self.assertEqual(parse_address_spec('192.168.1.10'), [(ip_to_int('192.168.1.10'),) * 2])
+        self.assertEqual(parse_address_spec('192.168.16.0/20'),
+                         [(ip_to_int('192.168.16.0'), ip_to_int('192.168.31.255'))])
+        self.assertEqual(parse_address_spec('192.168.1.100-192.168.1.199'),
+                         [(ip_to_int('192.168.1.100'), ip_to_int('192.168.1.199'))])
+        self.assertEqual(parse_address_spec(' 192.168.1.100-199 '),
+                         [(ip_to_int('192.168.1.100'), ip_to_int('192.168.1.199'))])
+        self.assertEqual(parse_address_spec(ipaddress.IPv4Network('10.0.0.0/30')),
+                         [(ip_to_int('10.0.0.0'), ip_to_int('10.0.0.3'))])
+        self.assertEqual(parse_address_spec(ipaddress.IPv4Address('10.0.0.1')), [(ip_to_int('10.0.0.1'),) * 2])
+        self.assertEqual(parse_address_spec(42), [(42, 42)])
+
+    def test_invalid(self):
+        for spec in ('192.168.1.300', '192.168.1.20-10', 'not-an-address', '10.0.0.0/33'):
+            with self.assertRaises(ValueError):
+                parse_address_spec(spec)
+
+
+class AddressFileTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_only_at_prefix_reads_file(self):
+        # 当前目录中与地址同名的文件不会被当作地址文件
+        self.write('192.168.1.10', '10.0.0.0/8\n')
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        self.addCleanup(os.chdir, cwd)
+        self.assertEqual(parse_address_spec('192.168.1.10'), [(ip_to_int('192.168.1.10'),) * 2])
+        self.assertEqual(parse_address_spec('@192.168.1.10'), [(ip_to_int('10.0.0.0'), ip_to_int('10.255.255.255'))])
+
+    def test_nested_files(self):
+        shared = self.write('shared.txt', '10.0.0.1\n')
+        first = self.write('first.txt', f'@{shared}\n10.0.0.2\n')
+        second = self.write('second.txt', f'@{shared}, 10.0.0.3\n')
+        top = self.write('top.txt', f'@{first}\n@{second}  # 两个文件都引用shared.txt，不是循环\n')
+        self.assertEqual(list(AddressSet.parse(f'@{top}')), [(ip_to_int('10.0.0.1'), ip_to_int('10.0.0.3'))])
+
+    def test_cycle(self):
+        itself = os.path.join(self.directory, 'self.txt')
+        self.write('self.txt', f'10.0.0.1\n@{itself}\n')
+        with self.assertRaisesRegex(ValueError, '循环引用'):
+            parse_address_spec(f'@{itself}')
+        first = os.path.join(self.directory, 'a.txt')
+        second = self.write('b.txt', f'@{first}\n')
+        self.write('a.txt', f'@{second}\n')
+        with self.assertRaisesRegex(ValueError, '循环引用'):
+            AddressSet.parse(f'@{first}')
+
+    def test_unreadable(self):
+        for path in (os.path.join(self.directory, 'missing.txt'), self.directory):
+            with self.assertRaisesRegex(ValueError, '无法读取地址文件'):
+                parse_address_spec(f'@{path}')
+        binary = os.path.join(self.directory, 'binary.txt')
+        with open(binary, 'wb') as f:
+            f.write(b'\xff\xfe\x00')
+        with self.assertRaises(ValueError):
+            parse_address_spec(f'@{binary}')
+
+
+class AddressSetTest(unittest.TestCase):
+
+    def test_parse_merges_overlapping_and_adjacent(self):
+        addresses = AddressSet.parse(['192.168.1.10-20', '192.168.1.21', '192.168.1.15/30', '192.168.1.40'])
+        self.assertEqual(list(addresses), [
+            (ip_to_int('192.168.1.10'), ip_to_int('192.168.1.21')),
+            (ip_to_int('192.168.1.40'), ip_to_int('192.168.1.40')),
+        ])
+        self.assertEqual(addresses.count(), 13)
+
+    def test_parse_comma_separated_and_file(self):
+        path = os.path.join(FIXTURES, 'exclude.txt')
+        addresses = AddressSet.parse(f'10.0.0.1,@{path}')
+        self.assertEqual(list(addresses), [
+            (ip_to_int('10.0.0.1'), ip_to_int('10.0.0.1')),
+            (ip_to_int('10.0.16.0'), ip_to_int('10.0.31.255')),
+            (ip_to_int('192.168.1.100'), ip_to_int('192.168.1.199')),
+        ])
+
+    def test_parse_empty(self):
+        self.assertFalse(AddressSet.parse(None))
+        self.assertFalse(AddressSet.parse([]))
+        self.assertEqual(AddressSet().count(), 0)
+
+    def test_membership(self):
+        # 每隔一个地址一个区间，成员判断在区间边界上二分查找
+        addresses = AddressSet([(value, value) for value in range(0, 2000, 2)])
+        self.assertEqual(addresses.count(), 1000)
+        for value in range(2000):
+            self.assertEqual(value in addresses, value % 2 == 0)
+        self.assertNotIn(-1, addresses)
+        self.assertNotIn(2001, addresses)
+        self.assertNotIn(5, AddressSet())
+
+    def test_clip(self):
+        space = AddressSet([(1, 10), (20, 30), (40, 50)])
+        self.assertEqual(list(space.clip(5, 25)), [(5, 10), (20, 25)])
+        self.assertFalse(space.clip(11, 19))
+
+    def test_subtract(self):
+        space = AddressSet([(1, 100), (200, 300)])
+        rest = space.subtract(AddressSet([(0, 10), (50, 60), (100, 250), (300, 400)]))
+        self.assertEqual(list(rest), [(11, 49), (61, 99), (251, 299)])
+        self.assertEqual(list(space.subtract(AddressSet())), list(space))
+        self.assertFalse(space.subtract(AddressSet([(0, 1000)])))
+
+    def test_addresses(self):
+        space = AddressSet([(1, 3), (10, 12)])
+        self.assertEqual(list(space.addresses()), [1, 2, 3, 10, 11, 12])
+
+    def test_addresses_skip(self):
+        space = AddressSet([(1, 3), (10, 12)])
+        self.assertEqual(list(space.addresses(4)), [11, 12])
+        self.assertEqual(list(space.addresses(3)), [10, 11, 12])
+        self.assertEqual(list(space.addresses(6)), [])
+
+    def test_shuffled_is_permutation(self):
+        space = AddressSet([(1, 50), (100, 149), (1000, 1000)])
+        for seed in range(20):
+            order = list(space.shuffled(random.Random(seed)))
+            # 每个地址恰好出现一次
+            self.assertEqual(sorted(order), list(space.addresses()))
+        self.assertNotEqual(list(space.shuffled(random.Random(1))), list(space.addresses()))
+
+    def test_shuffled_small_and_empty(self):
+        for size in (1, 2, 3):
+            space = AddressSet([(10, 10 + size - 1)])
+            self.assertEqual(sorted(space.shuffled(random.Random(3))), list(space.addresses()))
+        self.assertEqual(list(AddressSet().shuffled()), [])
+
+    def test_shuffled_same_seed_same_order(self):
+        space = AddressSet([(1, 50), (100, 149)])
+        order = list(space.shuffled(random.Random(7)))
+        self.assertEqual(list(space.shuffled(random.Random(7))), order)
+        # 从中断处继续: 跳过已扫描的部分，得到剩余的地址
+        self.assertEqual(list(space.shuffled(random.Random(7), 37)), order[37:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+"""扫描检查点(ScanCheckpoint)和从检查点继续扫描的测试，使用临时数据库和假的探测函数"""
+import asyncio
+import contextlib
+import io
+import ipaddress
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import support  # noqa: F401  (把仓库根目录加入sys.path)
+
+import lan_scanner
+from db_manager import DatabaseManager, ScanCheckpoint
+from lan_scanner import AddressSet, host_bounds, int_to_ip
+
+# 文档用地址段，不会与本机网卡或ARP表中的地址重叠
+NETWORK = ipaddress.IPv4Network('198.51.100.0/28')
+ALIVE = {'198.51.100.3', '198.51.100.6', '198.51.100.9', '198.51.100.12'}
+
+
+class TempDatabaseTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_manager = DatabaseManager(os.path.join(directory.name, 'test.db'))
+        self.addCleanup(self.db_manager.close)
+
+
+class ScanCheckpointTest(TempDatabaseTest):
+
+    def test_save_and_resume(self):
+        checkpoint = ScanCheckpoint(self.db_manager, '10.0.0.0/28', 'icmp:sequential:a', 14, resume=True)
+        self.assertFalse(checkpoint.resumed)
+        checkpoint.add_host({'ip': '10.0.0.3', 'hostname': 'nas', 'mac': 'aa:bb:cc:00:00:03',
+                             'vendor': 'Unknown', 'interface': 'eth0', 'network': '10.0.0.0/28'})
+        checkpoint.save(5)
+
+        resumed = ScanCheckpoint(self.db_manager, '10.0.0.0/28', 'icmp:sequential:a', 14, resume=True)
+        self.assertTrue(resumed.resumed)
+        self.assertEqual((resumed.id, resumed.seed, resumed.cursor, resumed.total),
+                         (checkpoint.id, checkpoint.seed, 5, 14))
+        self.assertEqual(resumed.hosts, [{'ip': '10.0.0.3', 'hostname': 'nas', 'mac': 'aa:bb:cc:00:00:03',
+                                          'vendor': 'Unknown', 'interface': 'eth0', 'network': '10.0.0.0/28'}])
+
+        # 地址空间或扫描顺序不同的扫描不能继续
+        self.assertFalse(ScanCheckpoint(self.db_manager, '10.0.0.0/28', 'icmp:random:a', 14, resume=True).resumed)
+        # 完整结束后删除检查点
+        resumed.finish()
+        self.assertIsNone(self.db_manager.find_checkpoint('10.0.0.0/28', 'icmp:sequential:a'))
+
+    def test_new_scan_replaces_checkpoint(self):
+        checkpoint = ScanCheckpoint(self.db_manager, '10.0.0.0/28', 'icmp:sequential:a', 14)
+        checkpoint.save(7)
+        replaced = ScanCheckpoint(self.db_manager, '10.0.0.0/28', 'icmp:sequential:a', 14, resume=False)
+        self.assertFalse(replaced.resumed)
+        self.assertEqual(self.db_manager.find_checkpoint('10.0.0.0/28', 'icmp:sequential:a')[2], 0)
+
+
+class ResumeScanTest(TempDatabaseTest):
+
+    def setUp(self):
+        super().setUp()
+        self.probed = []
+
+        async def probe_host(ip, *args):
+            self.probed.append(ip)
+            await asyncio.sleep(0)
+            return ip in ALIVE
+
+        async def lookup_hostname(ip, mac, *args):
+            return 'host-' + ip.rsplit('.', 1)[1]
+
+        async def arp_sweep(network, interface=None, hosts=None, limiter=None, **kwargs):
+            # ARP扫描一次探测完所有地址，只返回应答的主机
+            swept = [int_to_ip(value) for value in hosts]
+            self.probed.extend(swept)
+            return [{'ip': ip, 'mac': 'aa:bb:cc:00:00:%02x' % int(ip.rsplit('.', 1)[1])}
+                    for ip in swept if ip in ALIVE]
+
+        for name, fake in (('probe_host', probe_host), ('lookup_hostname', lookup_hostname),
+                           ('arp_sweep', arp_sweep)):
+            patcher = mock.patch.object(lan_scanner, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def scan(self, resume, random_order, stop_after=None, mode='tcp'):
+        async def run():
+            hosts = []
+            stream = lan_scanner.scan_stream(NETWORK, mode=mode, trust_neighbors=False, random_order=random_order,
+                                             checkpoint_db=self.db_manager, resume=resume, checkpoint_interval=0)
+            try:
+                async for host in stream:
+                    hosts.append(host)
+                    if len(hosts) == stop_after:
+                        break
+            finally:
+                # 模拟扫描中途被停止: 关闭迭代器时保存检查点
+                await stream.aclose()
+            return hosts
+
+        self.probed = []
+        return asyncio.run(run())
+
+    def check_resume(self, random_order, mode='tcp'):
+        first = self.scan(resume=False, random_order=random_order, stop_after=2, mode=mode)
+        self.db_manager.cursor.execute('SELECT seed, cursor FROM scan_checkpoints')
+        seed, cursor = self.db_manager.cursor.fetchone()
+        self.assertGreater(cursor, 0)
+        space = AddressSet([host_bounds(NETWORK)])
+        order = [int_to_ip(value) for value in
+                 (space.shuffled(random.Random(seed)) if random_order else space.addresses())]
+
+        second = self.scan(resume=True, random_order=random_order, mode=mode)
+        # 先产出检查点中的主机，之后只探测检查点之后剩余的地址
+        self.assertCountEqual([host['ip'] for host in second[:2]], [host['ip'] for host in first])
+        self.assertEqual(sorted(self.probed), sorted(set(order[cursor:]) - {host['ip'] for host in first}))
+        self.assertEqual(len(self.probed), len(set(self.probed)))
+        self.assertEqual(sorted(host['ip'] for host in second), sorted(ALIVE))
+        self.assertEqual({host['hostname'] for host in second}, {'host-3', 'host-6', 'host-9', 'host-12'})
+        # 完整结束后检查点被删除
+        self.db_manager.cursor.execute('SELECT COUNT(*) FROM scan_checkpoints')
+        self.assertEqual(self.db_manager.cursor.fetchone()[0], 0)
+
+    def test_resume_sequential(self):
+        self.check_resume(random_order=False)
+
+    def test_resume_random_order(self):
+        self.check_resume(random_order=True)
+
+    def test_resume_arp_mode(self):
+        # ARP扫描没有应答的地址也算完成，检查点越过它们继续前进
+        self.check_resume(random_order=True, mode='arp')
+
+
+class IncrementalFlagsTest(TempDatabaseTest):
+
+    def test_resume_rejected_with_incremental(self):
+        argv = ['lan_scanner.py', '--db', 'unused.db', '--incremental', '5', '--resume']
+        with mock.patch('sys.argv', argv), contextlib.redirect_stdout(io.StringIO()) as stdout:
+            asyncio.run(lan_scanner.main())
+        self.assertIn('--resume不能与--incremental同时使用', stdout.getvalue())
+
+    def test_full_sweep_uses_broadcast(self):
+        calls = []
+
+        async def scan_stream(network, *args, **kwargs):
+            calls.append(kwargs)
+            return
+            yield
+
+        async def run():
+            return [host async for host in lan_scanner.scan_incremental(NETWORK, self.db_manager, full_sweep=True,
+                                                                       broadcast=True)]
+
+        with mock.patch.object(lan_scanner, 'scan_stream', scan_stream):
+            self.assertEqual(asyncio.run(run()), [])
+        self.assertEqual([call['broadcast'] for call in calls], [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+"""AIMD自适应并发控制器(AdaptiveConcurrency)的测试，时间使用假时钟"""
+import asyncio
+import ipaddress
+import unittest
+from unittest import mock
+
+import support  # noqa: F401  (把仓库根目录加入sys.path)
+
+import lan_scanner
+from lan_scanner import AdaptiveConcurrency
+
+
+class FixedConcurrency(AdaptiveConcurrency):
+    """并发上限不增长的控制器"""
+
+    def _increase(self):
+        pass
+
+
+class AdaptiveConcurrencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('lan_scanner.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_slow_start_increase(self):
+        controller = AdaptiveConcurrency(initial=10, max_limit=100)
+        for _ in range(5):
+            controller.on_success()
+        # 空地址超时是常态，同样加1
+        for _ in range(5):
+            controller.on_timeout()
+        self.assertEqual(controller.current, 20)
+        self.assertEqual(controller.peak, 20)
+
+    def test_backoff_then_additive_increase(self):
+        controller = AdaptiveConcurrency(initial=64, max_limit=1024)
+        controller.on_timeout(expected=True)
+        self.assertEqual(controller.current, 32)
+        self.assertFalse(controller.slow_start)
+        # 拥塞避免: 约每完成"当前上限"个探测加1
+        for _ in range(32):
+            controller.on_success()
+        self.assertEqual(controller.current, 32)
+        controller.on_success()
+        self.assertEqual(controller.current, 33)
+
+    def test_cooldown_between_decreases(self):
+        controller = AdaptiveConcurrency(initial=64, cooldown=1.0)
+        controller.on_timeout(expected=True)
+        # 同一次拥塞中在途的探测陆续超时，不再重复减小
+        self.now += 0.5
+        controller.on_timeout(expected=True)
+        controller.on_error()
+        self.assertEqual(controller.current, 32)
+        self.now += 0.6
+        controller.on_error()
+        self.assertEqual(controller.current, 16)
+
+    def test_limits(self):
+        controller = AdaptiveConcurrency(initial=10, min_limit=8, max_limit=12)
+        for _ in range(10):
+            controller.on_success()
+        self.assertEqual(controller.current, 12)
+        for _ in range(5):
+            self.now += 2
+            controller.on_error()
+        self.assertEqual(controller.current, 8)
+        self.assertEqual(controller.peak, 12)
+
+    def test_rtt_inflation_decreases(self):
+        controller = AdaptiveConcurrency(initial=40, rtt_window=4)
+        for _ in range(4):
+            controller.on_success(0.010)
+        self.assertEqual(controller.best_rtt, 0.010)
+        self.assertEqual(controller.current, 44)
+        for _ in range(4):
+            controller.on_success(0.100)
+        # 第4个应答凑满一批，中位数远高于最好的一批，减小而不是加1
+        self.assertEqual(controller.current, 23)
+
+    def test_simulated_timeouts(self):
+        # 模拟一轮扫描: 每个探测占用一个许可；预期在线的主机超时时并发数减半，
+        # 之后在更低的水平上继续加性增长
+        async def probe(controller, expected):
+            async with controller:
+                self.assertLessEqual(controller.in_flight, controller.current)
+                await asyncio.sleep(0)
+                if expected:
+                    controller.on_timeout(expected=True)
+                else:
+                    controller.on_success()
+
+        async def scan():
+            controller = AdaptiveConcurrency(initial=16, max_limit=256)
+            await asyncio.gather(*[probe(controller, False) for _ in range(100)])
+            grown = controller.current
+            self.now += 2
+            await asyncio.gather(*[probe(controller, index == 0) for index in range(150)])
+            return grown, controller
+
+        grown, controller = asyncio.run(scan())
+        self.assertEqual(grown, 116)
+        self.assertLess(controller.current, grown)
+        self.assertGreater(controller.current, grown // 2)
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_acquire_waits_for_release(self):
+        async def run():
+            controller = AdaptiveConcurrency(initial=8, min_limit=8)
+            for _ in range(8):
+                await controller.acquire()
+            waiter = asyncio.ensure_future(controller.acquire())
+            await asyncio.sleep(0)
+            self.assertFalse(waiter.done())
+            controller.release()
+            await waiter
+            self.assertEqual(controller.in_flight, 8)
+
+        asyncio.run(run())
+
+
+class DiscoveryWorkersTest(unittest.TestCase):
+    """发现阶段的工作协程数跟随并发上限，而不是一开始就创建max_limit个"""
+
+    def setUp(self):
+        self.alive = False
+        self.workers = set()
+        self.tasks = []
+        self.probed = []
+
+        async def probe_host(ip, *args):
+            self.workers.add(asyncio.current_task())
+            self.tasks.append(len(asyncio.all_tasks()))
+            self.probed.append(ip)
+            await asyncio.sleep(0)
+            return self.alive
+
+        async def lookup_hostname(ip, mac, *args):
+            return 'Unknown'
+
+        for name, fake in (('probe_host', probe_host), ('lookup_hostname', lookup_hostname)):
+            patcher = mock.patch.object(lan_scanner, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def scan(self, controller):
+        async def run():
+            network = ipaddress.IPv4Network('198.51.100.0/26')
+            return [host async for host in lan_scanner.scan_stream(network, mode='tcp', controller=controller,
+                                                                   trust_neighbors=False)]
+
+        return asyncio.run(run())
+
+    def test_workers_follow_limit(self):
+        self.assertEqual(self.scan(FixedConcurrency(initial=8, max_limit=1024)), [])
+        self.assertEqual(len(self.probed), 62)
+        self.assertEqual(len(self.workers), 8)
+        # 其余为MAC和主机名阶段的固定工作协程(16+64)，远少于max_limit
+        self.assertLess(max(self.tasks), 8 + 16 + 64 + 8)
+
+    def test_workers_added_as_limit_grows(self):
+        self.alive = True
+        controller = AdaptiveConcurrency(initial=8, max_limit=1024)
+        self.assertEqual(len(self.scan(controller)), 62)
+        self.assertGreater(len(self.workers), 8)
+        self.assertLessEqual(len(self.workers), controller.peak)
+        self.assertLess(max(self.tasks), controller.peak + 16 + 64 + 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
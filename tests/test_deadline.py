@@ -0,0 +1,66 @@
+"""扫描时间预算(ScanDeadline)的测试"""
+import asyncio
+import unittest
+from unittest import mock
+
+import support  # noqa: F401  (把仓库根目录加入sys.path)
+
+from lan_scanner import ScanDeadline
+
+
+class ScanDeadlineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('lan_scanner.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reserve(self):
+        self.assertEqual(ScanDeadline(10).reserve, 1.0)
+        self.assertEqual(ScanDeadline(60).reserve, 2.0)
+        self.assertEqual(ScanDeadline(60, reserve=5).reserve, 5)
+
+    def test_remaining(self):
+        deadline = ScanDeadline(10)
+        self.now += 4
+        self.assertEqual(deadline.remaining(), 6)
+        self.assertEqual(deadline.probe_remaining(), 5)
+        self.assertFalse(deadline.expired)
+        # 发现阶段先于整个预算结束
+        self.now += 5.5
+        self.assertLess(deadline.probe_remaining(), 0)
+        self.assertFalse(deadline.expired)
+        self.now += 0.5
+        self.assertTrue(deadline.expired)
+
+    def test_coverage_and_summary(self):
+        deadline = ScanDeadline(10)
+        self.assertEqual(deadline.coverage, 1.0)
+        deadline.total = 254
+        deadline.done = 161
+        self.assertEqual(deadline.summary(), '覆盖 63% (161/254)')
+        deadline.dropped['主机名'] += 3
+        deadline.dropped['MAC地址'] += 1
+        self.assertEqual(deadline.summary(), '覆盖 63% (161/254)，放弃: 主机名(3), MAC地址(1)')
+
+
+class DeadlineLimitTest(unittest.TestCase):
+
+    def test_limit(self):
+        async def run():
+            deadline = ScanDeadline(0.05)
+            self.assertEqual(await deadline.limit(asyncio.sleep(0, 'nas'), '主机名', 'Unknown'), 'nas')
+            pending = asyncio.get_running_loop().create_future()
+            self.assertEqual(await deadline.limit(pending, '主机名', 'Unknown'), 'Unknown')
+            self.assertTrue(pending.cancelled())
+            # 已过期时不再等待
+            self.assertEqual(await deadline.limit(asyncio.sleep(1, 'late'), 'MAC地址'), None)
+            return deadline
+
+        deadline = asyncio.run(run())
+        self.assertEqual(dict(deadline.dropped), {'主机名': 1, 'MAC地址': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""服务指纹解析(fingerprint.py)的测试"""
+import struct
+import unittest
+
+import support  # noqa: F401  (把仓库根目录加入sys.path)
+
+import fingerprint
+
+
+def smb_negotiate_response(dialect, security_mode, status=0):
+    """构造带NetBIOS会话头的SMB2 NEGOTIATE应答"""
+    header = fingerprint._SMB2_HEADER.pack(b'\xfeSMB', 64, 0, status, 0, 1, 1, 0, 0, 0, 0, 0, bytes(16))
+    body = fingerprint._SMB2_NEGOTIATE_RESPONSE.pack(65, security_mode, dialect, 0, bytes(16), 0)
+    message = header + body + bytes(24)
+    return struct.pack('>I', len(message)) + message
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_ssh(self):
+        self.assertEqual(fingerprint.parse_ssh(b'SSH-2.0-OpenSSH_9.2p1 Debian-2\r\n'), 'SSH-2.0-OpenSSH_9.2p1 Debian-2')
+        # 版本串之前允许有其他行
+        self.assertEqual(fingerprint.parse_ssh(b'Welcome\r\nSSH-2.0-dropbear_2022.83\r\n'), 'SSH-2.0-dropbear_2022.83')
+        self.assertIsNone(fingerprint.parse_ssh(b'220 ftp.example.lan FTP server ready\r\n'))
+        self.assertTrue(fingerprint._ssh_complete(b'SSH-2.0-x\r\n'))
+        self.assertFalse(fingerprint._ssh_complete(b'SSH-2.0-x'))
+
+    def test_http(self):
+        response = b'HTTP/1.1 200 OK\r\nContent-Type: text/html\r\nServer: nginx/1.24.0\r\n\r\n<html>'
+        self.assertEqual(fingerprint.parse_http(response), 'nginx/1.24.0')
+        self.assertEqual(fingerprint.parse_http(b'HTTP/1.0 401 Unauthorized\r\n\r\n'), 'HTTP/1.0 401 Unauthorized')
+        self.assertIsNone(fingerprint.parse_http(b'SSH-2.0-OpenSSH_9.2\r\n'))
+        self.assertTrue(fingerprint._http_complete(response))
+
+    def test_banner_is_cleaned_and_truncated(self):
+        banner = fingerprint.parse_http(b'HTTP/1.1 200 OK\r\nServer: \x1b[31m' + b'x' * 500 + b'\r\n\r\n')
+        self.assertEqual(banner, '[31m' + 'x' * (fingerprint.MAX_BANNER_LENGTH - 4))
+
+    def test_smb(self):
+        self.assertEqual(fingerprint.parse_smb(smb_negotiate_response(0x0302, 0x03)), 'SMB 3.0.2 signing required')
+        self.assertEqual(fingerprint.parse_smb(smb_negotiate_response(0x0210, 0x01)), 'SMB 2.1 signing optional')
+        self.assertEqual(fingerprint.parse_smb(smb_negotiate_response(0x0999, 0x01)), 'SMB 0x0999 signing optional')
+        self.assertIsNone(fingerprint.parse_smb(smb_negotiate_response(0x0302, 0x03, status=0xC0000022)))
+        self.assertIsNone(fingerprint.parse_smb(b'\x00\x00\x00\x04\xffSMB'))
+
+    def test_smb_complete(self):
+        response = smb_negotiate_response(0x0302, 0x03)
+        self.assertTrue(fingerprint._smb_complete(response))
+        self.assertFalse(fingerprint._smb_complete(response[:60]))
+
+    def test_smb_negotiate_request(self):
+        request = fingerprint.build_smb_negotiate()
+        self.assertEqual(int.from_bytes(request[:4], 'big'), len(request) - 4)
+        self.assertEqual(request[4:8], b'\xfeSMB')
+        self.assertEqual(request[-8:], struct.pack('<4H', *fingerprint.SMB2_DIALECTS))
+
+    def test_format_services(self):
+        services = {80: ('http', 'nginx'), 22: ('ssh', 'SSH-2.0-OpenSSH_9.2')}
+        self.assertEqual(fingerprint.format_services(services), '22/ssh SSH-2.0-OpenSSH_9.2, 80/http nginx')
+
+
+if __name__ == '__main__':
+    unittest.main()
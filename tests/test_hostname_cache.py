@@ -0,0 +1,55 @@
+"""数据库主机名缓存(HostnameCache)的测试，使用临时数据库"""
+import os
+import tempfile
+import unittest
+
+import support  # noqa: F401  (把仓库根目录加入sys.path)
+
+from db_manager import DatabaseManager, HostnameCache
+
+
+class HostnameCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_manager = DatabaseManager(os.path.join(directory.name, 'test.db'))
+        self.addCleanup(self.db_manager.close)
+
+    def test_entries_survive_between_scans(self):
+        cache = HostnameCache(self.db_manager)
+        self.assertIsNone(cache.get('aa:bb:cc:00:00:01', '192.168.1.10'))
+        cache.put('aa:bb:cc:00:00:01', '192.168.1.10', 'nas')
+        cache.flush()
+
+        cache = HostnameCache(self.db_manager)
+        self.assertEqual(cache.get('aa:bb:cc:00:00:01', '192.168.1.10'), 'nas')
+        # MAC或IP变化时不使用缓存
+        self.assertIsNone(cache.get('aa:bb:cc:00:00:02', '192.168.1.10'))
+        self.assertIsNone(cache.get('aa:bb:cc:00:00:01', '192.168.1.11'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2, 'hit_rate': 1 / 3})
+
+    def test_unknown_mac_not_cached(self):
+        cache = HostnameCache(self.db_manager)
+        cache.put('Unknown', '192.168.1.10', 'nas')
+        cache.flush()
+        self.assertIsNone(HostnameCache(self.db_manager).get('Unknown', '192.168.1.10'))
+
+    def test_failed_lookup_uses_negative_ttl(self):
+        cache = HostnameCache(self.db_manager, negative_ttl=0)
+        cache.put('aa:bb:cc:00:00:01', '192.168.1.10', 'Unknown')
+        cache.put('aa:bb:cc:00:00:02', '192.168.1.11', 'printer')
+        cache.flush()
+        self.assertEqual(HostnameCache(self.db_manager).entries,
+                         {('aa:bb:cc:00:00:02', '192.168.1.11'): 'printer'})
+
+    def test_flush_limits_entries(self):
+        cache = HostnameCache(self.db_manager, max_entries=2)
+        for index in range(3):
+            cache.put(f'aa:bb:cc:00:00:0{index}', f'192.168.1.{index}', f'host{index}')
+        cache.flush()
+        self.assertEqual(len(self.db_manager.get_cached_hostnames()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+"""名字解析的测试: DNS、mDNS和NetBIOS应答解析(抓取或按协议构造的报文)、TTL缓存、PTR解析器和系统解析器的回退"""
+import asyncio
+import unittest
+from unittest import mock
+
+from support import read_hex_fixture
+
+import lan_scanner
+from name_resolver import (DNS_TYPE_PTR, DnsPtrResolver, LlmnrResolver, MdnsResolver, NetbiosResolver, TtlCache,
+                           build_query, parse_response, ptr_name)
+
+
+class CountingLimiter:
+    """记录取得的令牌数的限速器"""
+
+    def __init__(self):
+        self.count = 0
+
+    async def acquire(self, count=1):
+        self.count += count
+
+
+class FakeTransport:
+    """代替UDP socket: 记录发出的查询，按预设的应答(事务ID换成查询的ID)回复"""
+
+    def __init__(self, resolver, response=None):
+        self.resolver = resolver
+        self.response = response
+        self.sent = []
+
+    def sendto(self, data, address):
+        self.sent.append((data, address))
+        if self.response is not None:
+            response = data[:2] + self.response[2:]
+            asyncio.get_running_loop().call_soon(self.resolver._on_response, response, address)
+
+    def close(self):
+        pass
+
+
+class DnsResponseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.packets = read_hex_fixture('dns.hex')
+
+    def test_ptr_answer(self):
+        response = parse_response(self.packets['ptr_answer'])
+        self.assertEqual(response['id'], 0x2a2a)
+        self.assertEqual(response['rcode'], 0)
+        self.assertEqual(response['question'], '10.1.168.192.in-addr.arpa')
+        self.assertEqual(response['answers'], [('10.1.168.192.in-addr.arpa', 12, 3600, 'nas.example.lan')])
+
+    def test_nxdomain_without_authority(self):
+        response = parse_response(self.packets['nxdomain_captured'])
+        self.assertEqual(response['rcode'], 3)
+        self.assertEqual(response['question'], '200.2.0.192.in-addr.arpa')
+        self.assertEqual(response['answers'], [])
+        self.assertIsNone(response['negative_ttl'])
+
+    def test_nxdomain_soa_negative_ttl(self):
+        # 否定缓存时间取SOA记录TTL和minimum中较小的一个
+        response = parse_response(self.packets['nxdomain_soa'])
+        self.assertEqual(response['rcode'], 3)
+        self.assertEqual(response['negative_ttl'], 300)
+
+    def test_mdns_answer_without_question(self):
+        response = parse_response(self.packets['mdns_ptr'])
+        self.assertIsNone(response['question'])
+        self.assertEqual(response['answers'][0][3], 'printer.local')
+
+    def test_truncated(self):
+        data = self.packets['ptr_answer']
+        with self.assertRaises(ValueError):
+            parse_response(data[:8])
+        with self.assertRaises(ValueError):
+            parse_response(data[:-20])
+
+    def test_query_round_trip(self):
+        query = build_query(0x1234, ptr_name('192.168.1.10'), DNS_TYPE_PTR)
+        response = parse_response(query)
+        self.assertEqual(response['id'], 0x1234)
+        self.assertEqual(response['question'], '10.1.168.192.in-addr.arpa')
+
+
+class DnsPtrResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.packets = read_hex_fixture('dns.hex')
+        self.limiter = CountingLimiter()
+
+    def lookup_twice(self, ip, response):
+        """连续查询两次，第二次应当命中缓存"""
+        async def run():
+            resolver = DnsPtrResolver(servers=['192.0.2.53'], timeout=0.05, retries=1, cache=TtlCache(),
+                                      limiter=self.limiter)
+            resolver.transport = FakeTransport(resolver, response)
+            results = [await resolver.lookup(ip), await resolver.lookup(ip)]
+            return results, resolver.transport.sent
+
+        return asyncio.run(run())
+
+    def test_answer(self):
+        results, sent = self.lookup_twice('192.168.1.10', self.packets['ptr_answer'])
+        self.assertEqual(results, [('nas.example.lan', True)] * 2)
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0][1], ('192.0.2.53', 53))
+        self.assertEqual(parse_response(sent[0][0])['question'], '10.1.168.192.in-addr.arpa')
+        self.assertEqual(self.limiter.count, 1)
+
+    def test_nxdomain_is_answered(self):
+        results, sent = self.lookup_twice('192.168.1.77', self.packets['nxdomain_soa'])
+        self.assertEqual(results, [(None, True)] * 2)
+        self.assertEqual(len(sent), 1)
+
+    def test_timeout_is_not_answered(self):
+        results, sent = self.lookup_twice('192.168.1.10', None)
+        self.assertEqual(results, [(None, False)] * 2)
+        # 重试1次，之后失败结果短暂缓存
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(self.limiter.count, 2)
+
+    def test_mismatched_question_ignored(self):
+        results, _ = self.lookup_twice('192.168.1.11', self.packets['ptr_answer'])
+        self.assertEqual(results, [(None, False)] * 2)
+
+
+class GetHostnameTest(unittest.TestCase):
+    """系统解析器只在DNS服务器没有明确答复时询问，并使用同一个限速器"""
+
+    class FakeResolver:
+        def __init__(self, result, limiter=None):
+            self.result = result
+            self.limiter = limiter
+
+        async def lookup(self, ip):
+            return self.result
+
+    def setUp(self):
+        self.system_calls = []
+
+        async def system_lookup(ip, limiter=None):
+            self.system_calls.append((ip, limiter))
+            return 'from-system'
+
+        patcher = mock.patch.object(lan_scanner, 'system_lookup', system_lookup)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_hostname(self, resolver, limiter=None):
+        return asyncio.run(lan_scanner.get_hostname('192.0.2.200', resolver, peers=[], limiter=limiter))
+
+    def test_answer(self):
+        self.assertEqual(self.get_hostname(self.FakeResolver(('nas.example.lan', True))), 'nas.example.lan')
+        self.assertEqual(self.system_calls, [])
+
+    def test_nxdomain_skips_system_resolver(self):
+        self.assertEqual(self.get_hostname(self.FakeResolver((None, True))), 'Unknown')
+        self.assertEqual(self.system_calls, [])
+
+    def test_failure_falls_back_with_limiter(self):
+        limiter = CountingLimiter()
+        self.assertEqual(self.get_hostname(self.FakeResolver((None, False), limiter)), 'from-system')
+        self.assertEqual(self.system_calls, [('192.0.2.200', limiter)])
+        other = CountingLimiter()
+        self.get_hostname(self.FakeResolver((None, False), limiter), other)
+        self.assertIs(self.system_calls[-1][1], other)
+
+
+class PeerResolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.packets = read_hex_fixture('dns.hex')
+
+    def test_mdns(self):
+        resolver = MdnsResolver()
+        query = parse_response(resolver.build(0x1111, '192.168.1.10'))
+        self.assertEqual(query['question'], '10.1.168.192.in-addr.arpa')
+        self.assertEqual(resolver.parse(self.packets['mdns_ptr'], '192.168.1.10'), 'printer.local')
+        self.assertIsNone(resolver.parse(self.packets['nxdomain_captured'], '192.0.2.200'))
+        self.assertEqual((LlmnrResolver.port, LlmnrResolver.protocol), (5355, 'llmnr'))
+
+    def test_netbios_prefers_workstation_name(self):
+        resolver = NetbiosResolver()
+        # 组名被忽略，工作站名<00>优先于文件服务名<20>
+        self.assertEqual(resolver.parse(self.packets['nbstat_workstation'], '192.168.1.30'), 'DESKTOP-7Q2')
+        self.assertEqual(resolver.parse(self.packets['nbstat_file_server'], '192.168.1.31'), 'NAS-01')
+
+    def test_netbios_query(self):
+        query = NetbiosResolver().build(0x4242, '192.168.1.30')
+        self.assertEqual(query[:2], b'\x42\x42')
+        self.assertEqual(query[-4:], b'\x00\x21\x00\x01')
+
+
+class TtlCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('name_resolver.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_positive_and_negative_entries_expire(self):
+        cache = TtlCache()
+        cache.put('a', 'host-a', 10)
+        cache.put('b', None, 5)
+        self.assertEqual(cache.get('a'), (True, 'host-a'))
+        self.assertEqual(cache.get('b'), (True, None))
+        self.now += 6
+        self.assertEqual(cache.get('a'), (True, 'host-a'))
+        self.assertEqual(cache.get('b'), (False, None))
+        self.now += 5
+        self.assertEqual(cache.get('a'), (False, None))
+        self.assertEqual(cache.entries, {})
+
+    def test_zero_ttl_not_cached(self):
+        cache = TtlCache()
+        cache.put('a', 'host-a', 0)
+        self.assertEqual(cache.get('a'), (False, None))
+
+    def test_evicts_expired_then_oldest(self):
+        cache = TtlCache(max_entries=8)
+        cache.put('old', 'x', 1)
+        self.now += 2
+        for index in range(7):
+            cache.put(index, 'x', 100)
+        # 已满: 先淘汰过期的条目，不淘汰有效的
+        cache.put(7, 'x', 100)
+        self.assertEqual(sorted(cache.entries), list(range(8)))
+        # 仍然已满: 淘汰最早插入的四分之一
+        cache.put(8, 'x', 100)
+        self.assertEqual(sorted(cache.entries), list(range(2, 9)))
+
+
+if __name__ == '__main__':
+    unittest.main()
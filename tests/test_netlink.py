@@ -0,0 +1,50 @@
+"""rtnetlink消息解析的测试，输入为本机抓取的dump应答"""
+import unittest
+
+from support import read_hex_fixture
+
+import netlink
+
+
+class NetlinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.packets = read_hex_fixture('netlink.hex')
+
+    def test_neighbor_dump(self):
+        messages = list(netlink.parse_messages(self.packets['neigh_dump']))
+        self.assertEqual(messages[-1][0], netlink.NLMSG_DONE)
+        neighbors = [netlink.parse_neighbor(msg_type, payload) for msg_type, payload in messages[:-1]]
+        self.assertEqual([(n['ip'], n['mac'], n['state']) for n in neighbors], [
+            ('0.0.0.0', '00:00:00:00:00:00', netlink.NUD_NOARP),
+            ('10.99.0.5', 'ee:39:98:2d:13:53', netlink.NUD_REACHABLE),
+            ('192.0.2.1', '02:fc:00:00:00:05', netlink.NUD_REACHABLE),
+        ])
+        self.assertTrue(all(n['event'] == 'new' for n in neighbors))
+
+    def test_address_dump(self):
+        addresses = [netlink.parse_address(msg_type, payload)
+                     for msg_type, payload in netlink.parse_messages(self.packets['addr_dump'])]
+        self.assertIsNone(addresses[-1])
+        self.assertEqual([(a['label'], a['ip'], a['prefixlen']) for a in addresses[:-1]], [
+            ('lo', '127.0.0.1', 8),
+            ('eth0', '192.0.2.2', 24),
+            ('v6a', '10.99.0.1', 24),
+        ])
+
+    def test_truncated_message_is_dropped(self):
+        data = self.packets['neigh_dump']
+        first_length = int.from_bytes(data[:4], 'little')
+        self.assertEqual(len(list(netlink.parse_messages(data[:first_length + 8]))), 1)
+
+    def test_presence_of(self):
+        self.assertEqual(netlink.presence_of(netlink.NUD_REACHABLE), 'online')
+        self.assertEqual(netlink.presence_of(netlink.NUD_STALE), 'uncertain')
+        self.assertEqual(netlink.presence_of(netlink.NUD_FAILED), 'offline')
+        # 静态表项不能说明对方是否在线
+        self.assertIsNone(netlink.presence_of(netlink.NUD_PERMANENT))
+        self.assertIsNone(netlink.presence_of(netlink.NUD_NOARP))
+
+
+if __name__ == '__main__':
+    unittest.main()
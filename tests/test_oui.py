@@ -0,0 +1,55 @@
+"""OUI厂商查询(oui.py)的测试"""
+import os
+import tempfile
+import unittest
+
+from support import FIXTURES
+
+import oui
+
+
+class OuiTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = oui.OuiTable(os.path.join(FIXTURES, 'oui_sample.tsv'))
+
+    def test_lookup_formats(self):
+        for mac in ('3c:2e:f9:a1:b2:c3', '3C-2E-F9-A1-B2-C3', '3c2ef9a1b2c3'):
+            self.assertEqual(self.table.lookup(mac), 'Apple, Inc.')
+        self.assertEqual(self.table.lookup('00:00:0c:12:34:56'), 'Cisco Systems, Inc')
+
+    def test_unknown_and_invalid(self):
+        self.assertEqual(self.table.lookup('02:fc:00:00:00:05'), 'Unknown')
+        self.assertEqual(self.table.lookup('Unknown'), 'Unknown')
+        self.assertEqual(self.table.lookup(''), 'Unknown')
+
+    def test_unsorted_file(self):
+        # 数据文件未排序时载入后排序，无效的行被跳过
+        self.table.load()
+        self.assertEqual(list(self.table.prefixes), [0x00000C, 0x3C2EF9, 0xEE3998])
+        self.assertEqual(self.table.lookup('ee:39:98:2d:13:53'), 'Example Devices')
+
+    def test_missing_file(self):
+        table = oui.OuiTable(os.path.join(FIXTURES, 'missing.tsv'))
+        self.assertEqual(table.lookup('3c:2e:f9:a1:b2:c3'), 'Unknown')
+
+    def test_shipped_table(self):
+        self.assertEqual(oui.vendor_of('00:00:0c:12:34:56'), 'Cisco Systems, Inc')
+
+
+class IeeeRegistryTest(unittest.TestCase):
+
+    def test_read_csv_and_write_table(self):
+        entries = oui.read_ieee_registry(os.path.join(FIXTURES, 'oui_sample.csv'))
+        # 只保留MA-L(24位前缀)的分配
+        self.assertEqual(entries, {0x00000C: 'Cisco Systems  Inc', 0x3C2EF9: 'Apple, Inc.'})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'oui.tsv')
+            oui.write_table(entries, path)
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(f.read(), '00000C\tCisco Systems Inc\n3C2EF9\tApple, Inc.\n')
+            self.assertEqual(oui.OuiTable(path).lookup('00:00:0c:00:00:01'), 'Cisco Systems Inc')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+"""被动监听报文解析(parse_presence_frame)的测试，输入为抓取或按协议构造的以太网帧"""
+import unittest
+
+from support import read_hex_fixture
+
+from lan_scanner import parse_presence_frame
+
+
+class PresenceFrameTest(unittest.TestCase):
+
+    def setUp(self):
+        self.frames = read_hex_fixture('frames.hex')
+
+    def test_arp(self):
+        expected = [('10.99.0.5', 'ee:39:98:2d:13:53', 'arp')]
+        self.assertEqual(parse_presence_frame(self.frames['arp_reply']), expected)
+        self.assertEqual(parse_presence_frame(self.frames['arp_reply_vlan']), expected)
+
+    def test_arp_probe_ignored(self):
+        self.assertEqual(parse_presence_frame(self.frames['arp_probe']), [])
+
+    def test_mdns(self):
+        self.assertEqual(parse_presence_frame(self.frames['mdns']),
+                         [('192.168.1.23', '3c:2e:f9:a1:b2:c3', 'mdns')])
+
+    def test_dhcp(self):
+        lease = [('192.168.1.50', '3c:2e:f9:a1:b2:c3', 'dhcp')]
+        self.assertEqual(parse_presence_frame(self.frames['dhcp_ack']), lease)
+        self.assertEqual(parse_presence_frame(self.frames['dhcp_renew']), lease)
+        self.assertEqual(parse_presence_frame(self.frames['dhcp_discover']), [])
+
+    def test_short_frames(self):
+        self.assertEqual(parse_presence_frame(b''), [])
+        self.assertEqual(parse_presence_frame(self.frames['arp_reply'][:20]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+"""/proc/net/arp解析的测试，输入为本机抓取的邻居表"""
+import unittest
+
+from support import read_fixture
+
+from lan_scanner import parse_proc_net_arp
+
+
+class ProcNetArpTest(unittest.TestCase):
+
+    def test_only_complete_entries(self):
+        table = parse_proc_net_arp(read_fixture('proc_net_arp.txt'))
+        self.assertEqual(table, {
+            '10.99.0.5': 'ee:39:98:2d:13:53',
+            '10.99.0.8': 'ee:39:98:2d:13:53',
+            '10.99.0.6': 'ee:39:98:2d:13:53',
+            '192.0.2.1': '02:fc:00:00:00:05',
+        })
+
+    def test_header_only(self):
+        self.assertEqual(parse_proc_net_arp(read_fixture('proc_net_arp.txt').splitlines()[0]), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
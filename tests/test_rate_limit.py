@@ -0,0 +1,76 @@
+"""令牌桶发包速率限制(RateLimiter)的测试，时间使用假时钟"""
+import unittest
+from unittest import mock
+
+import support  # noqa: F401  (把仓库根目录加入sys.path)
+
+from lan_scanner import RateLimiter
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.sleeps = []
+        patchers = [
+            mock.patch('lan_scanner.time.monotonic', lambda: self.now),
+            mock.patch('lan_scanner.asyncio.sleep', self.fake_sleep),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def fake_sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+    def acquire(self, limiter, count=1, advance=True):
+        """执行一次acquire()，返回等待的秒数；advance为True时假时钟走过这段时间"""
+        self.sleeps = []
+        coroutine = limiter.acquire(count)
+        with self.assertRaises(StopIteration):
+            coroutine.send(None)
+        waited = sum(self.sleeps)
+        if advance:
+            self.now += waited
+        return waited
+
+    def test_burst(self):
+        self.assertEqual(RateLimiter(1000).burst, 100)
+        self.assertEqual(RateLimiter(5).burst, 1)
+        limiter = RateLimiter(100, burst=10)
+        for _ in range(10):
+            self.assertEqual(self.acquire(limiter), 0)
+        self.assertAlmostEqual(self.acquire(limiter), 0.01)
+
+    def test_waiters_reserve_later_tokens(self):
+        limiter = RateLimiter(100, burst=1)
+        self.assertEqual(self.acquire(limiter, advance=False), 0)
+        # 同一时刻到达的探测按顺序预约后续的令牌
+        self.assertAlmostEqual(self.acquire(limiter, advance=False), 0.01)
+        self.assertAlmostEqual(self.acquire(limiter, advance=False), 0.02)
+        self.assertAlmostEqual(self.acquire(limiter, 5, advance=False), 0.07)
+
+    def test_refill_capped_at_burst(self):
+        limiter = RateLimiter(100, burst=10)
+        for _ in range(10):
+            self.acquire(limiter)
+        self.now += 60
+        for _ in range(10):
+            self.assertEqual(self.acquire(limiter), 0)
+        self.assertGreater(self.acquire(limiter), 0)
+
+    def test_sustained_rate(self):
+        limiter = RateLimiter(200, burst=20)
+        started = self.now
+        for _ in range(1000):
+            self.acquire(limiter)
+        # 突发之后严格按速率发送
+        self.assertAlmostEqual(self.now - started, (1000 - 20) / 200)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""扫描历史(save_scan_result和增量扫描用到的查询)的测试，使用临时数据库"""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import support  # noqa: F401  (把仓库根目录加入sys.path)
+
+from db_manager import DatabaseManager
+
+NETWORK = '198.51.100.0/28'
+
+
+def host(ip, network=NETWORK):
+    return {'ip': ip, 'hostname': 'Unknown', 'mac': 'Unknown', 'vendor': 'Unknown',
+            'interface': 'eth0', 'network': network}
+
+
+class ScanHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_manager = DatabaseManager(os.path.join(directory.name, 'test.db'))
+        self.addCleanup(self.db_manager.close)
+        self.now = datetime.now() - timedelta(hours=1)
+
+    def save(self, hosts, network_range=NETWORK):
+        # 每次保存前把时钟拨快一分钟，两次扫描的scan_time不同
+        self.now += timedelta(minutes=1)
+        now = self.now
+
+        class FakeDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return now
+
+        with mock.patch('db_manager.datetime', FakeDatetime), contextlib.redirect_stdout(io.StringIO()):
+            self.db_manager.save_scan_result(hosts, '198.51.100.1', network_range)
+
+    def test_empty_scan_clears_last_online(self):
+        self.save([host('198.51.100.3'), host('198.51.100.6')])
+        self.assertCountEqual(self.db_manager.get_last_online_ips(NETWORK), ['198.51.100.3', '198.51.100.6'])
+        # 没有发现主机的扫描也要记录，否则上一次的在线列表会一直被当作最近一次
+        self.save([])
+        self.assertEqual(self.db_manager.get_last_online_ips(NETWORK), [])
+        # 见过的地址不受影响，空扫描也不产生扫描结果
+        self.assertCountEqual(self.db_manager.get_seen_ips(NETWORK), ['198.51.100.3', '198.51.100.6'])
+        self.assertEqual(len(self.db_manager.get_scan_results()), 2)
+
+        self.save([host('198.51.100.9')])
+        self.assertEqual(self.db_manager.get_last_online_ips(NETWORK), ['198.51.100.9'])
+
+    def test_empty_network_in_multi_interface_scan(self):
+        other = '203.0.113.0/28'
+        self.save([host('198.51.100.3'), host('203.0.113.5', other)], f'{NETWORK}, {other}')
+        # 第二次扫描只在一个网段发现主机，另一个网段同样记录为空
+        self.save([host('198.51.100.3')], f'{NETWORK}, {other}')
+        self.assertEqual(self.db_manager.get_last_online_ips(NETWORK), ['198.51.100.3'])
+        self.assertEqual(self.db_manager.get_last_online_ips(other), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
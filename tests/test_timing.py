@@ -0,0 +1,106 @@
+"""RTT估计(RttEstimator)和探测超时规划(TimingModel)的测试"""
+import unittest
+
+import support  # noqa: F401  (把仓库根目录加入sys.path)
+
+from lan_scanner import RttEstimator, TimingModel
+
+
+class RttEstimatorTest(unittest.TestCase):
+
+    def test_update(self):
+        estimator = RttEstimator()
+        estimator.update(0.100)
+        self.assertAlmostEqual(estimator.srtt, 0.100)
+        self.assertAlmostEqual(estimator.rttvar, 0.050)
+        self.assertAlmostEqual(estimator.rto(), 0.300)
+        estimator.update(0.020)
+        self.assertAlmostEqual(estimator.rttvar, 0.75 * 0.050 + 0.25 * 0.080)
+        self.assertAlmostEqual(estimator.srtt, 0.875 * 0.100 + 0.125 * 0.020)
+
+    def test_granularity_and_backoff(self):
+        estimator = RttEstimator()
+        estimator.update(0.004)
+        estimator.update(0.004)
+        estimator.update(0.004)
+        # RTT几乎不变时4*RTTVAR小于时钟粒度
+        self.assertAlmostEqual(estimator.rto(granularity=0.01), estimator.srtt + 0.01)
+        estimator.backoff = 4
+        self.assertAlmostEqual(estimator.rto(granularity=0.01), (estimator.srtt + 0.01) * 4)
+        estimator.update(0.004)
+        self.assertEqual(estimator.backoff, 1)
+
+
+class TimingModelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timing = TimingModel(initial_timeout=1.0, min_timeout=0.1, max_timeout=3.0)
+
+    def test_no_samples(self):
+        self.assertEqual(self.timing.plan('192.168.1.10'), (1.0, 0))
+
+    def test_seen_host(self):
+        self.timing.observe('192.168.1.10', 0.020)
+        # 0.02 + 4*0.01 = 0.06，不低于min_timeout
+        self.assertEqual(self.timing.plan('192.168.1.10'), (0.1, 2))
+        self.timing.observe('192.168.1.20', 0.500)
+        self.assertEqual(self.timing.plan('192.168.1.20'), (1.5, 2))
+        self.timing.observe('192.168.1.30', 2.000)
+        self.assertEqual(self.timing.plan('192.168.1.30'), (3.0, 2))
+        self.assertTrue(self.timing.is_known('192.168.1.10'))
+        self.assertFalse(self.timing.is_known('192.168.1.11'))
+
+    def test_timeout_backoff(self):
+        self.timing.observe('192.168.1.20', 0.400)
+        self.timing.observe_timeout('192.168.1.20')
+        timeout, retries = self.timing.plan('192.168.1.20')
+        self.assertAlmostEqual(timeout, 2.4)
+        self.assertEqual(retries, 2)
+        for _ in range(5):
+            self.timing.observe_timeout('192.168.1.20')
+        self.assertEqual(self.timing.plan('192.168.1.20'), (3.0, 2))
+        # 再次应答后退避清零
+        self.timing.observe('192.168.1.20', 0.400)
+        self.assertLess(self.timing.plan('192.168.1.20')[0], 2.4)
+
+    def test_unseen_host_uses_subnet_samples(self):
+        self.timing.observe('192.168.1.10', 0.020)
+        self.timing.observe('10.0.0.10', 0.500)
+        # 快速子网: 超时较短，重试1次；慢速子网延长超时
+        self.assertEqual(self.timing.plan('192.168.1.11'), (0.1, 1))
+        self.assertEqual(self.timing.plan('10.0.0.11'), (1.5, 0))
+        # 其他子网没有数据
+        self.assertEqual(self.timing.plan('192.168.2.11'), (1.0, 0))
+
+    def test_unseen_host_floor(self):
+        # RTT稳定时子网的RTO接近SRTT，没有历史的主机至少等待2倍SRTT
+        for _ in range(30):
+            self.timing.observe('192.168.1.10', 0.200)
+        self.assertAlmostEqual(self.timing.subnets[self.timing._subnet('192.168.1.10')].rto(), 0.21, places=2)
+        timeout, retries = self.timing.plan('192.168.1.11')
+        self.assertAlmostEqual(timeout, 0.4)
+        self.assertEqual(retries, 1)
+        self.assertEqual(self.timing.plan('192.168.1.10'), (self.timing.hosts['192.168.1.10'].rto(), 2))
+
+    def test_empty_range_sweep_speeds_up(self):
+        # 扫描空地址段: 每次超时都不产生样本，少数在线主机的应答让其余地址使用更短的超时
+        timing = TimingModel(initial_timeout=1.0, min_timeout=0.1, max_timeout=3.0)
+        before = sum(timing.plan(f'192.168.1.{index}')[0] for index in range(20, 254))
+        timing.observe('192.168.1.1', 0.003)
+        timing.observe('192.168.1.2', 0.004)
+        after = sum(timing.plan(f'192.168.1.{index}')[0] for index in range(20, 254))
+        self.assertLess(after, before / 5)
+
+    def test_export_load(self):
+        self.timing.observe('192.168.1.10', 0.020)
+        self.timing.observe('192.168.1.20', 0.300)
+        loaded = TimingModel()
+        loaded.load(self.timing.export())
+        self.assertEqual(loaded.plan('192.168.1.10'), self.timing.plan('192.168.1.10'))
+        self.assertEqual(loaded.plan('192.168.1.20'), self.timing.plan('192.168.1.20'))
+        self.assertTrue(loaded.is_known('192.168.1.20'))
+        self.assertFalse(loaded.is_known('192.168.1.30'))
+
+
+if __name__ == '__main__':
+    unittest.main()